@@ -0,0 +1,161 @@
+"""Vectorized smart-alarm planning over sleep diary history.
+
+Times are handled as minutes after noon so that a night never wraps around
+midnight (22:00 -> 600, 01:30 -> 810). Candidate plans are every combination
+of a bedtime and a whole number of 90-minute sleep cycles; each plan is scored
+with a kernel-weighted average of the quality the user reported on nights of
+similar bedtime and duration, shrunk toward their overall mean and discounted
+by how little history supports it, so untried schedules do not win by default.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+SLEEP_CYCLE_MINUTES = 90
+DEFAULT_CYCLES = np.array([4, 5, 6])
+DEFAULT_BEDTIMES = np.arange(9 * 60, 13 * 60 + 1, 15)  # 21:00 to 01:00
+BEDTIME_BANDWIDTH = 45.0  # minutes
+DURATION_BANDWIDTH = 0.75  # hours
+SAME_WEEKDAY_BOOST = 1.0
+PRIOR_WEIGHT = 1.0
+UNCERTAINTY_PENALTY = 1.0
+
+
+def minutes_after_noon(times):
+    """Convert ``datetime.time`` values to minutes after noon"""
+    minutes = np.array([t.hour * 60 + t.minute for t in times], dtype=float)
+    return (minutes - 720) % 1440
+
+def time_from_minutes(minutes_after_noon):
+    """Inverse of minutes_after_noon for a single value"""
+    minutes = int(round(minutes_after_noon + 720)) % 1440
+    return datetime(2000, 1, 1, minutes // 60, minutes % 60).time()
+
+def diary_arrays(sleep_log):
+    """Turn diary entries (list of dicts or DataFrame) into aligned NumPy arrays"""
+    sleep_df = pd.DataFrame(sleep_log)
+    bedtime = minutes_after_noon(sleep_df['Bedtime'])
+    wake = minutes_after_noon(sleep_df['Wake Time'])
+    duration = pd.to_numeric(sleep_df['Sleep Duration'], errors='coerce').to_numpy(dtype=float)
+    # Fall back to the bed/wake gap when a night's duration was not recorded
+    duration = np.where(np.isnan(duration), ((wake - bedtime) % 1440) / 60, duration)
+    return {
+        'bedtime': bedtime,
+        'wake': wake,
+        'duration': duration,
+        'quality': pd.to_numeric(sleep_df['Quality of Sleep'], errors='coerce').to_numpy(dtype=float),
+        'weekday': pd.to_datetime(sleep_df['Date']).dt.weekday.to_numpy(),
+    }
+
+def cycle_wake_times(bedtimes, cycles=DEFAULT_CYCLES, wake_window=0):
+    """Cycle-aligned wake times (and window starts) for every bedtime x cycle count"""
+    bedtimes = np.atleast_1d(np.asarray(bedtimes, dtype=float))
+    wake = bedtimes[:, None] + np.asarray(cycles)[None, :] * SLEEP_CYCLE_MINUTES
+    return wake, wake - wake_window
+
+def _kernel(bedtime, duration, candidate_bedtimes, cycles):
+    """Similarity of each history night (last axis kept first) to each candidate plan"""
+    candidate_hours = np.asarray(cycles) * SLEEP_CYCLE_MINUTES / 60
+    bed_term = ((bedtime[..., None] - candidate_bedtimes) / BEDTIME_BANDWIDTH) ** 2
+    dur_term = ((duration[..., None] - candidate_hours) / DURATION_BANDWIDTH) ** 2
+    return np.exp(-0.5 * (bed_term[..., :, None] + dur_term[..., None, :]))
+
+def _lower_bound(weighted_quality, weight_sum, prior, spread):
+    """Shrunk mean quality minus a penalty that fades as supporting history grows"""
+    support = weight_sum + PRIOR_WEIGHT
+    return (weighted_quality + PRIOR_WEIGHT * prior) / support - UNCERTAINTY_PENALTY * spread / np.sqrt(support)
+
+def score_plans(history, candidate_bedtimes=DEFAULT_BEDTIMES, cycles=DEFAULT_CYCLES):
+    """Expected sleep quality for every candidate bedtime x cycle count, shape (C, K)"""
+    valid = ~np.isnan(history['quality']) & ~np.isnan(history['duration'])
+    quality = history['quality'][valid]
+    if not len(quality):
+        return np.full((len(candidate_bedtimes), len(cycles)), np.nan)
+    weights = _kernel(history['bedtime'][valid], history['duration'][valid], candidate_bedtimes, cycles)
+    return _lower_bound(np.tensordot(quality, weights, axes=1), weights.sum(axis=0), quality.mean(), quality.std())
+
+def plan_alarms(sleep_log, candidate_bedtimes=DEFAULT_BEDTIMES, cycles=DEFAULT_CYCLES, wake_window=20, top=3):
+    """Best-scoring bedtime / wake-window plans for one user's diary"""
+    history = diary_arrays(sleep_log)
+    scores = score_plans(history, candidate_bedtimes, cycles)
+    if np.isnan(scores).all():
+        return pd.DataFrame()
+    wake, window_start = cycle_wake_times(candidate_bedtimes, cycles, wake_window)
+    best = np.argsort(scores, axis=None)[::-1][:top]
+    rows = []
+    for c, k in zip(*np.unravel_index(best, scores.shape)):
+        rows.append({
+            'Bedtime': time_from_minutes(candidate_bedtimes[c]),
+            'Wake Window Start': time_from_minutes(window_start[c, k]),
+            'Wake Time': time_from_minutes(wake[c, k]),
+            'Cycles': int(cycles[k]),
+            'Expected Quality': round(float(scores[c, k]), 1),
+        })
+    return pd.DataFrame(rows)
+
+def plan_week_batch(diaries, start_date=None, candidate_bedtimes=DEFAULT_BEDTIMES, cycles=DEFAULT_CYCLES,
+                    wake_window=20, chunk_size=512):
+    """Next-week alarm schedule for many users in one vectorized pass.
+
+    ``diaries`` is either a DataFrame of diary rows with a ``user`` column or
+    a dict mapping user -> diary entries. Histories are padded into a
+    (users, nights) matrix and scored against all candidate plans for each of
+    the next seven days at once, with nights on the same weekday weighted up.
+    Users are processed in chunks of ``chunk_size`` to bound memory.
+    """
+    if isinstance(diaries, dict):
+        diaries = pd.DataFrame([dict(entry, user=user) for user, log in diaries.items() for entry in log])
+    if not len(diaries):
+        return pd.DataFrame()
+    start_date = start_date or (datetime.now().date() + timedelta(days=1))
+    days = [start_date + timedelta(days=i) for i in range(7)]
+    day_weekdays = np.array([d.weekday() for d in days])
+    wake, window_start = cycle_wake_times(candidate_bedtimes, cycles, wake_window)
+
+    history = diary_arrays(diaries)
+    user_codes, users = pd.factorize(diaries['user'])
+    night = pd.Series(user_codes).groupby(user_codes).cumcount().to_numpy()
+    valid = ~np.isnan(history['quality']) & ~np.isnan(history['duration'])
+
+    frames = []
+    for lo in range(0, len(users), chunk_size):
+        rows = (user_codes >= lo) & (user_codes < lo + chunk_size)
+        n_users = min(chunk_size, len(users) - lo)
+        shape = (n_users, night[rows].max() + 1)
+        index = (user_codes[rows] - lo, night[rows])
+        bedtime, duration, quality = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+        weekday = np.full(shape, -1)
+        mask = np.zeros(shape, dtype=bool)
+        mask[index] = valid[rows]
+        bedtime[index] = history['bedtime'][rows]
+        duration[index] = np.where(valid[rows], history['duration'][rows], 0.0)
+        quality[index] = np.where(valid[rows], history['quality'][rows], 0.0)
+        weekday[index] = history['weekday'][rows]
+
+        kernel = _kernel(bedtime, duration, candidate_bedtimes, cycles) * mask[..., None, None]  # (U, N, C, K)
+        day_weight = 1 + SAME_WEEKDAY_BOOST * (weekday[..., None] == day_weekdays)  # (U, N, D)
+        numerator = np.einsum('unck,und,un->udck', kernel, day_weight, quality, optimize=True)
+        denominator = np.einsum('unck,und->udck', kernel, day_weight, optimize=True)
+        n_valid = np.maximum(mask.sum(axis=1), 1)
+        prior = quality.sum(axis=1) / n_valid
+        spread = np.sqrt(np.where(mask, (quality - prior[:, None]) ** 2, 0.0).sum(axis=1) / n_valid)
+        scores = _lower_bound(numerator, denominator, prior[:, None, None, None], spread[:, None, None, None])
+
+        flat_scores = scores.reshape(n_users, len(days), -1)
+        flat_best = flat_scores.argmax(axis=2)
+        best_c, best_k = np.unravel_index(flat_best, scores.shape[2:])
+        frames.append(pd.DataFrame({
+            'user': np.repeat(users[lo:lo + n_users], len(days)),
+            'date': np.tile(days, n_users),
+            'bedtime_minutes': candidate_bedtimes[best_c].ravel(),
+            'wake_window_start_minutes': window_start[best_c, best_k].ravel(),
+            'wake_minutes': wake[best_c, best_k].ravel(),
+            'cycles': np.asarray(cycles)[best_k].ravel(),
+            'expected_quality': np.take_along_axis(flat_scores, flat_best[..., None], axis=2).ravel().round(2),
+            'has_history': np.repeat(mask.any(axis=1), len(days)),
+        }))
+    schedule = pd.concat(frames, ignore_index=True)
+    for column in ['bedtime', 'wake_window_start', 'wake']:
+        schedule[column] = schedule.pop(f'{column}_minutes').map(time_from_minutes)
+    return schedule
@@ -0,0 +1,165 @@
+"""JSON prediction API worker.
+
+    python api.py --port 8601
+
+``POST /predict`` takes one input record (or a list of them) with the same 12
+fields as the prediction page and returns the predicted disorder and class
+probabilities for each. ``GET /health`` reports the worker's pid and model
+version. ``GET /export/{logs,diaries}.{csv,parquet}?start=&end=&user=``
+streams an export with chunked transfer encoding; it needs
+``Authorization: Bearer $SLEEPYTICS_EXPORT_TOKEN`` and is disabled when that
+variable is unset. Any number of these workers can run behind ``serve.py``: they load
+the same memory-mapped model artifact and log to the same store.
+"""
+import argparse
+import contextlib
+import hmac
+import io
+import json
+import os
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from log_writer import log_predictions
+from model_router import model_router
+from modeling import DISORDER_MAPPING, model_version
+
+INPUT_FIELDS = [
+    'Gender', 'Age', 'Occupation', 'Sleep Duration', 'Quality of Sleep', 'Physical Activity Level',
+    'Stress Level', 'BMI Category', 'Heart Rate', 'Daily Steps', 'Systolic', 'Diastolic'
+]
+MAX_BODY_BYTES = 1 << 20
+EXPORT_TOKEN = os.environ.get("SLEEPYTICS_EXPORT_TOKEN")
+
+_bundle = None
+
+
+def load_bundle():
+    """Load the shared model once per worker process"""
+    global _bundle
+    if _bundle is None:
+        from startup import load_model_bundle
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            _bundle = load_model_bundle()
+    return _bundle
+
+def predict_records(records, user="api", log=True, key=None):
+    """Score input records; returns one {prediction, probabilities} dict per record.
+
+    ``key`` (the caller's X-User) keeps a percentage rollout sticky per caller.
+    """
+    missing = [field for field in INPUT_FIELDS if any(field not in record for record in records)]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+    frame = pd.DataFrame(records, columns=INPUT_FIELDS)
+    labels, proba, served = model_router(load_bundle()).predict_batch(frame, key)
+    model = served["model"]
+    class_names = [DISORDER_MAPPING[c] for c in model.classes_]
+    results = [
+        {"prediction": label, "probabilities": dict(zip(class_names, row))}
+        for label, row in zip(labels, proba.tolist())
+    ]
+    if log:
+        log_predictions(user, frame, labels, proba, "api", model_version(model))
+    return results
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/health":
+            self._send_json(200, {"status": "ok", "pid": os.getpid(), "model_version": model_version(load_bundle()["model"])})
+        elif url.path.startswith("/export/"):
+            self._send_export(url)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _send_export(self, url):
+        from exports import EXPORT_FORMATS, export_chunks, export_file_name
+
+        if not EXPORT_TOKEN:
+            self._send_json(403, {"error": "exports are disabled"})
+            return
+        if not hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {EXPORT_TOKEN}"):
+            self._send_json(401, {"error": "unauthorized"})
+            return
+        kind, _, fmt = url.path[len("/export/"):].partition(".")
+        if kind not in ("logs", "diaries") or fmt not in EXPORT_FORMATS:
+            self._send_json(404, {"error": "not found"})
+            return
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            start, end = (date.fromisoformat(query[key]) if query.get(key) else None for key in ("start", "end"))
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        chunks = export_chunks(kind, fmt, start, end, query.get("user"))
+        self.send_response(200)
+        self.send_header("Content-Type", EXPORT_FORMATS[fmt])
+        self.send_header("Content-Disposition", f'attachment; filename="{export_file_name(kind, fmt, start, end)}"')
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for chunk in chunks:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+        except BaseException:
+            # Headers are already sent; without the final chunk the client sees the export as incomplete
+            self.close_connection = True
+            raise
+
+    def do_POST(self):
+        if self.path.split("?")[0] != "/predict":
+            self._send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self._send_json(413, {"error": "request body too large"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length) or b"null")
+            records = payload if isinstance(payload, list) else [payload]
+            if not records or not all(isinstance(record, dict) for record in records):
+                raise ValueError("Expected a JSON object or a list of objects")
+            results = predict_records(records, user=self.headers.get("X-User", "api"), key=self.headers.get("X-User"))
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        self._send_json(200, results if isinstance(payload, list) else results[0])
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(host="127.0.0.1", port=8601):
+    load_bundle()
+    server = ThreadingHTTPServer((host, port), PredictionHandler)
+    server.daemon_threads = True
+    print(f"API worker {os.getpid()} listening on http://{host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve JSON predictions")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8601)
+    args = parser.parse_args()
+    serve(args.host, args.port)
@@ -1,50 +1,39 @@
 import streamlit as st
-import hashlib
-from datetime import datetime
+
+from sleep_diary import empty_insights, update_insights
+from log_writer import log_predictions
+from storage import load_diary
+from user_directory import check_login, create_accounts, ensure_default_admin
 
 def init_auth():
-    """Initialize authentication system with default admin user."""
+    """Initialize authentication system (creating the first admin from the environment)."""
     if 'authenticated' not in st.session_state:
+        ensure_default_admin()
         st.session_state.authenticated = False
     if 'username' not in st.session_state:
         st.session_state.username = None
     if 'is_admin' not in st.session_state:
         st.session_state.is_admin = False
-    if 'users' not in st.session_state:
-        st.session_state.users = {
-            "admin": {
-                "password_hash": hashlib.sha256("admin123".encode()).hexdigest(),
-                "is_admin": True
-            }
-        }
-    if 'prediction_logs' not in st.session_state:
-        st.session_state.prediction_logs = []
     if 'advanced_sleep_log' not in st.session_state:
         st.session_state.advanced_sleep_log = []
-
-def hash_password(password):
-    """Hash password using SHA-256."""
-    return hashlib.sha256(password.encode()).hexdigest()
+    if 'sleep_insights' not in st.session_state:
+        st.session_state.sleep_insights = empty_insights()
 
 def authenticate(username, password):
     """Authenticate user credentials."""
-    if username in st.session_state.users:
-        if st.session_state.users[username]["password_hash"] == hash_password(password):
-            st.session_state.authenticated = True
-            st.session_state.username = username
-            st.session_state.is_admin = st.session_state.users[username].get("is_admin", False)
-            return True
+    account = check_login(username, password)
+    if account is not None:
+        st.session_state.authenticated = True
+        st.session_state.username = username
+        st.session_state.is_admin = bool(account["is_admin"])
+        st.session_state.advanced_sleep_log = load_diary(username)
+        st.session_state.sleep_insights = update_insights(empty_insights(), st.session_state.advanced_sleep_log)
+        return True
     return False
 
 def create_account(username, password, is_admin=False):
     """Create a new user account."""
-    if username in st.session_state.users:
-        return False
-    st.session_state.users[username] = {
-        "password_hash": hash_password(password),
-        "is_admin": is_admin
-    }
-    return True
+    return create_accounts([(username, password, is_admin)]) == 1
 
 def logout():
     """Log out the current user."""
@@ -52,13 +41,6 @@ def logout():
     st.session_state.username = None
     st.session_state.is_admin = False
 
-def log_prediction(user, input_data, prediction, probability):
-    """Log prediction results."""
-    log_entry = {
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "user": user,
-        "input_data": input_data.to_dict(orient='records')[0],
-        "prediction": prediction,
-        "probability": probability.tolist()[0]
-    }
-    st.session_state.prediction_logs.append(log_entry)
\ No newline at end of file
+def log_prediction(user, input_data, prediction, probability, version=None):
+    """Log prediction results (written to the store in the background)."""
+    log_predictions(user, input_data, [prediction], probability, version=version)
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""Nightly batch scoring of every user's latest profile.
+
+    python batch_scoring.py --workers 4 --batch-size 5000
+
+Each user's most recent interactive inputs are taken from the prediction log,
+sleep duration, quality and stress are replaced by the averages of their
+recent diary nights when they have any, and users are scored in vectorized
+batches with the same encoding and model as the prediction page. Results are
+appended to the prediction log with source ``batch``. The run checkpoint is
+advanced in the same transaction as each batch's results, so an interrupted
+run picks up after the last committed user when started again.
+"""
+import argparse
+import contextlib
+import io
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from modeling import predict_batch, model_version
+from storage import latest_inputs_page, recent_diary_means, open_batch_run, commit_batch, finish_batch_run
+
+DIARY_FEATURES = ['Sleep Duration', 'Quality of Sleep', 'Stress Level']
+DIARY_NIGHTS = 14
+
+_bundle = None
+
+
+def _init_worker():
+    """Load the model once per process (memory-mapped when a compact export exists)"""
+    global _bundle
+    from startup import load_model_bundle
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        _bundle = load_model_bundle()
+
+def build_features(profiles, diary_means):
+    """Model inputs for a page of (user, inputs) pairs, with diary averages folded in"""
+    users = [user for user, _ in profiles]
+    frame = pd.DataFrame([inputs for _, inputs in profiles], index=users)
+    diary = pd.DataFrame.from_dict(diary_means, orient='index', columns=DIARY_FEATURES).reindex(users)
+    diary['Sleep Duration'] = diary['Sleep Duration'].round(1)
+    diary[['Quality of Sleep', 'Stress Level']] = diary[['Quality of Sleep', 'Stress Level']].round()
+    frame[DIARY_FEATURES] = diary.combine_first(frame[DIARY_FEATURES].astype(float))
+    return frame
+
+def score_page(profiles):
+    """Score one page of users; returns prediction log rows"""
+    model, scaler, label_encoder = _bundle["model"], _bundle["scaler"], _bundle["label_encoder"]
+    users = [user for user, _ in profiles]
+    frame = build_features(profiles, recent_diary_means(users, DIARY_NIGHTS))[list(scaler.feature_names_in_)]
+    labels, proba = predict_batch(model, scaler, label_encoder, frame, _bundle.get("calibrator"))
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    version = model_version(model)
+    return [
+        (timestamp, user, inputs, label, row, "batch", version)
+        for user, inputs, label, row in zip(users, frame.to_dict(orient='records'), labels, proba.tolist())
+    ]
+
+def iter_pages(after_user, batch_size):
+    """Pages of (user, latest inputs), in username order, starting after ``after_user``"""
+    while True:
+        page = latest_inputs_page(after_user, batch_size)
+        if not page:
+            return
+        yield page
+        after_user = page[-1][0]
+
+def run(workers=1, batch_size=5000, run_id=None):
+    """Score every user, resuming an unfinished run if there is one; returns the run summary"""
+    run_state = open_batch_run(run_id)
+    run_id, after_user = run_state["run_id"], run_state["last_user"] or ""
+    if after_user:
+        print(f"Resuming {run_id} after user {after_user!r} ({run_state['scored']} already scored)")
+    start = time.perf_counter()
+    scored = 0
+
+    def commit(page, log_rows):
+        nonlocal scored
+        commit_batch(run_id, log_rows, page[-1][0])
+        scored += len(log_rows)
+        print(f"{run_id}: {scored} users scored ({scored / (time.perf_counter() - start):.0f}/s)")
+
+    # Trains and saves the artifact if there is none, once, so pool workers only ever load it
+    _init_worker()
+    if workers <= 1:
+        for page in iter_pages(after_user, batch_size):
+            commit(page, score_page(page))
+    else:
+        # Keep a bounded number of pages in flight and commit them in order, so
+        # the checkpoint only ever moves past users whose results are stored.
+        with ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+            in_flight = deque()
+            for page in iter_pages(after_user, batch_size):
+                in_flight.append((page, pool.submit(score_page, page)))
+                if len(in_flight) >= 2 * workers:
+                    page, future = in_flight.popleft()
+                    commit(page, future.result())
+            while in_flight:
+                page, future = in_flight.popleft()
+                commit(page, future.result())
+
+    finish_batch_run(run_id)
+    return {"run_id": run_id, "scored": run_state["scored"] + scored, "seconds": time.perf_counter() - start}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score every user's latest profile into the prediction log")
+    parser.add_argument("--workers", type=int, default=1, help="scoring processes")
+    parser.add_argument("--batch-size", type=int, default=5000, help="users per vectorized batch")
+    parser.add_argument("--run-id", default=None, help="resume or name a specific run")
+    args = parser.parse_args()
+    summary = run(args.workers, args.batch_size, args.run_id)
+    print(f"{summary['run_id']} finished: {summary['scored']} users in {summary['seconds']:.1f} s")
@@ -0,0 +1,288 @@
+"""Micro-benchmarks for the Sleepytics model pipeline.
+
+Run with ``python benchmarks.py <name>`` (or ``all``); each benchmark prints a
+small report to stdout.
+"""
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_processing import load_data, preprocess_data
+from modeling import train_model, predict
+
+SAMPLE_INPUT = {
+    'Gender': ['Male'], 'Age': [30], 'Occupation': ['Doctor'], 'Sleep Duration': [7.0],
+    'Quality of Sleep': [7], 'Physical Activity Level': [50], 'Stress Level': [5],
+    'BMI Category': ['Normal'], 'Heart Rate': [70], 'Daily Steps': [8000],
+    'Systolic': [120], 'Diastolic': [80]
+}
+
+
+def time_call(fn, repeat):
+    """Median and 95th percentile wall time of ``fn()`` in milliseconds"""
+    fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.median(timings), np.percentile(timings, 95)
+
+def trained_pipeline():
+    """Train the default model quietly and return its pieces"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        df_processed, label_encoder = preprocess_data(load_data())
+        model, scaler, accuracy = train_model(df_processed)
+    return model, scaler, label_encoder
+
+def report(rows):
+    print(pd.DataFrame(rows, columns=['Step', 'Median (ms)', 'p95 (ms)']).round(3).to_string(index=False))
+
+def bench_attribution(repeat=200):
+    """Per-request feature attribution latency relative to a single prediction"""
+    from explainability import explain_prediction, flat_forest
+
+    model, scaler, label_encoder = trained_pipeline()
+    input_data = pd.DataFrame(SAMPLE_INPUT)
+    _, proba = predict(model, scaler, label_encoder, input_data)
+
+    start = time.perf_counter()
+    flat_forest(model)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    rows = [
+        ('predict', *time_call(lambda: predict(model, scaler, label_encoder, input_data), repeat)),
+        ('explain_prediction', *time_call(
+            lambda: explain_prediction(model, scaler, label_encoder, input_data, proba[0].argmax()), repeat)),
+    ]
+    report(rows)
+    print(f"Node arrays built once per model version in {build_ms:.1f} ms")
+    print(f"Attribution / prediction latency: {rows[1][1] / rows[0][1]:.2f}x")
+
+def synthetic_diaries(n_users, max_nights=90, seed=0):
+    """Long-format diary rows for ``n_users`` users with random history lengths"""
+    from datetime import date, timedelta
+
+    rng = np.random.default_rng(seed)
+    nights = rng.integers(5, max_nights + 1, size=n_users)
+    n_rows = nights.sum()
+    bed_minutes = rng.integers(21 * 60, 24 * 60 + 60, size=n_rows) % 1440
+    return pd.DataFrame({
+        'user': np.repeat([f"user{i}" for i in range(n_users)], nights),
+        'Date': [date(2026, 1, 1) + timedelta(days=int(d)) for d in np.concatenate([np.arange(n) for n in nights])],
+        'Bedtime': pd.to_datetime(bed_minutes, unit='m').time,
+        'Wake Time': pd.to_datetime(rng.integers(6 * 60, 8 * 60, size=n_rows), unit='m').time,
+        'Sleep Duration': rng.uniform(5, 9, size=n_rows).round(1),
+        'Quality of Sleep': rng.integers(1, 11, size=n_rows),
+    })
+
+def bench_alarm_batch(n_users=10000):
+    """Next-week alarm schedules for a synthetic user population"""
+    from alarm_planner import plan_week_batch
+
+    diaries = synthetic_diaries(n_users)
+    start = time.perf_counter()
+    schedule = plan_week_batch(diaries)
+    elapsed = time.perf_counter() - start
+    print(f"{n_users} users, {len(diaries)} diary nights -> {len(schedule)} scheduled alarms "
+          f"in {elapsed:.2f} s ({elapsed / n_users * 1e6:.0f} us/user)")
+
+def bench_recommendations(n_users=200000):
+    """Batch personalized plans for a synthetic population, cold and memoized"""
+    from recommendation_rules import SLEEP_GOALS, LIFESTYLE_FACTORS, ENVIRONMENTAL_FACTORS, generate_plans
+
+    rng = np.random.default_rng(0)
+    lifestyle, environment = np.array(LIFESTYLE_FACTORS), np.array(ENVIRONMENTAL_FACTORS)
+    profiles = pd.DataFrame({
+        'sleep_goal': rng.choice(SLEEP_GOALS, size=n_users),
+        'lifestyle_factors': [list(lifestyle[rng.random(len(lifestyle)) < 0.25]) for _ in range(n_users)],
+        'environmental_factors': [list(environment[rng.random(len(environment)) < 0.2]) for _ in range(n_users)],
+    })
+    for label in ('cold', 'memoized'):
+        start = time.perf_counter()
+        plans = generate_plans(profiles)
+        print(f"{label}: {n_users} plans ({plans['signature'].nunique()} distinct signatures) "
+              f"in {time.perf_counter() - start:.2f} s")
+
+
+def bench_prediction_log(repeat=2000):
+    """Request-path cost of logging a prediction: synchronous insert vs. background writer"""
+    import tempfile
+
+    import storage
+    from log_writer import PredictionLogWriter
+
+    input_data = pd.DataFrame(SAMPLE_INPUT)
+    proba = np.array([[0.1, 0.2, 0.7]])
+    default_db_path = storage.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        # The writer uses the default connection, so point it at a scratch database for the run
+        storage.DB_PATH = f"{tmp}/bench.db"
+        try:
+            writer = PredictionLogWriter()
+
+            def insert_now():
+                storage.insert_prediction_logs([(
+                    time.strftime("%Y-%m-%d %H:%M:%S"), "bench", input_data.to_dict(orient='records')[0],
+                    "No Sleep Disorder", proba.tolist()[0], "interactive", None
+                )])
+
+            rows = [
+                ('synchronous insert', *time_call(insert_now, repeat)),
+                ('queued (PredictionLogWriter.submit)', *time_call(
+                    lambda: writer.submit("bench", input_data, ["No Sleep Disorder"], proba), repeat)),
+            ]
+            start = time.perf_counter()
+            writer.close()
+            rows.append(('drain queue after submits (total)', (time.perf_counter() - start) * 1000, np.nan))
+            report(rows)
+            print(f"{writer.written} rows written by the background writer, {writer.failed} failed")
+        finally:
+            storage.DB_PATH = default_db_path
+
+def bench_calibration(repeat=500, batch_rows=10000):
+    """Latency added by calibrating probabilities, per request and per batch"""
+    from calibration import fit_calibrator
+    from modeling import predict_batch
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        df_processed, label_encoder = preprocess_data(load_data())
+        model, scaler, _ = train_model(df_processed)
+    calibrator = fit_calibrator(model, scaler, df_processed)
+    input_data = pd.DataFrame(SAMPLE_INPUT)
+    batch = input_data.loc[np.zeros(batch_rows, dtype=int)].reset_index(drop=True)
+    raw = model.predict_proba(scaler.transform(df_processed.drop(['Sleep Disorder', 'Person ID'], axis=1)))
+    raw = raw[np.arange(batch_rows) % len(raw)]
+
+    report([
+        ('predict (raw)', *time_call(lambda: predict(model, scaler, label_encoder, input_data), repeat)),
+        ('predict (calibrated)', *time_call(
+            lambda: predict(model, scaler, label_encoder, input_data, calibrator), repeat)),
+        ('calibrate + decide, 1 row', *time_call(lambda: calibrator.decide(calibrator.calibrate(raw[:1])), repeat)),
+        (f'calibrate + decide, {batch_rows} rows', *time_call(
+            lambda: calibrator.decide(calibrator.calibrate(raw)), 50)),
+        (f'predict_batch (calibrated), {batch_rows} rows', *time_call(
+            lambda: predict_batch(model, scaler, label_encoder, batch, calibrator), 5)),
+    ])
+
+def bench_neighbors(n_rows=1_000_000, k=10, batch=1000, repeat=200):
+    """k-nearest-neighbor lookup over synthetic scaled records, KD-tree vs. brute force"""
+    from neighbors import NeighborIndex, BRUTE_FORCE_MAX_ROWS
+
+    _, scaler, _ = trained_pipeline()
+    rng = np.random.default_rng(0)
+    df_processed, _ = preprocess_data(load_data())
+    base = scaler.transform(df_processed[list(scaler.feature_names_in_)])
+    # Resampled training rows plus jitter, so the synthetic set has the real data's clustering
+    points = base[rng.integers(len(base), size=n_rows)] + rng.normal(scale=0.05, size=(n_rows, base.shape[1]))
+    queries = base[rng.integers(len(base), size=batch)] + rng.normal(scale=0.05, size=(batch, base.shape[1]))
+
+    rows = []
+    for label, method, size in (('kd_tree', 'kd_tree', n_rows), ('brute', 'brute', BRUTE_FORCE_MAX_ROWS)):
+        start = time.perf_counter()
+        index = NeighborIndex(points[:size], method)
+        rows.append((f'{label} build, {size} rows', (time.perf_counter() - start) * 1000, np.nan))
+        rows.append((f'{label} 1 query', *time_call(lambda: index.query(queries[:1], k), repeat)))
+        rows.append((f'{label} {batch} queries', *time_call(lambda: index.query(queries, k), 3)))
+    report(rows)
+
+def bench_cohorts(n_rows=1_000_000, repeat=50):
+    """Cohort slice queries from the cube vs. re-aggregating the raw frame"""
+    from cohorts import CohortCube, cohort_frame
+
+    frame = cohort_frame(load_data())
+    frame = frame.iloc[np.random.default_rng(0).integers(len(frame), size=n_rows)].reset_index(drop=True)
+    start = time.perf_counter()
+    cube = CohortCube.from_frame(frame)
+    build_ms = (time.perf_counter() - start) * 1000
+    group_by, filters = ['Occupation', 'Sleep Disorder'], {'BMI Category': ['Obese', 'Overweight'], 'Gender': ['Male']}
+
+    def groupby_raw():
+        mask = frame['BMI Category'].isin(filters['BMI Category']) & frame['Gender'].isin(filters['Gender'])
+        return frame[mask].groupby(group_by)[['Sleep Duration', 'Stress Level', 'Heart Rate']].agg(['size', 'mean'])
+
+    report([
+        (f'build cube from {n_rows} rows', build_ms, np.nan),
+        ('cube query', *time_call(lambda: cube.query(group_by, filters), repeat)),
+        ('pandas groupby on raw rows', *time_call(groupby_raw, 5)),
+    ])
+    print(f"cube: {cube.counts.size} cells, {cube.nbytes / 1024:.1f} KB")
+
+def bench_user_directory(n_users=300000, repeat=200):
+    """Admin user directory over a large account table: bulk import, search, paging and counts"""
+    import os
+    import tempfile
+    import user_directory
+    from storage import count_users, get_connection, insert_users, users_page
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = get_connection(os.path.join(tmp, "users.db"))
+        # One shared hash: this measures the store, and scrypt costs tens of milliseconds per password
+        password_hash = user_directory.hash_password("secret")
+        rows = [(f"user{i:07d}", password_hash, i % 100 == 0, "2024-01-01 00:00:00") for i in range(n_users)]
+        start = time.perf_counter()
+        insert_users(rows, conn=conn)
+        import_ms = (time.perf_counter() - start) * 1000
+        middle = f"user{n_users // 2:07d}"
+        report([
+            (f'bulk create {n_users} accounts (one transaction)', import_ms, np.nan),
+            ('first page', *time_call(lambda: users_page(limit=51, conn=conn), repeat)),
+            ('page from the middle (keyset)', *time_call(lambda: users_page(after=middle, limit=51, conn=conn), repeat)),
+            ('same page by OFFSET', *time_call(lambda: conn.execute(
+                "SELECT username, is_admin, created FROM users ORDER BY username LIMIT 51 OFFSET ?",
+                (n_users // 2,)).fetchall(), 20)),
+            ('prefix search page', *time_call(lambda: users_page("user01234", limit=51, conn=conn), repeat)),
+            ('admins page', *time_call(lambda: users_page(is_admin=True, after=middle, limit=51, conn=conn), repeat)),
+            ('count all (uncached)', *time_call(lambda: count_users(conn=conn), 20)),
+            ('count prefix (uncached)', *time_call(lambda: count_users("user01", conn=conn), repeat)),
+        ])
+
+def bench_model_router(repeat=500):
+    """Request-path latency of routing: primary only, with a shadow candidate, and a split to it"""
+    from explainability import flat_forest
+    from model_router import ModelRouter
+
+    model, scaler, label_encoder = trained_pipeline()
+    primary = {"model": model, "scaler": scaler, "label_encoder": label_encoder}
+    candidate = dict(primary, model=flat_forest(model).prune(n_trees=25, max_depth=8).compact())
+    input_data = pd.DataFrame(SAMPLE_INPUT)
+    routers = {
+        'off': ModelRouter(primary, flush_interval=float('inf')),
+        'shadow': ModelRouter(primary, candidate, "shadow", flush_interval=float('inf')),
+        'split 100%': ModelRouter(primary, candidate, "split", 100, flush_interval=float('inf')),
+    }
+    report([
+        ('predict (no router)', *time_call(lambda: predict(model, scaler, label_encoder, input_data), repeat)),
+        *((f'router {name}', *time_call(lambda: router.predict(input_data, key="user"), repeat))
+          for name, router in routers.items()),
+    ])
+    shadow = routers['shadow']
+    shadow._pool.shutdown(wait=True)
+    stats = shadow._stats["candidate"]
+    print(f"shadow: {stats.requests} requests, {stats.dropped} dropped, "
+          f"agreement {stats.agreed / max(stats.compared, 1) * 100:.1f}% over {stats.compared} rows")
+
+BENCHMARKS = {
+    'attribution': bench_attribution,
+    'alarm_batch': bench_alarm_batch,
+    'recommendations': bench_recommendations,
+    'prediction_log': bench_prediction_log,
+    'calibration': bench_calibration,
+    'neighbors': bench_neighbors,
+    'cohorts': bench_cohorts,
+    'user_directory': bench_user_directory,
+    'model_router': bench_model_router,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("name", choices=sorted(BENCHMARKS) + ["all"])
+    args = parser.parse_args()
+    for name, bench in BENCHMARKS.items():
+        if args.name in (name, "all"):
+            print(f"== {name} ==")
+            bench()
@@ -0,0 +1,179 @@
+"""Offline probability calibration and decision thresholds for the forest.
+
+Random-forest vote fractions are not probabilities: they bunch up away from 0
+and 1. During training, out-of-fold forest probabilities on the training set
+are used to fit one calibration curve per class (isotonic regression, or a
+Platt sigmoid tabulated on a grid) and per-class decision weights that
+maximize macro F1. Only the curve knots and weights are stored with the model
+artifact, so calibrating at inference time is one ``np.interp`` per class.
+
+    python calibration.py                       # refit the calibrator of the saved artifact
+    python calibration.py --method sigmoid
+    python calibration.py --report              # reliability table + artifacts/reliability.html
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from modeling import DISORDER_MAPPING, holdout_split
+
+N_FOLDS = 5
+N_RELIABILITY_BINS = 10
+PLATT_GRID = np.linspace(0, 1, 101)
+WEIGHT_GRID = np.round(np.geomspace(0.5, 2, 9), 3)
+# Decision weights are only kept if they beat plain argmax by this much out of fold
+MIN_F1_GAIN = 0.005
+RELIABILITY_REPORT_PATH = "artifacts/reliability.html"
+
+
+class ProbabilityCalibrator:
+    """Per-class calibration curves stored as interpolation knots, plus decision weights"""
+
+    def __init__(self, method, knots, decision_weights):
+        self.method = method
+        self.knots = knots
+        self.decision_weights = decision_weights
+
+    def calibrate(self, proba):
+        """Calibrated class probabilities for raw forest probabilities (rows sum to 1)"""
+        calibrated = np.column_stack([np.interp(proba[:, k], x, y) for k, (x, y) in enumerate(self.knots)])
+        totals = calibrated.sum(axis=1, keepdims=True)
+        return np.where(totals > 0, calibrated / np.where(totals > 0, totals, 1), proba)
+
+    def decide(self, proba):
+        """Index of the predicted class for calibrated probabilities"""
+        return (proba * self.decision_weights).argmax(axis=1)
+
+def out_of_fold_proba(model, X, y, n_folds=N_FOLDS):
+    """Probabilities for every training row from a forest that did not see it"""
+    from sklearn.base import clone
+    from sklearn.model_selection import StratifiedKFold, cross_val_predict
+
+    folds = StratifiedKFold(n_folds, shuffle=True, random_state=42)
+    return cross_val_predict(clone(model), X, y, cv=folds, method="predict_proba")
+
+def calibration_knots(scores, targets, method):
+    """(x, y) knots of one class's calibration curve"""
+    if method == "isotonic":
+        from sklearn.isotonic import IsotonicRegression
+
+        isotonic = IsotonicRegression(y_min=0, y_max=1, out_of_bounds="clip").fit(scores, targets)
+        return isotonic.X_thresholds_.astype(np.float64), isotonic.y_thresholds_.astype(np.float64)
+    from sklearn.linear_model import LogisticRegression
+
+    platt = LogisticRegression(C=1e4).fit(scores.reshape(-1, 1), targets)
+    return PLATT_GRID, platt.predict_proba(PLATT_GRID.reshape(-1, 1))[:, 1]
+
+def tune_decision_weights(proba, y_index):
+    """Per-class weights on calibrated probabilities that maximize out-of-fold macro F1"""
+    from itertools import product
+    from sklearn.metrics import f1_score
+
+    n_classes = proba.shape[1]
+    best_weights = np.ones(n_classes)
+    baseline = best_score = f1_score(y_index, proba.argmax(axis=1), average="macro")
+    # The last class keeps weight 1; only the ratios between classes matter
+    for weights in product(WEIGHT_GRID, repeat=n_classes - 1):
+        weights = np.array(weights + (1.0,))
+        score = f1_score(y_index, (proba * weights).argmax(axis=1), average="macro")
+        if score > best_score:
+            best_weights, best_score = weights, score
+    return best_weights if best_score - baseline >= MIN_F1_GAIN else np.ones(n_classes)
+
+def fit_calibrator(model, scaler, df_processed, method="isotonic"):
+    """Fit calibration curves and decision weights on out-of-fold training predictions"""
+    X_train, _, y_train, _ = holdout_split(df_processed)
+    X_train = scaler.transform(X_train)
+    y_index = np.searchsorted(model.classes_, np.asarray(y_train))
+    raw = out_of_fold_proba(model, X_train, y_train)
+    knots = [calibration_knots(raw[:, k], (y_index == k).astype(float), method) for k in range(raw.shape[1])]
+    calibrator = ProbabilityCalibrator(method, knots, np.ones(raw.shape[1]))
+    calibrator.decision_weights = tune_decision_weights(calibrator.calibrate(raw), y_index)
+    return calibrator
+
+def reliability_table(proba, y_index, n_bins=N_RELIABILITY_BINS):
+    """Mean predicted vs. observed frequency per class and confidence bin"""
+    edges = np.linspace(0, 1, n_bins + 1)
+    rows = []
+    for k in range(proba.shape[1]):
+        bins = np.clip(np.searchsorted(edges, proba[:, k], side="right") - 1, 0, n_bins - 1)
+        counts = np.bincount(bins, minlength=n_bins)
+        predicted = np.bincount(bins, weights=proba[:, k], minlength=n_bins)
+        observed = np.bincount(bins, weights=(y_index == k).astype(float), minlength=n_bins)
+        for b in np.flatnonzero(counts):
+            rows.append({"Class": k, "Bin": f"{edges[b]:.1f}-{edges[b + 1]:.1f}", "Count": counts[b],
+                         "Mean Predicted": predicted[b] / counts[b], "Observed": observed[b] / counts[b]})
+    return pd.DataFrame(rows)
+
+def calibration_metrics(proba, y_index):
+    """Expected calibration error, Brier score and log loss of class probabilities"""
+    table = reliability_table(proba, y_index)
+    ece = (table["Count"] * (table["Mean Predicted"] - table["Observed"]).abs()).sum() / (len(y_index) * proba.shape[1])
+    onehot = np.eye(proba.shape[1])[y_index]
+    return {
+        "ECE": ece,
+        "Brier": ((proba - onehot) ** 2).sum(axis=1).mean(),
+        "Log Loss": -np.log(np.clip(proba[np.arange(len(y_index)), y_index], 1e-6, 1)).mean(),
+    }
+
+def reliability_report(bundle, df_processed, path=RELIABILITY_REPORT_PATH):
+    """Held-out calibration metrics, raw vs. calibrated; writes a reliability diagram to ``path``"""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    model, calibrator = bundle["model"], bundle["calibrator"]
+    _, X_test, _, y_test = holdout_split(df_processed)
+    y_index = np.searchsorted(model.classes_, np.asarray(y_test))
+    raw = model.predict_proba(bundle["scaler"].transform(X_test))
+    calibrated = calibrator.calibrate(raw)
+    metrics = pd.DataFrame([
+        {"Probabilities": "raw", **calibration_metrics(raw, y_index), "Accuracy": (raw.argmax(axis=1) == y_index).mean()},
+        {"Probabilities": f"calibrated ({calibrator.method})", **calibration_metrics(calibrated, y_index),
+         "Accuracy": (calibrator.decide(calibrated) == y_index).mean()},
+    ])
+
+    names = [DISORDER_MAPPING[c] for c in model.classes_]
+    fig = make_subplots(rows=1, cols=len(names), subplot_titles=names, shared_yaxes=True)
+    for k in range(len(names)):
+        fig.add_trace(go.Scatter(x=[0, 1], y=[0, 1], mode="lines", line=dict(dash="dot", color="gray"),
+                                 showlegend=False), row=1, col=k + 1)
+        for label, proba, color in (("raw", raw, "#EF553B"), ("calibrated", calibrated, "#636EFA")):
+            table = reliability_table(proba, y_index)
+            table = table[table["Class"] == k]
+            fig.add_trace(go.Scatter(x=table["Mean Predicted"], y=table["Observed"], mode="lines+markers",
+                                     name=label, legendgroup=label, showlegend=k == 0, line=dict(color=color),
+                                     text=table["Count"], hovertemplate="n=%{text}"), row=1, col=k + 1)
+    fig.update_layout(title="Reliability diagram (held-out set)", height=420)
+    fig.update_xaxes(title_text="Mean predicted probability", range=[0, 1])
+    fig.update_yaxes(title_text="Observed frequency", range=[0, 1], col=1)
+    if path:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fig.write_html(path)
+    return metrics, fig
+
+
+if __name__ == "__main__":
+    from data_processing import load_data, preprocess_data
+    from modeling import MODEL_ARTIFACT_PATH, load_model_artifact, save_model_artifact
+
+    parser = argparse.ArgumentParser(description="Fit or report the probability calibration of the saved model")
+    parser.add_argument("--method", choices=["isotonic", "sigmoid"], default="isotonic")
+    parser.add_argument("--report", action="store_true", help="print held-out calibration metrics instead of refitting")
+    args = parser.parse_args()
+
+    df_processed, _ = preprocess_data(load_data())
+    bundle = load_model_artifact(MODEL_ARTIFACT_PATH)
+    if args.report:
+        metrics, _ = reliability_report(bundle, df_processed)
+        print(metrics.round(4).to_string(index=False))
+        print(f"Reliability diagram written to {RELIABILITY_REPORT_PATH}")
+    else:
+        # Imported by module name so the pickled calibrator does not refer to __main__
+        from calibration import fit_calibrator as fit
+
+        bundle["calibrator"] = fit(bundle["model"], bundle["scaler"], df_processed, args.method)
+        save_model_artifact(bundle, MODEL_ARTIFACT_PATH)
+        print(f"Saved {args.method} calibrator (decision weights {bundle['calibrator'].decision_weights.tolist()}) "
+              f"to {MODEL_ARTIFACT_PATH}; re-run model_export.py to update a compact export")
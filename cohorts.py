@@ -0,0 +1,141 @@
+"""Cohort cubes over the training data for population dashboards.
+
+The dataset is aggregated once into a dense cube indexed by occupation x BMI
+category x gender x age band x disorder, holding the row count and the sums
+of sleep duration, stress level and heart rate for every cell. Any slice or
+group-by is then a few array reductions over a few thousand cells, however
+many rows the dataset has. Cubes are built once per dataset version (the
+size and modification time of the data files) and saved as a compressed
+``.npz`` so every worker process loads the same one.
+"""
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+DATA_FILES = ['data/data.csv', 'data/data2.csv']
+CUBE_DIR = os.environ.get("SLEEPYTICS_COHORT_DIR", "artifacts/cohorts")
+DIMENSIONS = ['Occupation', 'BMI Category', 'Gender', 'Age Band', 'Sleep Disorder']
+MEASURES = ['Sleep Duration', 'Stress Level', 'Heart Rate']
+AGE_BAND_WIDTH = 10
+# Bumped when the cube's contents change for the same data, so stale cached cubes are not loaded
+CUBE_FORMAT = 2
+
+_CUBES = {}
+
+
+class CohortCube:
+    """Counts and measure sums over every combination of the dimension labels"""
+
+    def __init__(self, labels, counts, sums, version=None):
+        self.labels = labels
+        self.counts = counts
+        self.sums = sums
+        self.version = version
+
+    @classmethod
+    def from_frame(cls, df, version=None):
+        """Aggregate a frame that has all DIMENSIONS and MEASURES columns"""
+        codes, labels = [], {}
+        for dim in DIMENSIONS:
+            dim_codes, uniques = pd.factorize(df[dim], sort=True)
+            codes.append(dim_codes)
+            labels[dim] = np.asarray(uniques, dtype=str)
+        shape = tuple(len(labels[dim]) for dim in DIMENSIONS)
+        cell = np.ravel_multi_index(codes, shape)
+        n_cells = int(np.prod(shape))
+        counts = np.bincount(cell, minlength=n_cells).reshape(shape)
+        sums = np.stack([
+            np.bincount(cell, weights=df[measure].to_numpy(dtype=np.float64), minlength=n_cells).reshape(shape)
+            for measure in MEASURES
+        ], axis=-1)
+        return cls(labels, counts.astype(np.int32 if counts.max() < 2 ** 31 else np.int64), sums, version)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            labels = {dim: data[f"labels_{i}"] for i, dim in enumerate(DIMENSIONS)}
+            return cls(labels, data["counts"], data["sums"], str(data["version"]))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path, counts=self.counts, sums=self.sums, version=np.array(self.version or ""),
+            **{f"labels_{i}": self.labels[dim] for i, dim in enumerate(DIMENSIONS)}
+        )
+        os.replace(tmp_path, path)
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes + self.sums.nbytes
+
+    def query(self, group_by=(), filters=None):
+        """Counts and measure means grouped by ``group_by``, restricted to ``filters``.
+
+        ``filters`` maps a dimension to the labels to keep; an empty or missing
+        entry keeps every label. Groups with no rows are omitted.
+        """
+        counts, sums = self.counts, self.sums
+        labels = dict(self.labels)
+        for axis, dim in enumerate(DIMENSIONS):
+            keep = (filters or {}).get(dim)
+            if keep:
+                index = np.flatnonzero(np.isin(self.labels[dim], list(keep)))
+                counts = np.take(counts, index, axis=axis)
+                sums = np.take(sums, index, axis=axis)
+                labels[dim] = self.labels[dim][index]
+        group_axes = [DIMENSIONS.index(dim) for dim in group_by]
+        other_axes = tuple(axis for axis in range(len(DIMENSIONS)) if axis not in group_axes)
+        # Summing keeps the grouped axes in cube order; transpose them into group_by order
+        order = [sorted(group_axes).index(axis) for axis in group_axes]
+        counts = counts.sum(axis=other_axes).transpose(order)
+        sums = sums.sum(axis=other_axes).transpose(order + [len(order)])
+
+        if group_axes:
+            index = pd.MultiIndex.from_product([labels[dim] for dim in group_by], names=list(group_by))
+            result = pd.DataFrame({'Count': counts.reshape(-1)}, index=index)
+        else:
+            result = pd.DataFrame({'Count': [int(counts)]})
+        flat_sums = sums.reshape(-1, len(MEASURES))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for j, measure in enumerate(MEASURES):
+                result[f'Mean {measure}'] = flat_sums[:, j] / result['Count'].to_numpy()
+        return result[result['Count'] > 0].reset_index(drop=not group_axes)
+
+def cohort_frame(df):
+    """load_data() output with age bands and disorder names added"""
+    from data_processing import disorder_names
+
+    frame = df[['Occupation', 'BMI Category', 'Gender'] + MEASURES].copy()
+    band = (df['Age'] // AGE_BAND_WIDTH) * AGE_BAND_WIDTH
+    frame['Age Band'] = band.astype(str) + '-' + (band + AGE_BAND_WIDTH - 1).astype(str)
+    frame['Sleep Disorder'] = disorder_names(df['Sleep Disorder'])
+    return frame
+
+def dataset_version(paths=DATA_FILES):
+    """Fingerprint of the data files' sizes and modification times"""
+    digest = hashlib.sha1()
+    for path in paths:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()[:12]
+
+def cohort_cube(cube_dir=CUBE_DIR):
+    """The cube for the current dataset version, from memory, disk, or built from load_data()"""
+    version = dataset_version()
+    cube = _CUBES.get(version)
+    if cube is None:
+        path = os.path.join(cube_dir, f"cube-v{CUBE_FORMAT}-{version}.npz")
+        if os.path.exists(path):
+            cube = CohortCube.load(path)
+        else:
+            from data_processing import load_data
+
+            cube = CohortCube.from_frame(cohort_frame(load_data()), version)
+            cube.save(path)
+        _CUBES.clear()
+        _CUBES[version] = cube
+    return cube
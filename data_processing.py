@@ -43,13 +43,21 @@ def generate_sample_data():
     
     return data
 
+def disorder_names(disorders):
+    """Survey 'Sleep Disorder' values as names; records without a disorder are missing or 'None'"""
+    return disorders.replace('None', np.nan).fillna('No Sleep Disorder')
+
 def preprocess_data(df):
     """Preprocess the data for modeling"""
     df_processed = df.copy()
     le = LabelEncoder()
     categorical_columns = ['Gender', 'Occupation', 'BMI Category', 'Sleep Disorder']
+    column_classes = {}
     for column in categorical_columns:
         df_processed[column] = le.fit_transform(df_processed[column])
+        column_classes[column] = le.classes_
+    # The encoder is refit per column, so keep each vocabulary for encoding inputs at predict time
+    le.column_classes_ = column_classes
     
     df_processed['Systolic'] = df_processed['Blood Pressure'].apply(lambda x: int(x.split('/')[0]))
     df_processed['Diastolic'] = df_processed['Blood Pressure'].apply(lambda x: int(x.split('/')[1]))
@@ -0,0 +1,183 @@
+"""Input and prediction drift monitoring over the prediction log.
+
+Every model input is summarized by a fixed set of bins taken from the training
+data (deciles for numeric features, the training vocabulary plus "other" for
+categorical ones), so the monitor's memory depends only on the number of bins
+and days in the window, never on the number of logged predictions. Logged
+inputs are folded in incrementally from the last seen log id and compared to
+the training distribution with the Population Stability Index and a binned
+Kolmogorov-Smirnov statistic.
+"""
+import threading
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from modeling import CATEGORICAL_FEATURES, DISORDER_MAPPING
+from storage import iter_prediction_logs
+
+NUMERIC_FEATURES = [
+    'Age', 'Sleep Duration', 'Quality of Sleep', 'Physical Activity Level', 'Stress Level',
+    'Heart Rate', 'Daily Steps', 'Systolic', 'Diastolic'
+]
+N_QUANTILE_BINS = 10
+PSI_WARNING = 0.1
+PSI_ALERT = 0.25
+# Below this many observations PSI is dominated by sampling noise and is not flagged
+MIN_OBSERVATIONS = 50
+EPSILON = 1e-4
+
+
+def reference_features(df):
+    """Raw model inputs (12 features) from a load_data() frame"""
+    features = df[CATEGORICAL_FEATURES + [f for f in NUMERIC_FEATURES if f not in ('Systolic', 'Diastolic')]].copy()
+    pressure = df['Blood Pressure'].str.split('/', expand=True).astype(int)
+    features['Systolic'], features['Diastolic'] = pressure[0], pressure[1]
+    return features
+
+class FeatureBins:
+    """Fixed binning for one feature; ``index`` maps values to bin numbers"""
+
+    def __init__(self, name, values):
+        self.name = name
+        self.categorical = name in CATEGORICAL_FEATURES
+        if self.categorical:
+            self.labels = sorted(pd.Series(values).dropna().astype(str).unique()) + ['other']
+        else:
+            quantiles = np.quantile(np.asarray(values, dtype=float), np.linspace(0, 1, N_QUANTILE_BINS + 1)[1:-1])
+            self.edges = np.unique(quantiles)
+            bounds = np.concatenate([[-np.inf], self.edges, [np.inf]])
+            self.labels = [f"{lo:g} – {hi:g}" for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def index(self, values):
+        if self.categorical:
+            positions = pd.Index(self.labels[:-1]).get_indexer(pd.Series(values).astype(str))
+            return np.where(positions < 0, len(self.labels) - 1, positions)
+        values = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=float)
+        return np.searchsorted(self.edges, values, side='right')
+
+    def histogram(self, values):
+        return np.bincount(self.index(values), minlength=len(self))
+
+@lru_cache(maxsize=1)
+def training_reference():
+    """Bins and reference histograms from the training datasets, built once per process"""
+    from data_processing import load_data, preprocess_data
+
+    df = load_data()
+    features = reference_features(df)
+    bins = {name: FeatureBins(name, features[name]) for name in features.columns}
+    histograms = {name: bins[name].histogram(features[name]) for name in bins}
+    # DISORDER_MAPPING names label-encoder codes (model classes) only; the training labels are
+    # encoded first so the reference mix uses the same names as logged predictions
+    encoded_labels = preprocess_data(df)[0]['Sleep Disorder']
+    classes = list(DISORDER_MAPPING.values())
+    class_counts = encoded_labels.map(DISORDER_MAPPING).value_counts().reindex(classes, fill_value=0).to_numpy()
+    return bins, histograms, classes, class_counts
+
+def psi(expected_counts, actual_counts):
+    """Population Stability Index between two histograms over the same bins"""
+    expected = np.maximum(expected_counts / max(expected_counts.sum(), 1), EPSILON)
+    actual = np.maximum(actual_counts / max(actual_counts.sum(), 1), EPSILON)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+def binned_ks(expected_counts, actual_counts):
+    """Largest CDF gap between two histograms over the same ordered bins"""
+    expected = np.cumsum(expected_counts) / max(expected_counts.sum(), 1)
+    actual = np.cumsum(actual_counts) / max(actual_counts.sum(), 1)
+    return float(np.max(np.abs(expected - actual)))
+
+def drift_status(value, observations=MIN_OBSERVATIONS):
+    if observations < MIN_OBSERVATIONS:
+        return "too few samples"
+    return "alert" if value >= PSI_ALERT else "warning" if value >= PSI_WARNING else "ok"
+
+class DriftMonitor:
+    """Sliding-window histograms of logged inputs and predicted classes.
+
+    Counts are kept per day for the last ``window_days`` days, so memory is
+    bounded by days x features x bins. ``refresh()`` reads only log rows newer
+    than the last one it has seen.
+    """
+
+    def __init__(self, window_days=30, sources=("interactive",)):
+        self.window_days = window_days
+        self.sources = sources
+        self.bins, self.reference, self.classes, self.reference_classes = training_reference()
+        self.last_id = 0
+        self.daily = {}
+        self._lock = threading.Lock()
+
+    def _day_counts(self, day):
+        counts = self.daily.get(day)
+        if counts is None:
+            counts = {name: np.zeros(len(b), dtype=np.int64) for name, b in self.bins.items()}
+            counts['prediction'] = np.zeros(len(self.classes), dtype=np.int64)
+            self.daily[day] = counts
+        return counts
+
+    def update(self, rows):
+        """Fold (id, timestamp, input_data, prediction) rows into the daily histograms"""
+        if not rows:
+            return
+        frame = pd.DataFrame([inputs for _, _, inputs, _ in rows])
+        frame['day'] = [timestamp[:10] for _, timestamp, _, _ in rows]
+        frame['prediction'] = [prediction for _, _, _, prediction in rows]
+        for day, group in frame.groupby('day'):
+            counts = self._day_counts(day)
+            for name, b in self.bins.items():
+                if name in group:
+                    counts[name] += b.histogram(group[name])
+            counts['prediction'] += (
+                group['prediction'].value_counts().reindex(self.classes, fill_value=0).to_numpy()
+            )
+        self.last_id = rows[-1][0]
+
+    def refresh(self):
+        """Pull new prediction log rows and drop days that left the window"""
+        start = (datetime.now() - timedelta(days=self.window_days - 1)).date()
+        with self._lock:
+            for page in iter_prediction_logs(self.last_id, since=start, sources=self.sources):
+                self.update(page)
+            for day in [d for d in self.daily if d < start.isoformat()]:
+                del self.daily[day]
+        return self
+
+    def window_counts(self):
+        totals = {name: np.zeros(len(b), dtype=np.int64) for name, b in self.bins.items()}
+        totals['prediction'] = np.zeros(len(self.classes), dtype=np.int64)
+        for counts in self.daily.values():
+            for name, values in counts.items():
+                totals[name] += values
+        return totals
+
+    def report(self):
+        """Per-feature PSI / KS against training, plus the predicted class mix"""
+        totals = self.window_counts()
+        rows = []
+        for name, b in self.bins.items():
+            value = psi(self.reference[name], totals[name])
+            rows.append({
+                'Feature': name,
+                'Observations': int(totals[name].sum()),
+                'PSI': round(value, 3),
+                'KS': None if b.categorical else round(binned_ks(self.reference[name], totals[name]), 3),
+                'Status': drift_status(value, totals[name].sum()),
+            })
+        class_mix = pd.DataFrame({
+            'Disorder': self.classes,
+            'Training (%)': 100 * self.reference_classes / max(self.reference_classes.sum(), 1),
+            'Predicted (%)': 100 * totals['prediction'] / max(totals['prediction'].sum(), 1),
+        }).round(1)
+        class_psi = psi(self.reference_classes, totals['prediction'])
+        return pd.DataFrame(rows), class_mix, class_psi
+
+@lru_cache(maxsize=4)
+def drift_monitor(window_days=30):
+    """Process-wide monitor per window, so each admin rerun only reads new log rows"""
+    return DriftMonitor(window_days)
@@ -1,5 +1,4 @@
 import streamlit as st
-import plotly.express as px
 import pandas as pd
 from datetime import datetime
 
@@ -34,6 +33,7 @@ def educational_resources():
         """)
 
         # Interactive sleep cycle visualization
+        import plotly.express as px
         st.subheader("Visualize a Sleep Cycle")
         sleep_stages = pd.DataFrame({
             "Stage": ["NREM 1", "NREM 2", "NREM 3", "REM"],
@@ -196,25 +196,26 @@ def educational_resources():
         st.subheader("Interactive Learning Zone")
         st.markdown("Test your knowledge, explore resources, and track your learning progress!")
 
-        # Sleep Quiz
-        st.subheader("Sleep Knowledge Quiz")
-        with st.form("sleep_quiz"):
-            q1 = st.radio("How long is a typical sleep cycle?", ["30 min", "60 min", "90 min", "120 min"])
-            q2 = st.radio("What hormone regulates sleep-wake cycles?", ["Adrenaline", "Melatonin", "Cortisol", "Insulin"])
-            q3 = st.radio("Which stage is most restorative?", ["NREM 1", "NREM 2", "NREM 3", "REM"])
-            submitted = st.form_submit_button("Submit Answers")
-            if submitted:
-                score = 0
-                if q1 == "90 min": score += 1
-                if q2 == "Melatonin": score += 1
-                if q3 == "NREM 3": score += 1
-                st.write(f"Your Score: {score}/3")
-                if score == 3:
-                    st.success("Perfect! You're a sleep expert!")
-                elif score >= 1:
-                    st.info("Good effort! Check the tabs for more details.")
-                else:
-                    st.warning("Time to brush up! Explore the other tabs.")
+        # Quizzes come from the question bank in data/quiz_questions.json
+        from quiz import load_quizzes, submit_quiz
+        for quiz in load_quizzes():
+            st.subheader(quiz["title"])
+            with st.form(quiz["id"]):
+                answers = {
+                    q["id"]: st.radio(q["text"], q["options"], key=f"{quiz['id']}_{q['id']}")
+                    for q in quiz["questions"]
+                }
+                submitted = st.form_submit_button("Submit Answers")
+                if submitted:
+                    score = submit_quiz(st.session_state.get("username"), quiz, answers)
+                    total = len(quiz["questions"])
+                    st.write(f"Your Score: {score}/{total}")
+                    if score == total:
+                        st.success("Perfect! You're a sleep expert!")
+                    elif score >= 1:
+                        st.info("Good effort! Check the tabs for more details.")
+                    else:
+                        st.warning("Time to brush up! Explore the other tabs.")
 
         # Downloadable Resource
         st.subheader("Downloadable Sleep Guide")
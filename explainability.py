@@ -0,0 +1,38 @@
+import pandas as pd
+
+from forest import FlatForest
+from modeling import model_version, encode_features
+
+# Flattened forests keyed by model version, so a reloaded or retrained but
+# identical forest reuses its node arrays instead of rebuilding them.
+_FLAT_FORESTS = {}
+_MAX_CACHED_VERSIONS = 4
+
+
+def flat_forest(model):
+    """Return the flattened node arrays for a model, cached per model version"""
+    if isinstance(model, FlatForest):
+        return model
+    version = model_version(model)
+    forest = _FLAT_FORESTS.get(version)
+    if forest is None:
+        if len(_FLAT_FORESTS) >= _MAX_CACHED_VERSIONS:
+            _FLAT_FORESTS.pop(next(iter(_FLAT_FORESTS)))
+        forest = FlatForest.from_sklearn(model, version)
+        _FLAT_FORESTS[version] = forest
+    return forest
+
+def feature_attributions(model, input_scaled):
+    """Per-feature contributions to every class probability for a batch of scaled inputs"""
+    return flat_forest(model).contributions(input_scaled)
+
+def explain_prediction(model, scaler, label_encoder, input_data, class_index):
+    """Contribution of each input feature to one class probability, in percentage points"""
+    input_scaled = scaler.transform(encode_features(label_encoder, input_data))
+    _, contrib = feature_attributions(model, input_scaled)
+    attributions = pd.DataFrame({
+        'Feature': list(scaler.feature_names_in_),
+        'Contribution': contrib[0, :, class_index] * 100
+    })
+    order = attributions['Contribution'].abs().sort_values(ascending=False).index
+    return attributions.loc[order].reset_index(drop=True)
@@ -0,0 +1,162 @@
+"""Streaming CSV / Parquet exports of prediction logs and sleep diaries.
+
+    python exports.py logs --start 2024-01-01 --end 2024-01-31 --format parquet -o logs.parquet
+
+Exports are generators of byte chunks built from keyset-paginated store
+queries, one page of rows at a time, so memory stays flat however many rows
+match. CSV pages are written as they are read. Parquet pages become row
+groups, written through a sink that hands each finished chunk back to the
+caller. The same generators back the API's chunked ``/export`` endpoints and
+the admin panel's download button, which is limited to ``MAX_DOWNLOAD_ROWS``
+rows because Streamlit holds a download in memory before sending it.
+"""
+import argparse
+import csv
+import io
+import json
+from datetime import date
+
+from storage import iter_diary_export, iter_log_export
+
+INPUT_FIELDS = [
+    'Gender', 'Age', 'Occupation', 'Sleep Duration', 'Quality of Sleep', 'Physical Activity Level',
+    'Stress Level', 'BMI Category', 'Heart Rate', 'Daily Steps', 'Systolic', 'Diastolic'
+]
+TEXT_INPUTS = ['Gender', 'Occupation', 'BMI Category']
+# Column name -> Parquet type ('int', 'float' or 'text'); CSV only uses the names
+LOG_COLUMNS = {
+    'id': 'int', 'timestamp': 'text', 'user': 'text', 'source': 'text', 'model_version': 'text',
+    'prediction': 'text', 'probability': 'text',
+    **{f: 'text' if f in TEXT_INPUTS else 'float' for f in INPUT_FIELDS},
+}
+DIARY_EXPORT_COLUMNS = {
+    'user': 'text', 'date': 'text', 'bedtime': 'text', 'wake_time': 'text', 'sleep_duration': 'float',
+    'quality': 'float', 'stress_level': 'float', 'mood': 'float', 'details': 'text',
+}
+EXPORT_FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+PAGE_SIZE = 10000
+# Admin panel downloads are assembled in memory, so larger exports go through the CLI or the API
+MAX_DOWNLOAD_ROWS = 100_000
+
+
+def _log_records(pages):
+    for rows in pages:
+        records = []
+        for row in rows:
+            inputs = json.loads(row["input_data"])
+            records.append((row["id"], row["timestamp"], row["user"], row["source"], row["model_version"],
+                            row["prediction"], row["probability"], *(inputs.get(f) for f in INPUT_FIELDS)))
+        yield records
+
+def _diary_records(pages):
+    for rows in pages:
+        yield [tuple(row) for row in rows]
+
+def csv_chunks(columns, pages):
+    """CSV bytes: the header, then one chunk per page of row tuples"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(list(columns))
+    for records in pages:
+        writer.writerows(records)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+class _ChunkSink:
+    """Write-only file object that keeps what was written until it is taken"""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def parquet_chunks(columns, pages):
+    """Parquet bytes: one row group per page of row tuples, then the footer"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {'int': pa.int64(), 'float': pa.float64(), 'text': pa.string()}
+    schema = pa.schema([(name, types[kind]) for name, kind in columns.items()])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema) as writer:
+        for records in pages:
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*records), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.take()
+    yield sink.take()
+
+def export_chunks(kind, fmt="csv", start=None, end=None, user=None, page_size=PAGE_SIZE):
+    """Byte chunks of a ``kind`` ('logs' or 'diaries') export in ``fmt`` ('csv' or 'parquet')"""
+    if kind == "logs":
+        columns, pages = LOG_COLUMNS, _log_records(iter_log_export(start, end, user, page_size))
+    elif kind == "diaries":
+        columns, pages = DIARY_EXPORT_COLUMNS, _diary_records(iter_diary_export(start, end, user, page_size))
+    else:
+        raise ValueError(f"Unknown export: {kind}")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    chunks = csv_chunks(columns, pages) if fmt == "csv" else parquet_chunks(columns, pages)
+    # An empty chunk would end a chunked HTTP response early
+    return (chunk for chunk in chunks if chunk)
+
+def export_commands(kind, fmt, start=None, end=None, user=None):
+    """CLI and API commands that stream the same export in constant memory"""
+    import shlex
+    from urllib.parse import urlencode
+
+    filters = {name: str(value) for name, value in (("start", start), ("end", end), ("user", user)) if value}
+    options = "".join(f" --{name} {shlex.quote(value)}" for name, value in filters.items())
+    url = f"http://<api-worker>/export/{kind}.{fmt}" + (f"?{urlencode(filters)}" if filters else "")
+    return (
+        f"python exports.py {kind} --format {fmt}{options}",
+        f'curl -H "Authorization: Bearer $SLEEPYTICS_EXPORT_TOKEN" "{url}" '
+        f'-o {export_file_name(kind, fmt, start, end)}',
+    )
+
+def export_file_name(kind, fmt, start=None, end=None):
+    days = "-".join(d.isoformat() for d in (start, end) if d is not None)
+    return f"sleepytics-{kind}{'-' + days if days else ''}.{fmt}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export prediction logs or sleep diaries")
+    parser.add_argument("kind", choices=["logs", "diaries"])
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="csv")
+    parser.add_argument("--start", type=date.fromisoformat, help="first day to include")
+    parser.add_argument("--end", type=date.fromisoformat, help="last day to include")
+    parser.add_argument("--user", help="only this user's rows")
+    parser.add_argument("-o", "--output", help="file to write (default: a name built from the filters)")
+    args = parser.parse_args()
+
+    path = args.output or export_file_name(args.kind, args.format, args.start, args.end)
+    written = 0
+    with open(path, "wb") as f:
+        for chunk in export_chunks(args.kind, args.format, args.start, args.end, args.user):
+            written += f.write(chunk)
+    print(f"Wrote {written / 1e6:.1f} MB to {path}")
@@ -0,0 +1,225 @@
+import json
+import os
+
+import numpy as np
+
+ARRAY_NAMES = ["feature", "threshold", "left", "right", "value", "roots"]
+
+
+def smallest_uint(max_value):
+    """Narrowest unsigned integer dtype that can hold ``max_value``"""
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+
+class FlatForest:
+    """Tree ensemble flattened into contiguous node arrays.
+
+    Every tree of the forest is stored back to back in the same arrays and
+    addressed through global node indices, so a whole batch of samples can be
+    routed through all trees at once with plain array indexing. Leaves point
+    to themselves, which lets traversal run for ``max_depth`` steps without
+    masking finished paths.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes, max_depth, version=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes
+        self.max_depth = int(max_depth)
+        self.version = version
+
+    @classmethod
+    def from_sklearn(cls, model, version=None, classes=None):
+        """Flatten a fitted scikit-learn forest classifier.
+
+        ``classes`` widens the class axis to a superset of ``model.classes_``
+        (classes the model never saw get zero probability), so forests fitted
+        on different subsets of the data can be merged.
+        """
+        classes = np.asarray(model.classes_ if classes is None else classes)
+        columns = np.searchsorted(classes, model.classes_)
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            local = np.arange(n_nodes)
+            is_leaf = tree.children_left == -1
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, local, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, local, tree.children_right) + offset)
+            value = np.zeros((n_nodes, len(classes)))
+            value[:, columns] = tree.value[:, 0, :]
+            values.append(value / value.sum(axis=1, keepdims=True))
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n_nodes
+        return cls(
+            np.concatenate(features), np.concatenate(thresholds),
+            np.concatenate(lefts), np.concatenate(rights),
+            np.concatenate(values), np.asarray(roots),
+            classes, max_depth, version
+        )
+
+    @classmethod
+    def concatenate(cls, forests, version=None):
+        """Merge forests over the same classes into one ensemble of all their trees"""
+        offsets = np.cumsum([0] + [forest.n_nodes for forest in forests[:-1]])
+        return cls(
+            np.concatenate([forest.feature for forest in forests]),
+            np.concatenate([forest.threshold for forest in forests]),
+            np.concatenate([forest.left.astype(np.int64) + offset for forest, offset in zip(forests, offsets)]),
+            np.concatenate([forest.right.astype(np.int64) + offset for forest, offset in zip(forests, offsets)]),
+            np.concatenate([forest.value for forest in forests]),
+            np.concatenate([forest.roots.astype(np.int64) + offset for forest, offset in zip(forests, offsets)]),
+            forests[0].classes_, max(forest.max_depth for forest in forests), version
+        )
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        """Load a forest saved with ``save``; arrays are memory-mapped read-only by default"""
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAY_NAMES}
+        return cls(classes=np.asarray(meta["classes"]), max_depth=meta["max_depth"], version=meta["version"], **arrays)
+
+    def save(self, directory):
+        """Write the node arrays as .npy files plus a small JSON header"""
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        meta = {"classes": self.classes_.tolist(), "max_depth": self.max_depth, "version": self.version}
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAY_NAMES)
+
+    def node_depths(self):
+        """Depth of every node below its tree's root"""
+        depth = np.full(self.n_nodes, -1)
+        frontier = np.asarray(self.roots, dtype=np.int64)
+        level = 0
+        while len(frontier):
+            depth[frontier] = level
+            children = np.concatenate([self.left[frontier], self.right[frontier]]).astype(np.int64)
+            frontier = np.unique(children[depth[children] == -1])
+            level += 1
+        return depth
+
+    def prune(self, max_depth=None, n_trees=None):
+        """Return a smaller forest keeping the first ``n_trees`` trees cut at ``max_depth``.
+
+        Nodes at the depth limit become leaves and keep the class distribution
+        they already store, so no retraining is needed.
+        """
+        n_trees = self.n_trees if n_trees is None else min(n_trees, self.n_trees)
+        max_depth = self.max_depth if max_depth is None else min(max_depth, self.max_depth)
+        depth = self.node_depths()
+        tree_of_node = np.searchsorted(self.roots, np.arange(self.n_nodes), side="right") - 1
+        keep = (depth >= 0) & (depth <= max_depth) & (tree_of_node < n_trees)
+        new_index = np.cumsum(keep) - 1
+        kept = np.flatnonzero(keep)
+        leaf = (depth[kept] == max_depth) | (self.left[kept] == kept)
+        own = new_index[kept]
+        return FlatForest(
+            np.where(leaf, 0, self.feature[kept]),
+            np.where(leaf, np.inf, self.threshold[kept]),
+            np.where(leaf, own, new_index[self.left[kept]]),
+            np.where(leaf, own, new_index[self.right[kept]]),
+            self.value[kept],
+            new_index[self.roots[:n_trees]],
+            self.classes_, max_depth,
+            f"{self.version}-t{n_trees}-d{max_depth}"
+        )
+
+    def compact(self):
+        """Copy with float32 values and the narrowest integer node indices"""
+        index_dtype = smallest_uint(self.n_nodes)
+        return FlatForest(
+            self.feature.astype(smallest_uint(int(self.feature.max()))),
+            self.threshold.astype(np.float32),
+            self.left.astype(index_dtype),
+            self.right.astype(index_dtype),
+            self.value.astype(np.float32),
+            self.roots.astype(index_dtype),
+            self.classes_, self.max_depth, self.version
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def _paths(self, X):
+        """Yield the node reached by every (tree, sample) pair at each depth"""
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])
+        node = np.repeat(self.roots[:, None], X.shape[0], axis=1)
+        yield node
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+            yield node
+
+    def apply(self, X):
+        """Return the leaf index reached in every tree, shape (n_trees, n_samples)"""
+        for node in self._paths(X):
+            pass
+        return node
+
+    def predict_proba(self, X):
+        return self.value[self.apply(X)].mean(axis=0)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def contributions(self, X):
+        """Decompose predicted probabilities into per-feature path contributions.
+
+        Each split on a sample's path moves the class distribution from the
+        parent node to the child; that change is credited to the split feature.
+        Returns ``(bias, contrib)`` where ``bias`` is the forest's prior
+        (n_classes,) and ``contrib`` has shape (n_samples, n_features, n_classes),
+        so that ``bias + contrib.sum(axis=1)`` equals ``predict_proba(X)``.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        n_samples, n_features = X.shape
+        n_classes = self.value.shape[1]
+        parents, children = [], []
+        previous = None
+        for node in self._paths(X):
+            if previous is not None:
+                parents.append(previous)
+                children.append(node)
+            previous = node
+        if not parents:
+            return self.value[self.roots].mean(axis=0), np.zeros((n_samples, n_features, n_classes))
+
+        parents = np.stack(parents)
+        children = np.stack(children)
+        moved = parents != children
+        parents, children = parents[moved], children[moved]
+        samples = np.broadcast_to(np.arange(n_samples), moved.shape)[moved]
+        slots = samples * n_features + self.feature[parents]
+        delta = self.value[children] - self.value[parents]
+
+        contrib = np.empty((n_samples * n_features, n_classes))
+        for k in range(n_classes):
+            contrib[:, k] = np.bincount(slots, weights=delta[:, k], minlength=n_samples * n_features)
+        contrib /= self.n_trees
+        bias = self.value[self.roots].mean(axis=0)
+        return bias, contrib.reshape(n_samples, n_features, n_classes)
@@ -0,0 +1,109 @@
+"""Throughput of the API deployment with 1..N worker processes.
+
+    python load_test.py --max-workers 4 --duration 10 --clients 16
+
+For each worker count, ``serve.py --mode api`` is started, client processes
+send ``POST /predict`` requests over keep-alive connections for ``--duration``
+seconds, and requests per second, latency percentiles and the speed-up over a
+single worker are reported. ``--direct`` sends requests straight to the worker
+ports to measure the workers without the proxy. The workers log the synthetic
+predictions to a temporary store, never to the real prediction log.
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+from serve import BACKEND_BASE_PORT, wait_for_port
+
+SAMPLE_RECORD = {
+    'Gender': 'Male', 'Age': 30, 'Occupation': 'Doctor', 'Sleep Duration': 7.0, 'Quality of Sleep': 7,
+    'Physical Activity Level': 50, 'Stress Level': 5, 'BMI Category': 'Normal', 'Heart Rate': 70,
+    'Daily Steps': 8000, 'Systolic': 120, 'Diastolic': 80
+}
+
+
+def client(args):
+    """Send requests on one keep-alive connection until the deadline; returns latencies in ms"""
+    port, deadline = args
+    body = json.dumps(SAMPLE_RECORD)
+    headers = {"Content-Type": "application/json", "X-User": "load-test"}
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    latencies, errors = [], 0
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request("POST", "/predict", body, headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+    conn.close()
+    return latencies, errors
+
+def measure(n_workers, clients, duration, proxy_port, direct):
+    """Start n API workers behind the proxy and load them for ``duration`` seconds"""
+    scratch = tempfile.TemporaryDirectory()
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--mode", "api", "--workers", str(n_workers), "--port", str(proxy_port)],
+        stdout=subprocess.DEVNULL, env=dict(os.environ, SLEEPYTICS_DB_PATH=os.path.join(scratch.name, "load.db"))
+    )
+    try:
+        wait_for_port(proxy_port)
+        for port in range(BACKEND_BASE_PORT, BACKEND_BASE_PORT + n_workers):
+            wait_for_port(port)
+        if direct:
+            ports = [BACKEND_BASE_PORT + i % n_workers for i in range(clients)]
+        else:
+            ports = [proxy_port] * clients
+        deadline = time.time() + duration
+        with Pool(clients) as pool:
+            results = pool.map(client, [(port, deadline) for port in ports])
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        scratch.cleanup()
+    latencies = np.concatenate([np.asarray(l) for l, _ in results]) if results else np.array([])
+    return {
+        "Workers": n_workers,
+        "Requests/s": len(latencies) / duration,
+        "p50 (ms)": np.percentile(latencies, 50) if len(latencies) else np.nan,
+        "p99 (ms)": np.percentile(latencies, 99) if len(latencies) else np.nan,
+        "Errors": sum(e for _, e in results),
+    }
+
+def run(max_workers, clients, duration, proxy_port=8500, direct=False):
+    rows = []
+    for n_workers in range(1, max_workers + 1):
+        rows.append(measure(n_workers, clients, duration, proxy_port, direct))
+        print(f"{n_workers} workers: {rows[-1]['Requests/s']:.0f} requests/s", flush=True)
+    report = pd.DataFrame(rows)
+    report["Speed-up"] = report["Requests/s"] / report["Requests/s"].iloc[0]
+    report["Efficiency"] = report["Speed-up"] / report["Workers"]
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure API throughput scaling across worker processes")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--clients", type=int, default=16, help="concurrent client connections")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per worker count")
+    parser.add_argument("--port", type=int, default=8500, help="proxy port")
+    parser.add_argument("--direct", action="store_true", help="bypass the proxy and hit worker ports")
+    args = parser.parse_args()
+    report = run(args.max_workers, args.clients, args.duration, args.port, args.direct)
+    print(report.round(2).to_string(index=False))
@@ -0,0 +1,124 @@
+"""Background writer for the prediction log.
+
+``log_predictions`` only puts a reference to the request's input frame and
+probability array on a bounded queue; converting them to JSON, formatting the
+timestamp and writing to the store happen on a writer thread, which commits
+whatever has queued up in one transaction once ``BATCH_SIZE`` records are
+waiting or ``FLUSH_INTERVAL`` seconds have passed. When the queue is full the
+caller blocks until the writer catches up, so a slow store slows producers
+down instead of growing memory without bound. Pending records are flushed when
+the process exits.
+"""
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+from storage import insert_prediction_logs
+
+MAX_QUEUE = 10000
+BATCH_SIZE = 256
+FLUSH_INTERVAL = 0.5
+WRITE_RETRIES = 3
+
+_STOP = object()
+
+
+class PredictionLogWriter:
+    """Bounded queue of pending log records drained by one writer thread"""
+
+    def __init__(self, max_queue=MAX_QUEUE, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name="prediction-log-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, user, input_data, predictions, probabilities, source="interactive", version=None):
+        """Queue one prediction call (any number of rows); blocks while the queue is full.
+
+        ``input_data`` and ``probabilities`` are kept by reference and must not
+        be modified afterwards.
+        """
+        self.queue.put((time.time(), user, input_data, predictions, probabilities, source, version))
+
+    def _rows(self, records):
+        for created, user, input_data, predictions, probabilities, source, version in records:
+            timestamp = datetime.fromtimestamp(created).strftime("%Y-%m-%d %H:%M:%S")
+            columns = list(input_data.columns)
+            # Much cheaper than DataFrame.to_dict for the one-row frames of interactive predictions
+            values = input_data.to_numpy(dtype=object).tolist()
+            for row, prediction, proba in zip(values, predictions, probabilities.tolist()):
+                yield timestamp, user, dict(zip(columns, row)), prediction, proba, source, version
+
+    def _write(self, records):
+        for attempt in range(WRITE_RETRIES):
+            try:
+                rows = list(self._rows(records))
+                insert_prediction_logs(rows)
+                self.written += len(rows)
+                return
+            except Exception as e:
+                if attempt == WRITE_RETRIES - 1:
+                    self.failed += len(records)
+                    print(f"Dropped {len(records)} prediction log records: {e}", file=sys.stderr)
+                else:
+                    time.sleep(0.1 * 2 ** attempt)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            record = self.queue.get()
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if record is _STOP:
+                    stopping = True
+                    self.queue.task_done()
+                    break
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    record = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+                for _ in batch:
+                    self.queue.task_done()
+
+    def flush(self):
+        """Block until everything queued so far has been written"""
+        self.queue.join()
+
+    def close(self):
+        """Write pending records and stop the writer thread"""
+        if self._thread.is_alive():
+            self.queue.put(_STOP)
+            self._thread.join()
+
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """The process-wide writer, started on first use (and again in forked children)"""
+    global _writer, _writer_pid
+    if _writer is None or _writer_pid != os.getpid():
+        with _writer_lock:
+            if _writer is None or _writer_pid != os.getpid():
+                _writer, _writer_pid = PredictionLogWriter(), os.getpid()
+                atexit.register(_writer.close)
+    return _writer
+
+def log_predictions(user, input_data, predictions, probabilities, source="interactive", version=None):
+    """Queue prediction log rows for ``input_data`` without waiting for the store"""
+    get_writer().submit(user, input_data, predictions, probabilities, source, version)
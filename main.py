@@ -1,22 +1,26 @@
 import streamlit as st
 import pandas as pd
-import base64
+
+import profiling
 
 from auth import init_auth, log_prediction
 from ui_components import login_page, admin_panel, header
-from data_processing import load_data, preprocess_data
-from modeling import train_model, predict
+from modeling import DISORDER_MAPPING, model_version
+from model_router import model_router
+from startup import warm_up, encoded_asset
 from sleep_tools import (
     advanced_sleep_diary, SleepRecommendationEngine, breathing_and_relaxation_exercises,
     smart_alarm_system, personalized_recommendations, sleep_sounds, guided_meditation
 )
-from visualization import plot_prediction_proba, plot_sleep_patterns
+from explainability import explain_prediction
+from neighbors import similar_people
+from visualization import plot_prediction_proba, plot_feature_attributions, plot_sleep_patterns
 from educational_resources import educational_resources
+from sleep_diary import insight_mean
 
 
 def set_background():
-    with open("assets/snw.jpg", "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode()
+    encoded_string = encoded_asset("assets/snw.jpg")
     st.markdown(
         f"""
         <style>
@@ -46,9 +50,10 @@ def create_streamlit_app():
         admin_panel()
         return
 
-    df = load_data()
-    df_processed, label_encoder = preprocess_data(df)
-    model, scaler, accuracy = train_model(df_processed)
+    bundle = warm_up()
+    # The stored report scores the calibrated decisions the app makes; older bundles only have the argmax figure
+    report = bundle.get("report")
+    accuracy = report["accuracy"] if report else bundle["accuracy"]
     st.write(f"Model Accuracy: **{accuracy * 100:.2f}%**")
 
     tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
@@ -83,16 +88,33 @@ def create_streamlit_app():
                     'Stress Level': [stress_level], 'BMI Category': [bmi_category], 'Heart Rate': [heart_rate],
                     'Daily Steps': [daily_steps], 'Systolic': [systolic], 'Diastolic': [diastolic]
                 })
-                predicted_disorder, prediction_proba = predict(model, scaler, label_encoder, input_data)
-                log_prediction(st.session_state.username, input_data, predicted_disorder, prediction_proba)
+                # The router answers from the primary model unless a candidate rollout is configured
+                predicted_disorder, prediction_proba, served = model_router(bundle).predict(
+                    input_data, key=st.session_state.username
+                )
+                model, scaler, label_encoder = served["model"], served["scaler"], served["label_encoder"]
+                log_prediction(st.session_state.username, input_data, predicted_disorder, prediction_proba,
+                               model_version(model))
 
                 st.header("Prediction Results")
                 st.write(f"Predicted Sleep Disorder: **{predicted_disorder}**")
                 proba_df = pd.DataFrame({
-                    'Disorder': ['Sleep Apnea', 'Insomnia', 'No Sleep Disorder'],
+                    'Disorder': [DISORDER_MAPPING[c] for c in model.classes_],
                     'Probability': prediction_proba[0] * 100
                 })
-                plot_prediction_proba(proba_df)
+                class_index = [DISORDER_MAPPING[c] for c in model.classes_].index(predicted_disorder)
+                attributions_df = explain_prediction(model, scaler, label_encoder, input_data, class_index)
+                proba_col, attribution_col = st.columns(2)
+                with proba_col:
+                    plot_prediction_proba(proba_df)
+                with attribution_col:
+                    plot_feature_attributions(attributions_df, predicted_disorder)
+
+                with st.expander("People like you"):
+                    similar_df, disorder_mix = similar_people(bundle, input_data, k=10)
+                    st.write("The 10 most similar people in our dataset:")
+                    st.write(" · ".join(f"{disorder}: **{share:.0f}%**" for disorder, share in disorder_mix.items()))
+                    st.dataframe(similar_df, hide_index=True)
 
                 st.subheader("Recommended Actions")
                 if predicted_disorder == "Sleep Apnea":
@@ -113,13 +135,14 @@ def create_streamlit_app():
             st.info("Start tracking your sleep to get personalized insights!")
         else:
             sleep_df = pd.DataFrame(st.session_state.advanced_sleep_log)
+            insights = st.session_state.sleep_insights
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("Average Sleep Duration", f"{sleep_df['Sleep Duration'].mean():.1f} hrs")
+                st.metric("Average Sleep Duration", f"{insight_mean(insights, 'Sleep Duration'):.1f} hrs")
             with col2:
-                st.metric("Average Sleep Quality", f"{sleep_df['Quality of Sleep'].mean():.1f}/10")
+                st.metric("Average Sleep Quality", f"{insight_mean(insights, 'Quality of Sleep'):.1f}/10")
             with col3:
-                st.metric("Average Stress Level", f"{sleep_df['Stress Level'].mean():.1f}/10")
+                st.metric("Average Stress Level", f"{insight_mean(insights, 'Stress Level'):.1f}/10")
             plot_sleep_patterns(sleep_df)
             st.subheader("Correlation Insights")
             correlations = sleep_df[['Sleep Duration', 'Quality of Sleep', 'Stress Level', 'Mood']].corr()
@@ -148,4 +171,4 @@ def create_streamlit_app():
 
 
 if __name__ == "__main__":
-    create_streamlit_app()
+    profiling.run(create_streamlit_app)
@@ -0,0 +1,85 @@
+"""Reduced-size model export for memory-constrained workers.
+
+The exported forest is pruned (fewer trees, limited depth), stored with float32
+thresholds and narrow node indices, and loaded through read-only memory maps,
+so every worker process on a host shares one copy through the page cache.
+
+    python model_export.py --report                 # accuracy vs. size table
+    python model_export.py --n-trees 50 --max-depth 10
+"""
+import argparse
+import contextlib
+import io
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from explainability import flat_forest
+from forest import FlatForest
+
+COMPACT_MODEL_PATH = os.environ.get("SLEEPYTICS_COMPACT_MODEL_PATH", "artifacts/model_compact")
+
+
+def export_compact_model(bundle, path=COMPACT_MODEL_PATH, n_trees=None, max_depth=None):
+    """Prune and compact a model bundle's forest and write it as a shared artifact"""
+    forest = flat_forest(bundle["model"]).prune(max_depth=max_depth, n_trees=n_trees).compact()
+    forest.save(os.path.join(path, "forest"))
+    # The preprocessing state is a few hundred bytes, so it is simply pickled alongside
+    preprocessing = {key: value for key, value in bundle.items() if key != "model"}
+    joblib.dump(preprocessing, os.path.join(path, "preprocessing.joblib"))
+    return forest
+
+def load_compact_bundle(path=COMPACT_MODEL_PATH):
+    """Load an exported bundle; the forest arrays are memory-mapped read-only"""
+    bundle = joblib.load(os.path.join(path, "preprocessing.joblib"))
+    bundle["model"] = FlatForest.load(os.path.join(path, "forest"))
+    return bundle
+
+def size_report(bundle, n_trees_options=(100, 50, 25, 10), max_depth_options=(None, 12, 8, 6, 4)):
+    """Held-out accuracy and in-memory size for a grid of pruning settings"""
+    from data_processing import load_data, preprocess_data
+    from modeling import holdout_split
+
+    df_processed, _ = preprocess_data(load_data())
+    _, X_test, _, y_test = holdout_split(df_processed)
+    X_test = bundle["scaler"].transform(X_test)
+    y_test = np.asarray(y_test)
+
+    full = flat_forest(bundle["model"])
+    rows = [{
+        "Trees": full.n_trees, "Max Depth": full.max_depth, "Dtype": "float64/int64",
+        "Nodes": full.n_nodes, "Size (KB)": full.nbytes / 1024,
+        "Accuracy": (full.predict(X_test) == y_test).mean()
+    }]
+    for n_trees in n_trees_options:
+        for max_depth in max_depth_options:
+            forest = full.prune(max_depth=max_depth, n_trees=n_trees).compact()
+            rows.append({
+                "Trees": forest.n_trees, "Max Depth": forest.max_depth,
+                "Dtype": f"float32/{forest.left.dtype}", "Nodes": forest.n_nodes,
+                "Size (KB)": forest.nbytes / 1024,
+                "Accuracy": (forest.predict(X_test) == y_test).mean()
+            })
+    return pd.DataFrame(rows).drop_duplicates(["Trees", "Max Depth", "Dtype"]).round(3)
+
+
+if __name__ == "__main__":
+    from startup import load_model_bundle
+
+    parser = argparse.ArgumentParser(description="Export a pruned, memory-mappable model")
+    parser.add_argument("--n-trees", type=int, default=None)
+    parser.add_argument("--max-depth", type=int, default=None)
+    parser.add_argument("--path", default=COMPACT_MODEL_PATH)
+    parser.add_argument("--report", action="store_true", help="print accuracy vs. size instead of exporting")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        bundle = load_model_bundle()
+    if args.report:
+        print(size_report(bundle).to_string(index=False))
+    else:
+        forest = export_compact_model(bundle, args.path, args.n_trees, args.max_depth)
+        print(f"Exported {forest.n_trees} trees, depth <= {forest.max_depth}, "
+              f"{forest.n_nodes} nodes, {forest.nbytes / 1024:.1f} KB to {args.path}")
@@ -0,0 +1,75 @@
+"""Evaluation data computed once at training time and stored with the model.
+
+The report holds the held-out confusion matrix, per-class precision / recall /
+F1, permutation importances (computed across all cores) and one-vs-rest ROC
+curves, as plain lists so it pickles small and renders without sklearn.
+
+    python model_report.py          # (re)compute the report of the saved artifact
+"""
+import numpy as np
+
+from modeling import DISORDER_MAPPING, holdout_split
+
+PERMUTATION_REPEATS = 10
+# ROC curves are thinned to at most this many points per class
+MAX_ROC_POINTS = 200
+
+
+def _thin(*arrays, max_points=MAX_ROC_POINTS):
+    if len(arrays[0]) <= max_points:
+        return [a.tolist() for a in arrays]
+    keep = np.unique(np.linspace(0, len(arrays[0]) - 1, max_points).round().astype(int))
+    return [a[keep].tolist() for a in arrays]
+
+def build_model_report(model, scaler, df_processed, calibrator=None, n_repeats=PERMUTATION_REPEATS, n_jobs=-1):
+    """Evaluate a trained model on the held-out split; returns a JSON-like dict"""
+    from sklearn.inspection import permutation_importance
+    from sklearn.metrics import confusion_matrix, precision_recall_fscore_support, roc_curve, auc
+
+    _, X_test, _, y_test = holdout_split(df_processed)
+    X_test_scaled = scaler.transform(X_test)
+    y_test = np.asarray(y_test)
+    proba = model.predict_proba(X_test_scaled)
+    if calibrator is None:
+        y_pred = model.classes_[proba.argmax(axis=1)]
+    else:
+        proba = calibrator.calibrate(proba)
+        y_pred = model.classes_[calibrator.decide(proba)]
+
+    precision, recall, f1, support = precision_recall_fscore_support(y_test, y_pred, labels=model.classes_,
+                                                                     zero_division=0)
+    roc = []
+    for k, label in enumerate(model.classes_):
+        fpr, tpr, _ = roc_curve(y_test == label, proba[:, k])
+        fpr_points, tpr_points = _thin(fpr, tpr)
+        roc.append({"fpr": fpr_points, "tpr": tpr_points, "auc": float(auc(fpr, tpr))})
+
+    importances = permutation_importance(model, X_test_scaled, y_test, n_repeats=n_repeats, n_jobs=n_jobs,
+                                         random_state=42)
+    return {
+        "classes": [DISORDER_MAPPING[c] for c in model.classes_],
+        "features": list(scaler.feature_names_in_),
+        "n_test": int(len(y_test)),
+        "accuracy": float((y_pred == y_test).mean()),
+        "confusion_matrix": confusion_matrix(y_test, y_pred, labels=model.classes_).tolist(),
+        "per_class": {
+            "precision": precision.tolist(), "recall": recall.tolist(), "f1": f1.tolist(),
+            "support": support.tolist(),
+        },
+        "roc": roc,
+        "permutation_importance": {
+            "mean": importances.importances_mean.tolist(), "std": importances.importances_std.tolist(),
+        },
+    }
+
+
+if __name__ == "__main__":
+    from data_processing import load_data, preprocess_data
+    from modeling import MODEL_ARTIFACT_PATH, load_model_artifact, save_model_artifact
+
+    df_processed, _ = preprocess_data(load_data())
+    bundle = load_model_artifact(MODEL_ARTIFACT_PATH)
+    bundle["report"] = build_model_report(bundle["model"], bundle["scaler"], df_processed, bundle.get("calibrator"))
+    save_model_artifact(bundle, MODEL_ARTIFACT_PATH)
+    print(f"Saved model report (held-out accuracy {bundle['report']['accuracy']:.3f}) to {MODEL_ARTIFACT_PATH}; "
+          "re-run model_export.py to update a compact export")
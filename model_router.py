@@ -0,0 +1,317 @@
+"""Shadow scoring and percentage rollout of a candidate model.
+
+    python model_export.py --n-trees 25 --max-depth 8 --path artifacts/candidate
+    python model_router.py shadow artifacts/candidate --budget-ms 50
+    python model_router.py split artifacts/candidate --percent 10
+    python model_router.py off
+    python model_router.py report
+
+The rollout is configured in ``artifacts/rollout.json`` (override with
+``SLEEPYTICS_ROLLOUT_PATH``), which every worker re-reads when it changes. A
+candidate is a model artifact or a compact export directory.
+
+* ``shadow``: requests are answered by the primary model. The candidate scores
+  the same inputs on a small thread pool after the response has been computed,
+  and its labels are compared with the primary's. Shadow work that cannot
+  start within the latency budget, or that would exceed ``MAX_PENDING``
+  queued requests, is dropped rather than queued.
+* ``split``: ``percent`` of users (by a hash of the username, so a user keeps
+  seeing the same model) are answered by the candidate. If the candidate
+  fails, the primary answers instead.
+
+Per-version request counts, latency, budget overruns and agreement are
+accumulated in memory and written to the store every ``FLUSH_INTERVAL``
+seconds. The admin panel's **Model** tab reports them across all workers.
+"""
+import argparse
+import atexit
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from modeling import model_version, predict_batch
+from storage import insert_model_stats, model_stats_summary
+
+ROLLOUT_CONFIG_PATH = os.environ.get("SLEEPYTICS_ROLLOUT_PATH", "artifacts/rollout.json")
+MODES = ["off", "shadow", "split"]
+LATENCY_BUDGET_MS = 50.0
+SHADOW_WORKERS = 2
+MAX_PENDING = 64
+FLUSH_INTERVAL = 60.0
+# Latency samples kept per version and flush window (a uniform reservoir beyond this)
+MAX_LATENCY_SAMPLES = 5000
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+def load_candidate(path):
+    """A candidate bundle from a model artifact file or a compact export directory"""
+    if os.path.isdir(path):
+        from model_export import load_compact_bundle
+
+        return load_compact_bundle(path)
+    from modeling import load_model_artifact
+
+    return load_model_artifact(path)
+
+def score(bundle, input_data):
+    """Labels and probabilities from one bundle, and the time taken in milliseconds"""
+    start = time.perf_counter()
+    labels, proba = predict_batch(bundle["model"], bundle["scaler"], bundle["label_encoder"], input_data,
+                                  bundle.get("calibrator"))
+    return labels, proba, (time.perf_counter() - start) * 1000
+
+class _WindowStats:
+    """Counters for one model version since the last flush"""
+
+    def __init__(self):
+        self.requests = self.rows = self.errors = self.over_budget = self.dropped = 0
+        self.compared = self.agreed = 0
+        self.latencies = []
+        self.latency_count = 0
+
+    def add_latency(self, ms):
+        self.latency_count += 1
+        if len(self.latencies) < MAX_LATENCY_SAMPLES:
+            self.latencies.append(ms)
+        else:
+            slot = random.randrange(self.latency_count)
+            if slot < MAX_LATENCY_SAMPLES:
+                self.latencies[slot] = ms
+
+    def row(self, version, role, mode, timestamp):
+        latencies = np.asarray(self.latencies)
+        return {
+            "timestamp": timestamp, "pid": os.getpid(), "version": version, "role": role, "mode": mode,
+            "requests": self.requests, "rows": self.rows, "errors": self.errors, "over_budget": self.over_budget,
+            "dropped": self.dropped, "compared": self.compared, "agreed": self.agreed,
+            "latency_mean_ms": float(latencies.mean()) if len(latencies) else None,
+            "latency_p95_ms": float(np.percentile(latencies, 95)) if len(latencies) else None,
+        }
+
+class ModelRouter:
+    """Answers predictions from the primary bundle and routes traffic to a candidate"""
+
+    def __init__(self, primary, candidate=None, mode="off", split_percent=0, latency_budget_ms=LATENCY_BUDGET_MS,
+                 workers=SHADOW_WORKERS, max_pending=MAX_PENDING, flush_interval=FLUSH_INTERVAL):
+        if mode not in MODES:
+            raise ValueError(f"Unknown rollout mode: {mode}")
+        self.primary = primary
+        self.candidate = candidate if mode != "off" else None
+        self.mode = mode if self.candidate is not None else "off"
+        self.split_percent = split_percent
+        self.latency_budget_ms = latency_budget_ms
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.versions = {"primary": model_version(primary["model"])}
+        if self.candidate is not None:
+            self.versions["candidate"] = model_version(self.candidate["model"])
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="shadow") if self.mode == "shadow" else None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._last_flush = time.monotonic()
+
+    def _window(self, role):
+        stats = self._stats.get(role)
+        if stats is None:
+            stats = self._stats[role] = _WindowStats()
+        return stats
+
+    def route(self, key=None):
+        """'candidate' or 'primary' for a request; ``key`` (the user) keeps split routing sticky"""
+        if self.mode != "split":
+            return "primary"
+        bucket = zlib.crc32(key.encode()) % 100 if key else random.randrange(100)
+        return "candidate" if bucket < self.split_percent else "primary"
+
+    def predict_batch(self, input_data, key=None):
+        """Labels, probabilities and the bundle that produced them"""
+        role = self.route(key)
+        bundle = self.candidate if role == "candidate" else self.primary
+        try:
+            labels, proba, latency_ms = score(bundle, input_data)
+        except Exception:
+            if role == "primary":
+                raise
+            self._record(role, len(input_data), error=True)
+            role, bundle = "primary", self.primary
+            labels, proba, latency_ms = score(bundle, input_data)
+        self._record(role, len(input_data), latency_ms)
+        if self.mode == "shadow":
+            self._submit_shadow(input_data, labels)
+        self._maybe_flush()
+        return labels, proba, bundle
+
+    def predict(self, input_data, key=None):
+        labels, proba, bundle = self.predict_batch(input_data, key)
+        return labels[0], proba, bundle
+
+    def _record(self, role, rows, latency_ms=None, error=False, dropped=False, compared=0, agreed=0):
+        with self._lock:
+            stats = self._window(role)
+            stats.requests += 1
+            stats.rows += rows
+            stats.errors += error
+            stats.dropped += dropped
+            stats.compared += compared
+            stats.agreed += agreed
+            if latency_ms is not None:
+                stats.add_latency(latency_ms)
+                stats.over_budget += latency_ms > self.latency_budget_ms
+
+    def _submit_shadow(self, input_data, primary_labels):
+        with self._lock:
+            full = self._pending >= self.max_pending
+            if not full:
+                self._pending += 1
+        if full:
+            self._record("candidate", len(input_data), dropped=True)
+            return
+        self._pool.submit(self._shadow, input_data, primary_labels, time.perf_counter())
+
+    def _shadow(self, input_data, primary_labels, submitted):
+        try:
+            if (time.perf_counter() - submitted) * 1000 > self.latency_budget_ms:
+                # Waited out its whole budget in the queue; scoring it now only adds to the backlog
+                self._record("candidate", len(input_data), dropped=True)
+                return
+            try:
+                labels, _, latency_ms = score(self.candidate, input_data)
+            except Exception:
+                self._record("candidate", len(input_data), error=True)
+                return
+            agreed = sum(a == b for a, b in zip(labels, primary_labels))
+            self._record("candidate", len(input_data), latency_ms, compared=len(labels), agreed=agreed)
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self._maybe_flush()
+
+    def _maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write the stats gathered since the last flush to the store"""
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            self._last_flush = time.monotonic()
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = [s.row(self.versions[role], role, self.mode, timestamp) for role, s in stats.items() if s.requests]
+        if rows:
+            insert_model_stats(rows)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+        self.flush()
+
+def load_rollout(path=ROLLOUT_CONFIG_PATH):
+    """The rollout configuration, or None when there is none"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_rollout(config, path=ROLLOUT_CONFIG_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(config, f, indent=2)
+    os.replace(tmp_path, path)
+
+def _build_router(primary, path):
+    """A router for the rollout config at ``path``; primary-only if the config or candidate is unusable"""
+    try:
+        config = load_rollout(path) or {"mode": "off"}
+        mode = config.get("mode", "off")
+        if mode not in MODES:
+            raise ValueError(f"unknown mode {mode!r}")
+        if mode == "off":
+            return ModelRouter(primary)
+        if "candidate" not in config:
+            raise ValueError("no candidate given")
+        percent = float(config.get("percent", 0))
+        if not 0 <= percent <= 100:
+            raise ValueError(f"percent must be between 0 and 100, got {percent:g}")
+        candidate = load_candidate(config["candidate"])
+        return ModelRouter(primary, candidate, mode, percent, float(config.get("budget_ms", LATENCY_BUDGET_MS)))
+    except Exception as e:
+        # A bad rollout must never take the primary model down with it
+        print(f"Ignoring rollout config {path}: {type(e).__name__}: {e}; serving the primary model only", flush=True)
+        return ModelRouter(primary)
+
+def model_router(primary, path=ROLLOUT_CONFIG_PATH):
+    """The router for a primary bundle under the current rollout config, rebuilt when the config changes"""
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    key = (model_version(primary["model"]), path, mtime)
+    router = _routers.get(key)
+    if router is not None:
+        return router
+    with _routers_lock:
+        router = _routers.get(key)
+        if router is not None:
+            return router
+        router = _build_router(primary, path)
+        replaced = list(_routers.values())
+        _routers.clear()
+        _routers[key] = router
+    # Waiting for in-flight shadow work and flushing stats would stall this request, so it happens elsewhere
+    for old in replaced:
+        threading.Thread(target=old.close, name="router-close", daemon=True).start()
+    return router
+
+@atexit.register
+def _close_routers():
+    for router in list(_routers.values()):
+        router.close()
+
+def stats_report(since=None):
+    """Routing stats per version as printable rows, with agreement in percent"""
+    rows = model_stats_summary(since)
+    for row in rows:
+        row["agreement_pct"] = row["agreed"] / row["compared"] * 100 if row["compared"] else None
+    return rows
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Configure shadow scoring or a percentage rollout")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for mode in ("shadow", "split"):
+        sub = subparsers.add_parser(mode)
+        sub.add_argument("candidate", help="model artifact or compact export directory")
+        sub.add_argument("--budget-ms", type=float, default=LATENCY_BUDGET_MS, help="per-request latency budget")
+        if mode == "split":
+            sub.add_argument("--percent", type=float, required=True,
+                             help="share of users served by the candidate (0-100)")
+    subparsers.add_parser("off")
+    subparsers.add_parser("report")
+    args = parser.parse_args()
+    if args.command == "split" and not 0 <= args.percent <= 100:
+        parser.error("--percent must be between 0 and 100")
+
+    if args.command == "report":
+        rows = stats_report()
+        print(pd.DataFrame(rows).round(2).to_string(index=False) if rows else "No routing stats recorded yet")
+    elif args.command == "off":
+        save_rollout({"mode": "off"})
+        print(f"Rollout disabled in {ROLLOUT_CONFIG_PATH}")
+    else:
+        candidate = load_candidate(args.candidate)
+        config = {"mode": args.command, "candidate": args.candidate, "budget_ms": args.budget_ms,
+                  "version": model_version(candidate["model"])}
+        if args.command == "split":
+            config["percent"] = args.percent
+        save_rollout(config)
+        print(f"Wrote {args.command} rollout of {config['version']} to {ROLLOUT_CONFIG_PATH}")
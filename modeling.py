@@ -1,15 +1,29 @@
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import accuracy_score, confusion_matrix, classification_report
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
 import pandas as pd
+import hashlib
+import os
+import joblib
+
+MODEL_ARTIFACT_PATH = os.environ.get("SLEEPYTICS_MODEL_PATH", "artifacts/model.joblib")
+CATEGORICAL_FEATURES = ['Gender', 'Occupation', 'BMI Category']
+# Names of the label-encoded 'Sleep Disorder' classes (LabelEncoder sorts them; missing sorts last)
+DISORDER_MAPPING = {0: "Insomnia", 1: "Sleep Apnea", 2: "No Sleep Disorder"}
+
+def holdout_split(df):
+    """Split preprocessed data into the train/test sets used by train_model"""
+    from sklearn.model_selection import train_test_split
 
-def train_model(df):
-    """Train a Random Forest model on the preprocessed data"""
     X = df.drop(['Sleep Disorder', 'Person ID'], axis=1)
     y = df['Sleep Disorder']
-    
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    return train_test_split(X, y, test_size=0.2, random_state=42)
+
+def train_model(df):
+    """Train a Random Forest model on the preprocessed data"""
+    # Deferred so workers serving a saved artifact skip the training-only imports
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import accuracy_score
+    from sklearn.preprocessing import StandardScaler
+
+    X_train, X_test, y_train, y_test = holdout_split(df)
     scaler = StandardScaler()
     X_train_scaled = scaler.fit_transform(X_train)
     X_test_scaled = scaler.transform(X_test)
@@ -19,21 +33,66 @@ def train_model(df):
     
     y_pred = rf_classifier.predict(X_test_scaled)
     accuracy = accuracy_score(y_test, y_pred)
-    
-    print("Confusion Matrix:")
-    print(confusion_matrix(y_test, y_pred))
-    print("\nClassification Report:")
-    print(classification_report(y_test, y_pred))
-    
+    # The full evaluation is stored with the artifact; see model_report.py
     return rf_classifier, scaler, accuracy
 
-def predict(model, scaler, label_encoder, input_data):
-    """Make a prediction using the trained model"""
-    for column in ['Gender', 'Occupation', 'BMI Category']:
-        input_data[column] = label_encoder.fit_transform(input_data[column])
-    input_scaled = scaler.transform(input_data)
-    prediction = model.predict(input_scaled)
+def save_model_artifact(bundle, path=MODEL_ARTIFACT_PATH):
+    """Persist a trained model bundle (model, scaler, label encoder, accuracy, calibrator, report)"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    joblib.dump(bundle, tmp_path)
+    os.replace(tmp_path, path)
+
+def load_model_artifact(path=MODEL_ARTIFACT_PATH):
+    """Load a model bundle written by save_model_artifact"""
+    return joblib.load(path)
+
+def model_version(model):
+    """Return a short fingerprint of a fitted forest, memoized on the model"""
+    version = getattr(model, "version", None) or getattr(model, "sleepytics_version_", None)
+    if version is None:
+        digest = hashlib.sha1()
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            digest.update(tree.feature.tobytes())
+            digest.update(tree.threshold.tobytes())
+            digest.update(tree.value.tobytes())
+        version = digest.hexdigest()[:12]
+        model.sleepytics_version_ = version
+    return version
+
+def encode_features(label_encoder, input_data):
+    """Encode categorical inputs with the vocabulary seen in training, leaving input_data untouched.
+
+    Categories that never appeared in training are encoded as -1.
+    """
+    encoded = input_data.copy()
+    column_classes = getattr(label_encoder, "column_classes_", None)
+    for column in CATEGORICAL_FEATURES:
+        if column_classes is None:
+            # Bundles saved before the vocabulary was recorded; rebuild with `python startup.py --retrain`
+            from sklearn.preprocessing import LabelEncoder
+            encoded[column] = LabelEncoder().fit_transform(encoded[column])
+        else:
+            encoded[column] = pd.Index(column_classes[column]).get_indexer(encoded[column])
+    return encoded
+
+def predict_batch(model, scaler, label_encoder, input_data, calibrator=None):
+    """Predict disorders for many inputs at once; returns (labels, probabilities).
+
+    With a calibrator (see calibration.py) the probabilities are calibrated and
+    the label is chosen with its tuned decision weights.
+    """
+    input_scaled = scaler.transform(encode_features(label_encoder, input_data))
     prediction_proba = model.predict_proba(input_scaled)
-    
-    disorder_mapping = {0: "Sleep Apnea", 1: "Insomnia", 2: "No Sleep Disorder"}
-    return disorder_mapping[prediction[0]], prediction_proba
\ No newline at end of file
+    if calibrator is None:
+        prediction = model.classes_[prediction_proba.argmax(axis=1)]
+    else:
+        prediction_proba = calibrator.calibrate(prediction_proba)
+        prediction = model.classes_[calibrator.decide(prediction_proba)]
+    return [DISORDER_MAPPING[p] for p in prediction], prediction_proba
+
+def predict(model, scaler, label_encoder, input_data, calibrator=None):
+    """Make a prediction using the trained model"""
+    labels, prediction_proba = predict_batch(model, scaler, label_encoder, input_data, calibrator)
+    return labels[0], prediction_proba
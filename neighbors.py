@@ -0,0 +1,120 @@
+"""Nearest-neighbor "people like you" lookup over the training records.
+
+Records are indexed in the model's scaled feature space. Small sets are
+searched by brute force (one matrix product per block of queries, which NumPy
+hands to BLAS), larger ones through a KD-tree, which stays fast in 12
+dimensions at millions of rows. Indexes are built once per model version.
+"""
+import numpy as np
+import pandas as pd
+
+from modeling import encode_features, model_version
+
+# Above this many rows a KD-tree beats computing every distance
+BRUTE_FORCE_MAX_ROWS = 20000
+# Distance block size for brute-force search, in query x record entries
+BRUTE_FORCE_BLOCK = 4_000_000
+# Columns shown for similar records; IDs are dropped and ages are banded
+NEIGHBOR_COLUMNS = ['Gender', 'Age Group', 'Occupation', 'Sleep Duration', 'Quality of Sleep',
+                    'Stress Level', 'BMI Category', 'Sleep Disorder']
+DISORDERS = ['Insomnia', 'Sleep Apnea', 'No Sleep Disorder']
+
+_INDEXES = {}
+_MAX_CACHED_VERSIONS = 4
+
+
+class NeighborIndex:
+    """Exact k-nearest-neighbor search over a fixed matrix of points"""
+
+    def __init__(self, points, method="auto", leaf_size=40):
+        self.points = np.ascontiguousarray(points, dtype=np.float64)
+        if method == "auto":
+            method = "brute" if len(self.points) <= BRUTE_FORCE_MAX_ROWS else "kd_tree"
+        self.method = method
+        if method == "kd_tree":
+            from sklearn.neighbors import KDTree
+
+            self.tree = KDTree(self.points, leaf_size=leaf_size)
+        else:
+            self.squared_norms = np.einsum('ij,ij->i', self.points, self.points)
+
+    def __len__(self):
+        return len(self.points)
+
+    def query(self, queries, k=10):
+        """Distances and row indices of the ``k`` nearest points for each query row, nearest first"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float64))
+        k = min(k, len(self.points))
+        if self.method == "kd_tree":
+            return self.tree.query(queries, k=k)
+        distances = np.empty((len(queries), k))
+        indices = np.empty((len(queries), k), dtype=np.int64)
+        block = max(1, BRUTE_FORCE_BLOCK // len(self.points))
+        for start in range(0, len(queries), block):
+            q = queries[start:start + block]
+            d2 = self.squared_norms - 2 * (q @ self.points.T) + np.einsum('ij,ij->i', q, q)[:, None]
+            if k < len(self.points):
+                nearest = np.argpartition(d2, k - 1, axis=1)[:, :k]
+            else:
+                nearest = np.broadcast_to(np.arange(len(self.points)), d2.shape)
+            nearest_d2 = np.take_along_axis(d2, nearest, axis=1)
+            order = np.argsort(nearest_d2, axis=1, kind='stable')
+            indices[start:start + block] = np.take_along_axis(nearest, order, axis=1)
+            distances[start:start + block] = np.sqrt(np.maximum(np.take_along_axis(nearest_d2, order, axis=1), 0))
+        return distances, indices
+
+class PeopleIndex:
+    """Training records, their scaled features and a neighbor index over them"""
+
+    def __init__(self, bundle, df=None):
+        from data_processing import disorder_names, load_data
+        from drift import reference_features
+
+        df = load_data() if df is None else df
+        # Records are encoded exactly as queries are, with the bundle's own vocabulary
+        self.index = NeighborIndex(self.scaled(bundle, reference_features(df)))
+        self.labels = disorder_names(df['Sleep Disorder']).to_numpy()
+        self.records = anonymize(df, self.labels)
+
+    @staticmethod
+    def scaled(bundle, input_data):
+        """Raw model inputs encoded and scaled into the model's feature space"""
+        encoded = encode_features(bundle["label_encoder"], input_data)
+        scaler = bundle["scaler"]
+        return scaler.transform(encoded[list(scaler.feature_names_in_)])
+
+    def neighbors(self, bundle, input_data, k=10):
+        """Distances and indices of the k most similar records for each input row"""
+        return self.index.query(self.scaled(bundle, input_data), k)
+
+    def disorder_mix(self, indices):
+        """Share of each disorder among each row's neighbors, as a (queries x classes) DataFrame"""
+        codes = pd.Categorical(self.labels, categories=DISORDERS).codes[indices]
+        counts = np.stack([(codes == c).sum(axis=1) for c in range(len(DISORDERS))], axis=1)
+        return pd.DataFrame(counts / indices.shape[1], columns=DISORDERS)
+
+def anonymize(df, labels):
+    """Training records without IDs and with 5-year age bands"""
+    records = df.drop(columns=['Person ID'], errors='ignore').copy()
+    band = (records['Age'] // 5) * 5
+    records['Age Group'] = band.astype(str) + '-' + (band + 4).astype(str)
+    records['Sleep Disorder'] = labels
+    return records[NEIGHBOR_COLUMNS].reset_index(drop=True)
+
+def people_index(bundle):
+    """The neighbor index for a model bundle, built once per model version"""
+    version = model_version(bundle["model"])
+    index = _INDEXES.get(version)
+    if index is None:
+        if len(_INDEXES) >= _MAX_CACHED_VERSIONS:
+            _INDEXES.pop(next(iter(_INDEXES)))
+        index = _INDEXES[version] = PeopleIndex(bundle)
+    return index
+
+def similar_people(bundle, input_data, k=10):
+    """The k most similar anonymized training records for one input, and their disorder mix in percent"""
+    index = people_index(bundle)
+    distances, indices = index.neighbors(bundle, input_data, k)
+    records = index.records.iloc[indices[0]].reset_index(drop=True)
+    records.insert(0, 'Distance', distances[0].round(3))
+    return records, index.disorder_mix(indices).iloc[0] * 100
@@ -0,0 +1,100 @@
+"""On-demand profiling of app reruns, armed from the admin panel.
+
+``arm(n)`` makes the next ``n`` reruns of the app in this worker process (from
+any session) run under cProfile. Each capture is stored in the shared store
+with its user, process and wall time, and can be shown as a top-functions
+table or downloaded as a ``.prof`` file for snakeviz or flameprof. While
+nothing is armed, ``run()`` costs one global read per rerun. The stored stats
+blob is exactly the contents of a ``.prof`` file.
+"""
+import cProfile
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+from storage import insert_profile_capture, load_profile_stats
+
+MAX_ARMED_RERUNS = 20
+
+_remaining = 0
+_state_lock = threading.Lock()
+# cProfile cannot run in two threads at once on newer Pythons, so captures take turns
+_capture_lock = threading.Lock()
+
+
+def arm(n_reruns):
+    """Profile the next ``n_reruns`` reruns in this process"""
+    global _remaining
+    with _state_lock:
+        _remaining = max(0, min(int(n_reruns), MAX_ARMED_RERUNS))
+
+def remaining():
+    return _remaining
+
+def _claim():
+    global _remaining
+    with _state_lock:
+        if _remaining <= 0:
+            return False
+        _remaining -= 1
+        return True
+
+def run(app):
+    """Run ``app()``, under the profiler if a capture is armed"""
+    if not _remaining:
+        return app()
+    if not _capture_lock.acquire(blocking=False):
+        return app()
+    try:
+        if not _claim():
+            return app()
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            # st.rerun() and st.stop() end a run with an exception; those runs are kept too
+            return profiler.runcall(app)
+        finally:
+            _store_capture(profiler, (time.perf_counter() - start) * 1000)
+    finally:
+        _capture_lock.release()
+
+def _store_capture(profiler, duration_ms):
+    """Store a capture; a failure is reported, never raised over the profiled run's own outcome"""
+    try:
+        profiler.create_stats()
+        insert_profile_capture(
+            datetime.now().strftime("%Y-%m-%d %H:%M:%S"), st.session_state.get("username"), os.getpid(),
+            duration_ms, marshal.dumps(profiler.stats)
+        )
+    except Exception as e:
+        print(f"Profile capture not stored: {type(e).__name__}: {e}", file=sys.stderr)
+
+class _StoredStats:
+    """Adapter that lets pstats.Stats load a stats dictionary read from the store"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+def load_stats(capture_id):
+    blob = load_profile_stats(capture_id)
+    return None if blob is None else pstats.Stats(_StoredStats(marshal.loads(blob)))
+
+def top_functions(stats, limit=30, sort='Cumulative (ms)'):
+    """The ``limit`` most expensive functions of a capture as a table"""
+    rows = [{
+        'Function': f"{name} ({os.path.basename(filename)}:{line})" if line else name,
+        'Calls': calls,
+        'Own (ms)': own * 1000,
+        'Cumulative (ms)': cumulative * 1000,
+    } for (filename, line, name), (_, calls, own, cumulative, _) in stats.stats.items()]
+    return pd.DataFrame(rows).sort_values(sort, ascending=False).head(limit).reset_index(drop=True)
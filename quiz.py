@@ -0,0 +1,73 @@
+"""Data-driven quizzes and their answer analytics.
+
+Quizzes are defined in ``data/quiz_questions.json`` (override with
+``SLEEPYTICS_QUIZ_PATH``): each has an id, a title and questions with an id,
+text, options and the correct option. Adding a quiz or question is an edit to
+that file. Each submission is stored as one compact event (the chosen option
+numbers and the score), and per-question attempt / correct counters and a
+score histogram are updated in the same transaction, so the admin view reads
+a handful of counter rows, however many submissions there are. Give a
+question a new id when its meaning or answer changes, so old counts are not
+mixed into it.
+"""
+import json
+import os
+from datetime import datetime
+from functools import lru_cache
+
+import pandas as pd
+
+from storage import quiz_question_stats, quiz_score_counts, record_quiz_submission
+
+QUESTION_BANK_PATH = os.environ.get("SLEEPYTICS_QUIZ_PATH", "data/quiz_questions.json")
+
+
+@lru_cache(maxsize=4)
+def _load_bank(path, mtime):
+    with open(path) as f:
+        quizzes = json.load(f)["quizzes"]
+    for quiz in quizzes:
+        question_ids = [q["id"] for q in quiz["questions"]]
+        if len(set(question_ids)) != len(question_ids):
+            raise ValueError(f"Quiz '{quiz['id']}' has duplicate question ids")
+        for question in quiz["questions"]:
+            if question["answer"] not in question["options"]:
+                raise ValueError(f"Answer of '{quiz['id']}/{question['id']}' is not one of its options")
+    return quizzes
+
+def load_quizzes(path=QUESTION_BANK_PATH):
+    """Quiz definitions from the question bank, reloaded when the file changes"""
+    return _load_bank(path, os.path.getmtime(path))
+
+def grade(quiz, answers):
+    """(question_id, correct) for each question given {question_id: chosen option}"""
+    return [(q["id"], answers.get(q["id"]) == q["answer"]) for q in quiz["questions"]]
+
+def submit_quiz(user, quiz, answers):
+    """Grade and record a submission; returns the score"""
+    results = grade(quiz, answers)
+    # Compact event: the chosen option's position per question, '-' when unanswered
+    chosen = ",".join(
+        str(q["options"].index(answers[q["id"]])) if answers.get(q["id"]) in q["options"] else "-"
+        for q in quiz["questions"]
+    )
+    record_quiz_submission(datetime.now().strftime("%Y-%m-%d %H:%M:%S"), user, quiz["id"], chosen, results)
+    return sum(correct for _, correct in results)
+
+def question_report(quiz):
+    """Attempts and share answered correctly for each question of a quiz, hardest first"""
+    stats = quiz_question_stats(quiz["id"])
+    rows = []
+    for question in quiz["questions"]:
+        attempts, correct = stats.get(question["id"], (0, 0))
+        rows.append({
+            'Question': question["text"], 'Attempts': attempts,
+            'Correct (%)': correct / attempts * 100 if attempts else float("nan"),
+        })
+    return pd.DataFrame(rows).sort_values('Correct (%)', na_position='last').reset_index(drop=True)
+
+def score_distribution(quiz):
+    """Number of submissions for each possible score of a quiz"""
+    counts = quiz_score_counts(quiz["id"])
+    scores = range(len(quiz["questions"]) + 1)
+    return pd.DataFrame({'Score': list(scores), 'Submissions': [counts.get(s, 0) for s in scores]})
@@ -0,0 +1,127 @@
+"""Table-driven personalized sleep recommendations.
+
+Every profile answer (sleep goal, lifestyle factor, environmental factor) is a
+bit in an integer signature, and every rule fires when all bits of its
+condition are set. Matching a batch of profiles is then a single broadcast AND
+over (profiles x rules), and plans are memoized by signature since many users
+share the same answers.
+"""
+import numpy as np
+import pandas as pd
+
+SLEEP_GOALS = [
+    "Fall asleep faster", "Stay asleep longer", "Improve sleep quality", "Manage sleep disorder", "Optimize sleep schedule"
+]
+LIFESTYLE_FACTORS = [
+    "High stress", "Shift work", "Frequent travel", "Regular caffeine use", "Regular alcohol use",
+    "Electronic device use before bed", "Exercise regularly"
+]
+ENVIRONMENTAL_FACTORS = [
+    "Noisy environment", "Too much light", "Uncomfortable temperature", "Uncomfortable bed",
+    "Sleeping with partner who snores", "Children or pets disrupt sleep"
+]
+FACTOR_BITS = {factor: 1 << i for i, factor in enumerate(SLEEP_GOALS + LIFESTYLE_FACTORS + ENVIRONMENTAL_FACTORS)}
+
+# (section, factors that must all be present, advice). Sections render in the
+# order they first appear, and advice within a section keeps table order.
+RECOMMENDATION_RULES = pd.DataFrame([
+    ("To Fall Asleep Faster", ("Fall asleep faster",), "Relaxing pre-sleep routine"),
+    ("To Fall Asleep Faster", ("Fall asleep faster",), "4-7-8 breathing"),
+    ("To Fall Asleep Faster", ("Fall asleep faster",), "Avoid electronics"),
+    ("To Fall Asleep Faster", ("Fall asleep faster",), "Small carb snack"),
+    ("To Stay Asleep Longer", ("Stay asleep longer",), "Limit fluids"),
+    ("To Stay Asleep Longer", ("Stay asleep longer",), "Cool room"),
+    ("To Stay Asleep Longer", ("Stay asleep longer",), "White noise"),
+    ("To Stay Asleep Longer", ("Stay asleep longer",), "Blackout curtains"),
+    ("To Improve Sleep Quality", ("Improve sleep quality",), "Increase daytime activity"),
+    ("To Improve Sleep Quality", ("Improve sleep quality",), "Natural light"),
+    ("To Improve Sleep Quality", ("Improve sleep quality",), "Avoid alcohol/heavy meals"),
+    ("To Improve Sleep Quality", ("Improve sleep quality",), "Weighted blanket"),
+    ("For Sleep Disorder Management", ("Manage sleep disorder",), "Consult specialist"),
+    ("For Sleep Disorder Management", ("Manage sleep disorder",), "Follow treatment"),
+    ("For Sleep Disorder Management", ("Manage sleep disorder",), "Join support group"),
+    ("For Sleep Disorder Management", ("Manage sleep disorder",), "Track symptoms"),
+    ("To Optimize Sleep Schedule", ("Optimize sleep schedule",), "Consistent times"),
+    ("To Optimize Sleep Schedule", ("Optimize sleep schedule",), "Adjust gradually"),
+    ("To Optimize Sleep Schedule", ("Optimize sleep schedule",), "Morning light"),
+    ("To Optimize Sleep Schedule", ("Optimize sleep schedule",), "Track sleep"),
+    ("Lifestyle Adjustments", ("High stress",), "Practice stress management techniques"),
+    ("Lifestyle Adjustments", ("Shift work",), "Use blackout curtains and light therapy"),
+    ("Lifestyle Adjustments", ("Frequent travel",), "Use melatonin strategically (consult doctor)"),
+    ("Lifestyle Adjustments", ("Regular caffeine use",), "Cut off caffeine 8 hours before bed"),
+    ("Lifestyle Adjustments", ("Regular alcohol use",), "Limit alcohol within 3 hours of bedtime"),
+    ("Lifestyle Adjustments", ("Electronic device use before bed",), "Use blue light filters or glasses"),
+    ("Lifestyle Adjustments", ("Exercise regularly",), "Schedule workouts earlier in the day"),
+    ("Environment Optimization", ("Noisy environment",), "Use white noise machine or ear plugs"),
+    ("Environment Optimization", ("Too much light",), "Install blackout curtains or use a sleep mask"),
+    ("Environment Optimization", ("Uncomfortable temperature",), "Set thermostat to 65-68°F"),
+    ("Environment Optimization", ("Uncomfortable bed",), "Upgrade mattress or use a topper"),
+    ("Environment Optimization", ("Sleeping with partner who snores",), "Try ear plugs or suggest partner see a doctor"),
+    ("Environment Optimization", ("Children or pets disrupt sleep",), "Establish consistent bedtime routines for them"),
+], columns=["section", "when", "advice"])
+
+
+def factor_signature(sleep_goal, lifestyle_factors=(), environmental_factors=()):
+    """Bitmask of a profile's answers; unknown answers are ignored"""
+    signature = 0
+    for factor in [sleep_goal, *lifestyle_factors, *environmental_factors]:
+        signature |= FACTOR_BITS.get(factor, 0)
+    return signature
+
+def profile_signatures(profiles):
+    """Vectorized factor_signature over a profiles DataFrame"""
+    signatures = profiles["sleep_goal"].map(FACTOR_BITS).fillna(0).to_numpy(dtype=np.uint64, copy=True)
+    for column in ("lifestyle_factors", "environmental_factors"):
+        # One row per (profile, factor); duplicates dropped so summing bits acts as OR
+        exploded = profiles[column].explode().reset_index().drop_duplicates()
+        bits = exploded[column].map(FACTOR_BITS).fillna(0).astype(np.uint64)
+        signatures |= bits.groupby(exploded["index"]).sum().reindex(profiles.index, fill_value=0).to_numpy(dtype=np.uint64)
+    return signatures
+
+def compile_rules(rules=RECOMMENDATION_RULES):
+    """Precompute rule condition masks and section grouping for fast matching"""
+    masks = np.array([sum(FACTOR_BITS[f] for f in when) for when in rules["when"]], dtype=np.uint64)
+    sections = list(dict.fromkeys(rules["section"]))
+    section_index = rules["section"].map({name: i for i, name in enumerate(sections)}).to_numpy()
+    return {"masks": masks, "sections": sections, "section_index": section_index, "advice": rules["advice"].tolist()}
+
+_COMPILED_RULES = compile_rules()
+_PLAN_CACHE = {}
+
+
+def _render(matched, compiled):
+    """Markdown blocks for one row of the (profiles x rules) match matrix"""
+    blocks = []
+    for s, section in enumerate(compiled["sections"]):
+        advice = [compiled["advice"][r] for r in np.flatnonzero(matched & (compiled["section_index"] == s))]
+        if advice:
+            blocks.append(f"**{section}:**\n- " + "\n- ".join(advice))
+    return blocks
+
+def plans_for_signatures(signatures, compiled=_COMPILED_RULES):
+    """Recommendation plans (lists of markdown blocks) for an array of signatures"""
+    signatures = np.asarray(signatures, dtype=np.uint64)
+    unique, inverse = np.unique(signatures, return_inverse=True)
+    missing = np.array([s for s in unique.tolist() if s not in _PLAN_CACHE], dtype=np.uint64)
+    if len(missing):
+        matched = (missing[:, None] & compiled["masks"][None, :]) == compiled["masks"][None, :]
+        for signature, row in zip(missing.tolist(), matched):
+            _PLAN_CACHE[signature] = _render(row, compiled)
+    unique_plans = [_PLAN_CACHE[s] for s in unique.tolist()]
+    return [unique_plans[i] for i in inverse.ravel()]
+
+def generate_plan(sleep_goal, lifestyle_factors=(), environmental_factors=()):
+    """Recommendation plan for a single profile"""
+    return plans_for_signatures([factor_signature(sleep_goal, lifestyle_factors, environmental_factors)])[0]
+
+def generate_plans(profiles):
+    """Plans for many profiles at once, without any Streamlit dependency.
+
+    ``profiles`` is a DataFrame (or list of dicts) with ``sleep_goal``,
+    ``lifestyle_factors`` and ``environmental_factors`` columns; the result is
+    the same frame with ``signature`` and ``plan`` (markdown text) columns added.
+    """
+    profiles = pd.DataFrame(profiles).reset_index(drop=True)
+    profiles["signature"] = profile_signatures(profiles)
+    profiles["plan"] = ["\n\n".join(plan) for plan in plans_for_signatures(profiles["signature"])]
+    return profiles
@@ -0,0 +1,256 @@
+"""Run N worker processes behind a local reverse proxy.
+
+    python serve.py --workers 4                  # Streamlit app on :8500
+    python serve.py --workers 4 --mode api       # JSON API on :8500
+    python serve.py --check                      # smoke-test 2 API workers behind the proxy, then exit
+
+The model artifact and its compact export are built once before any worker
+starts, so no worker ever trains on a request, and every worker memory-maps
+the same forest and opens the same SQLite store, so nothing is held
+per process that another worker would need. The proxy forwards TCP
+connections, so WebSockets pass through unchanged. Streamlit sessions live in
+the worker that owns their WebSocket, so in ``app`` mode clients are pinned to
+a worker by address; API requests are stateless and spread round-robin.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import zlib
+
+BACKEND_BASE_PORT = 8601
+SERVE_EXPORT_DIR = os.environ.get("SLEEPYTICS_SERVE_EXPORT_DIR", "artifacts/serve")
+PROXY_BUFFER = 64 * 1024
+
+
+def prepare_artifact():
+    """Build the shared model artifact before any worker starts; returns the compact export the workers map.
+
+    Without a compact export at the default path, the model is exported
+    unpruned under ``SERVE_EXPORT_DIR`` (one directory per model version), so
+    workers map one copy of the forest instead of each unpickling their own.
+    Only the workers started here are pointed at it: the model that
+    ``streamlit run main.py`` loads is not changed.
+    """
+    from model_export import COMPACT_MODEL_PATH, export_compact_model
+    from modeling import model_version
+    from startup import load_model_bundle
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        bundle = load_model_bundle()
+    if os.path.exists(COMPACT_MODEL_PATH):
+        return COMPACT_MODEL_PATH
+    path = os.path.join(SERVE_EXPORT_DIR, model_version(bundle["model"]))
+    if not os.path.exists(path):
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        export_compact_model(bundle, tmp_path)
+        os.replace(tmp_path, path)
+    return path
+
+def worker_command(mode, port):
+    if mode == "api":
+        return [sys.executable, "api.py", "--port", str(port)]
+    return [sys.executable, "-m", "streamlit", "run", "main.py", "--server.port", str(port),
+            "--server.address", "127.0.0.1", "--server.headless", "true"]
+
+def wait_for_port(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), timeout=1):
+            return
+        time.sleep(0.1)
+    raise RuntimeError(f"worker on port {port} did not start within {timeout} s")
+
+def start_workers(n_workers, mode="api", base_port=BACKEND_BASE_PORT, model_path=None):
+    """Start worker processes on consecutive ports; returns (processes, ports)
+
+    ``model_path`` is the compact export the workers load instead of the default one.
+    """
+    ports = [base_port + i for i in range(n_workers)]
+    env = dict(os.environ, SLEEPYTICS_COMPACT_MODEL_PATH=model_path) if model_path else None
+    processes = [subprocess.Popen(worker_command(mode, port), stdout=subprocess.DEVNULL, env=env) for port in ports]
+    try:
+        for port in ports:
+            wait_for_port(port)
+    except RuntimeError:
+        stop_workers(processes)
+        raise
+    return processes, ports
+
+def stop_workers(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+async def _pipe(reader, writer):
+    try:
+        while data := await reader.read(PROXY_BUFFER):
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        with contextlib.suppress(Exception):
+            writer.close()
+
+async def run_proxy(ports, host="127.0.0.1", port=8500, sticky=False, ready=None):
+    """Forward client connections to the worker ports until cancelled"""
+    next_port = itertools.cycle(ports).__next__
+
+    async def handle(client_reader, client_writer):
+        if sticky:
+            client_host = client_writer.get_extra_info("peername")[0]
+            backend_port = ports[zlib.crc32(client_host.encode()) % len(ports)]
+        else:
+            backend_port = next_port()
+        try:
+            backend_reader, backend_writer = await asyncio.open_connection("127.0.0.1", backend_port)
+        except OSError:
+            client_writer.close()
+            return
+        await asyncio.gather(_pipe(client_reader, backend_writer), _pipe(backend_reader, client_writer))
+
+    server = await asyncio.start_server(handle, host, port, backlog=1024)
+    if ready is not None:
+        ready.set()
+    async with server:
+        await server.serve_forever()
+
+def _request(url, payload=None):
+    """(status, decoded body) of a GET, or of a JSON POST when ``payload`` is given"""
+    data = None if payload is None else json.dumps(payload).encode()
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json",
+                                                               "X-User": "smoke-check"})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, response.read().decode()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode()
+
+def _mapped_files(pid):
+    """Text of a process's memory map (Linux)"""
+    with open(f"/proc/{pid}/maps") as f:
+        return f.read()
+
+def smoke_check(n_workers=2, mode="api", port=8500, base_port=BACKEND_BASE_PORT):
+    """Start workers and the proxy, check their responses through the proxy; returns the failures"""
+    from api import INPUT_FIELDS
+
+    sample = dict(zip(INPUT_FIELDS, ['Male', 30, 'Doctor', 7.0, 7, 50, 5, 'Normal', 70, 8000, 120, 80]))
+    model_path = prepare_artifact()
+    failures = []
+
+    def check(name, ok, detail=""):
+        print(f"{'ok  ' if ok else 'FAIL'} {name}{': ' + detail if detail and not ok else ''}", flush=True)
+        if not ok:
+            failures.append(name)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Requests made by the check are logged to a scratch store, not the real one
+        db_path = os.environ.get("SLEEPYTICS_DB_PATH")
+        os.environ["SLEEPYTICS_DB_PATH"] = os.path.join(tmp, "smoke.db")
+        processes, ports = start_workers(n_workers, mode, base_port, model_path)
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        proxy = loop.create_task(run_proxy(ports, port=port, sticky=mode == "app", ready=ready))
+
+        def serve_proxy():
+            with contextlib.suppress(asyncio.CancelledError):
+                loop.run_until_complete(proxy)
+
+        thread = threading.Thread(target=serve_proxy, daemon=True)
+        thread.start()
+        try:
+            check("proxy listening", ready.wait(10))
+            base = f"http://127.0.0.1:{port}"
+            if mode == "app":
+                status, body = _request(f"{base}/_stcore/health")
+                check("app health", status == 200 and body == "ok", f"{status} {body[:200]}")
+                status, body = _request(base)
+                check("app page", status == 200 and "<html" in body.lower(), f"{status}")
+            else:
+                workers = {}
+                for _ in range(2 * n_workers):
+                    status, body = _request(f"{base}/health")
+                    healthy = status == 200 and json.loads(body).get("status") == "ok"
+                    check("health", healthy, f"{status} {body[:200]}")
+                    if healthy:
+                        workers[json.loads(body)["pid"]] = json.loads(body)["model_version"]
+                check(f"requests reach all {n_workers} workers", len(workers) == n_workers,
+                      f"saw pids {sorted(workers)}")
+                with open(os.path.join(model_path, "forest", "meta.json")) as f:
+                    version = json.load(f)["version"]
+                check("every worker serves the shared export", set(workers.values()) == {version},
+                      f"expected {version}, workers report {workers}")
+                if os.path.isdir("/proc"):
+                    forest_dir = os.path.realpath(os.path.join(model_path, "forest"))
+                    unmapped = [pid for pid in workers if forest_dir not in _mapped_files(pid)]
+                    check("every worker memory-maps the shared forest", not unmapped, f"not mapped by {unmapped}")
+                status, body = _request(f"{base}/predict", sample)
+                result = json.loads(body) if status == 200 else {}
+                check("predict one record", status == 200 and "prediction" in result
+                      and abs(sum(result.get("probabilities", {}).values()) - 1) < 1e-6, f"{status} {body[:200]}")
+                status, body = _request(f"{base}/predict", [sample, dict(sample, Age=60, **{'BMI Category': 'Obese'})])
+                check("predict a batch", status == 200 and len(json.loads(body)) == 2, f"{status} {body[:200]}")
+                status, body = _request(f"{base}/predict", {"Age": 30})
+                check("reject a record with missing fields", status == 400, f"{status} {body[:200]}")
+        finally:
+            loop.call_soon_threadsafe(proxy.cancel)
+            thread.join(10)
+            loop.close()
+            stop_workers(processes)
+            if db_path is None:
+                os.environ.pop("SLEEPYTICS_DB_PATH")
+            else:
+                os.environ["SLEEPYTICS_DB_PATH"] = db_path
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Sleepytics from several worker processes")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU, 2 with --check)")
+    parser.add_argument("--mode", choices=["app", "api"], help="Streamlit app or JSON API workers "
+                        "(default: app, api with --check)")
+    parser.add_argument("--host", default="127.0.0.1", help="proxy listen address")
+    parser.add_argument("--port", type=int, default=8500, help="proxy listen port")
+    parser.add_argument("--base-port", type=int, default=BACKEND_BASE_PORT, help="first worker port")
+    parser.add_argument("--check", action="store_true",
+                        help="start the workers (2 by default) and proxy, check their responses and exit")
+    args = parser.parse_args()
+
+    if args.check:
+        n_workers = 2 if args.workers is None else args.workers
+        failures = smoke_check(n_workers, "api" if args.mode is None else args.mode, args.port, args.base_port)
+        print(f"{'FAILED: ' + ', '.join(failures) if failures else 'All checks passed'}")
+        sys.exit(1 if failures else 0)
+
+    if args.workers is None:
+        args.workers = os.cpu_count()
+    if args.mode is None:
+        args.mode = "app"
+    processes, ports = start_workers(args.workers, args.mode, args.base_port, prepare_artifact())
+    print(f"{args.workers} {args.mode} workers on ports {ports[0]}-{ports[-1]}; "
+          f"proxy listening on http://{args.host}:{args.port}", flush=True)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        asyncio.run(run_proxy(ports, args.host, args.port, sticky=args.mode == "app"))
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        stop_workers(processes)
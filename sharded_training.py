@@ -0,0 +1,276 @@
+"""Out-of-core training on CSV / Parquet data larger than memory.
+
+    python sharded_training.py data/big/*.parquet --workers 4 --shard-rows 500000
+
+Training makes two streaming passes over the input files, reading
+``--chunk-rows`` rows at a time:
+
+1. A statistics pass collects each categorical column's vocabulary and the
+   running mean and variance of every feature, which is all the label encoder
+   and scaler need.
+2. A training pass encodes and scales chunks, groups them into shards of
+   ``--shard-rows`` rows and fits a small forest on each shard in a pool of
+   worker processes. Only a bounded number of shards is in flight at once.
+
+The per-shard forests are merged into one FlatForest (classes missing from a
+shard get zero probability in its trees) and written as a compact export, which
+is what serving workers memory-map. Every ``HOLDOUT_EVERY``-th row is held out
+(up to ``MAX_HOLDOUT_ROWS``) to report the merged model's accuracy.
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from forest import FlatForest
+from modeling import CATEGORICAL_FEATURES
+
+FEATURES = [
+    'Gender', 'Age', 'Occupation', 'Sleep Duration', 'Quality of Sleep', 'Physical Activity Level',
+    'Stress Level', 'BMI Category', 'Heart Rate', 'Daily Steps', 'Systolic', 'Diastolic'
+]
+NUMERIC_FEATURES = [f for f in FEATURES if f not in CATEGORICAL_FEATURES]
+TARGET = 'Sleep Disorder'
+CHUNK_ROWS = 100_000
+SHARD_ROWS = 500_000
+TREES_PER_SHARD = 10
+MAX_DEPTH = 20
+MIN_SAMPLES_LEAF = 2
+HOLDOUT_EVERY = 50
+MAX_HOLDOUT_ROWS = 200_000
+
+
+def iter_chunks(paths, chunk_rows=CHUNK_ROWS):
+    """Raw DataFrame chunks from CSV or Parquet files, in file order"""
+    for path in paths:
+        if path.endswith(('.parquet', '.pq')):
+            import pyarrow.parquet as pq
+
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_csv(path, chunksize=chunk_rows)
+
+def split_features(chunk):
+    """Model feature columns (blood pressure split), the target with 'None' as missing and the rows dropped.
+
+    Rows with an unreadable blood pressure or number, or a missing feature, are dropped from both.
+    """
+    features = chunk.drop(columns=['Blood Pressure', 'Person ID', TARGET], errors='ignore')
+    if 'Blood Pressure' in chunk:
+        pressure = chunk['Blood Pressure'].astype(str).str.split('/', n=1, expand=True).reindex(columns=[0, 1])
+        features['Systolic'], features['Diastolic'] = pressure[0], pressure[1]
+    features = features.reindex(columns=FEATURES)
+    for column in NUMERIC_FEATURES:
+        features[column] = pd.to_numeric(features[column], errors='coerce')
+    valid = features.notna().all(axis=1)
+    target = chunk[TARGET].where(chunk[TARGET].notna() & (chunk[TARGET] != 'None'))
+    if valid.all():
+        return features, target, 0
+    return features[valid], target[valid], int((~valid).sum())
+
+def scan_statistics(paths, chunk_rows=CHUNK_ROWS):
+    """First pass: category counts, numeric running moments, the target vocabulary and row counts"""
+    from sklearn.preprocessing import StandardScaler
+
+    category_counts = {column: Counter() for column in CATEGORICAL_FEATURES}
+    numeric = StandardScaler()
+    labels, has_missing_label, n_rows, n_dropped = set(), False, 0, 0
+    for chunk in iter_chunks(paths, chunk_rows):
+        features, target, dropped = split_features(chunk)
+        n_dropped += dropped
+        if not len(features):
+            continue
+        for column in CATEGORICAL_FEATURES:
+            category_counts[column].update(features[column].value_counts().to_dict())
+        numeric.partial_fit(features[NUMERIC_FEATURES].to_numpy(dtype=np.float64))
+        labels.update(target.dropna().unique())
+        has_missing_label |= bool(target.isna().any())
+        n_rows += len(features)
+    target_classes = sorted(labels) + ([np.nan] if has_missing_label else [])
+    return category_counts, numeric, target_classes, n_rows, n_dropped
+
+def build_preprocessing(category_counts, numeric, target_classes):
+    """Label encoder and scaler equivalent to preprocess_data + StandardScaler on the full data"""
+    from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+    label_encoder = LabelEncoder()
+    label_encoder.classes_ = np.array(target_classes, dtype=object)
+    label_encoder.column_classes_ = {
+        column: np.array(sorted(counts)) for column, counts in category_counts.items()
+    }
+    label_encoder.column_classes_[TARGET] = label_encoder.classes_
+    mean, var = {}, {}
+    for column, counts in category_counts.items():
+        # Moments of the label codes follow directly from the category counts
+        codes = np.arange(len(counts), dtype=np.float64)
+        weights = np.array([counts[value] for value in sorted(counts)], dtype=np.float64)
+        mean[column] = np.average(codes, weights=weights)
+        var[column] = np.average((codes - mean[column]) ** 2, weights=weights)
+    for column, m, v in zip(NUMERIC_FEATURES, numeric.mean_, numeric.var_):
+        mean[column], var[column] = m, v
+
+    scaler = StandardScaler()
+    scaler.mean_ = np.array([mean[f] for f in FEATURES])
+    scaler.var_ = np.array([var[f] for f in FEATURES])
+    scaler.scale_ = np.where(scaler.var_ > 0, np.sqrt(scaler.var_), 1.0)
+    scaler.n_samples_seen_ = numeric.n_samples_seen_
+    scaler.n_features_in_ = len(FEATURES)
+    scaler.feature_names_in_ = np.array(FEATURES, dtype=object)
+    return label_encoder, scaler
+
+def encode_chunk(features, target, label_encoder, scaler):
+    """Scaled float32 feature matrix and integer class codes for one chunk"""
+    X = np.empty((len(features), len(FEATURES)), dtype=np.float64)
+    for j, column in enumerate(FEATURES):
+        if column in CATEGORICAL_FEATURES:
+            X[:, j] = pd.Index(label_encoder.column_classes_[column]).get_indexer(features[column])
+        else:
+            X[:, j] = features[column].to_numpy(dtype=np.float64)
+    X = ((X - scaler.mean_) / scaler.scale_).astype(np.float32)
+    known = [c for c in label_encoder.classes_ if c == c]
+    # Missing labels ("None") sort last, as LabelEncoder orders NaN after strings
+    y = np.where(target.isna(), len(known), pd.Index(known).get_indexer(target.fillna(''))).astype(np.int16)
+    return X, y
+
+def iter_shards(paths, label_encoder, scaler, shard_rows=SHARD_ROWS, chunk_rows=CHUNK_ROWS, holdout=None):
+    """Second pass: (X, y) shards of about ``shard_rows`` rows; held-out rows go to ``holdout``"""
+    buffer_X, buffer_y, buffered, row = [], [], 0, 0
+    for chunk in iter_chunks(paths, chunk_rows):
+        features, target, _ = split_features(chunk)
+        if not len(features):
+            continue
+        X, y = encode_chunk(features, target, label_encoder, scaler)
+        held = (np.arange(row, row + len(X)) % HOLDOUT_EVERY == 0) if holdout is not None else np.zeros(len(X), bool)
+        row += len(X)
+        if held.any() and holdout["rows"] < MAX_HOLDOUT_ROWS:
+            holdout["X"].append(X[held])
+            holdout["y"].append(y[held])
+            holdout["rows"] += int(held.sum())
+        else:
+            held[:] = False
+        buffer_X.append(X[~held])
+        buffer_y.append(y[~held])
+        buffered += int((~held).sum())
+        if buffered >= shard_rows:
+            yield np.concatenate(buffer_X), np.concatenate(buffer_y)
+            buffer_X, buffer_y, buffered = [], [], 0
+    if buffered:
+        yield np.concatenate(buffer_X), np.concatenate(buffer_y)
+
+def fit_shard(X, y, n_classes, n_trees=TREES_PER_SHARD, max_depth=MAX_DEPTH, seed=0):
+    """Fit one shard's forest and return it flattened over all ``n_classes`` classes"""
+    from sklearn.ensemble import RandomForestClassifier
+
+    model = RandomForestClassifier(n_estimators=n_trees, max_depth=max_depth, min_samples_leaf=MIN_SAMPLES_LEAF,
+                                   random_state=seed, n_jobs=1)
+    model.fit(X, y)
+    return FlatForest.from_sklearn(model, classes=np.arange(n_classes)).compact()
+
+def forest_version(forest):
+    digest = hashlib.sha1()
+    for array in (forest.feature, forest.threshold, forest.value):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()[:12]
+
+def train_sharded(paths, workers=os.cpu_count(), shard_rows=SHARD_ROWS, chunk_rows=CHUNK_ROWS,
+                  trees_per_shard=TREES_PER_SHARD, max_depth=MAX_DEPTH, log=print):
+    """Train a merged forest over ``paths`` without loading them whole; returns a model bundle"""
+    start = time.perf_counter()
+    category_counts, numeric, target_classes, n_rows, n_dropped = scan_statistics(paths, chunk_rows)
+    if not n_rows:
+        raise ValueError(f"No usable rows in {', '.join(paths)} ({n_dropped} dropped)")
+    label_encoder, scaler = build_preprocessing(category_counts, numeric, target_classes)
+    n_classes = len(target_classes)
+    log(f"Scanned {n_rows} rows in {time.perf_counter() - start:.1f} s; {n_classes} classes; "
+        f"dropped {n_dropped} rows with missing or unreadable values")
+
+    holdout = {"X": [], "y": [], "rows": 0}
+    forests = []
+    with ProcessPoolExecutor(workers) as pool:
+        in_flight = deque()
+        for i, (X, y) in enumerate(iter_shards(paths, label_encoder, scaler, shard_rows, chunk_rows, holdout)):
+            in_flight.append(pool.submit(fit_shard, X, y, n_classes, trees_per_shard, max_depth, seed=i))
+            del X, y
+            if len(in_flight) > workers:
+                forests.append(in_flight.popleft().result())
+                log(f"{len(forests)} shards trained ({time.perf_counter() - start:.1f} s)")
+        while in_flight:
+            forests.append(in_flight.popleft().result())
+            log(f"{len(forests)} shards trained ({time.perf_counter() - start:.1f} s)")
+
+    model = FlatForest.concatenate(forests)
+    model.version = forest_version(model)
+    accuracy = float("nan")
+    if holdout["rows"]:
+        X_holdout, y_holdout = np.concatenate(holdout["X"]), np.concatenate(holdout["y"])
+        accuracy = float((model.predict(X_holdout) == y_holdout).mean())
+    log(f"Merged {model.n_trees} trees ({model.n_nodes} nodes); holdout accuracy {accuracy:.4f} "
+        f"on {holdout['rows']} rows; {time.perf_counter() - start:.1f} s total")
+    return {"model": model, "scaler": scaler, "label_encoder": label_encoder, "accuracy": accuracy}
+
+def check_invalid_rows(data_path="data/data.csv", chunk_rows=50):
+    """Train on a copy of the data where whole chunks and scattered rows are unreadable; returns the failures"""
+    import tempfile
+
+    df = pd.read_csv(data_path)
+    bad = df.copy()
+    bad['Blood Pressure'] = 'n/a'
+    scattered = df.copy().astype({'Age': object})
+    scattered.loc[scattered.index[::7], 'Age'] = 'unknown'
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        mixed, invalid = os.path.join(tmp, "mixed.csv"), os.path.join(tmp, "invalid.csv")
+        # Whole chunks of invalid rows at the start, in the middle and at the end
+        pd.concat([bad.head(chunk_rows), df, bad.head(2 * chunk_rows), scattered, bad.head(chunk_rows)]).to_csv(
+            mixed, index=False)
+        bad.to_csv(invalid, index=False)
+        expected_dropped = 4 * chunk_rows + len(scattered.index[::7])
+        try:
+            *_, n_rows, n_dropped = scan_statistics([mixed], chunk_rows)
+            if (n_rows, n_dropped) != (2 * len(df) - expected_dropped + 4 * chunk_rows, expected_dropped):
+                failures.append(f"scan counted {n_rows} rows and {n_dropped} dropped")
+            bundle = train_sharded([mixed], workers=1, shard_rows=300, chunk_rows=chunk_rows, log=lambda _: None)
+            if not bundle["accuracy"] > 0.8:
+                failures.append(f"holdout accuracy {bundle['accuracy']:.3f}")
+        except Exception as e:
+            failures.append(f"training with invalid chunks failed: {type(e).__name__}: {e}")
+        try:
+            train_sharded([invalid], workers=1, chunk_rows=chunk_rows, log=lambda _: None)
+            failures.append("a file without usable rows did not raise")
+        except ValueError:
+            pass
+    return failures
+
+
+if __name__ == "__main__":
+    from model_export import COMPACT_MODEL_PATH, export_compact_model
+
+    parser = argparse.ArgumentParser(description="Train on CSV/Parquet files larger than memory")
+    parser.add_argument("paths", nargs="*", help="CSV or Parquet files with the columns of data/data.csv")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="shard training processes")
+    parser.add_argument("--shard-rows", type=int, default=SHARD_ROWS, help="rows per sub-forest")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows read at a time")
+    parser.add_argument("--trees-per-shard", type=int, default=TREES_PER_SHARD)
+    parser.add_argument("--max-depth", type=int, default=MAX_DEPTH)
+    parser.add_argument("--path", default=COMPACT_MODEL_PATH, help="compact export directory to write")
+    parser.add_argument("--check", action="store_true",
+                        help="check that unreadable rows and chunks are skipped, using data/data.csv, and exit")
+    args = parser.parse_args()
+    if args.check:
+        failures = check_invalid_rows()
+        print("FAILED: " + "; ".join(failures) if failures else "All checks passed")
+        sys.exit(1 if failures else 0)
+    if not args.paths:
+        parser.error("no input files given")
+
+    bundle = train_sharded(args.paths, args.workers, args.shard_rows, args.chunk_rows, args.trees_per_shard,
+                           args.max_depth)
+    export_compact_model(bundle, args.path)
+    print(f"Wrote compact model to {args.path}")
@@ -0,0 +1,164 @@
+"""Bulk import of wearable / CSV sleep exports and running diary insights.
+
+Exports are read in chunks, mapped onto the diary schema (bedtime, wake time,
+duration, quality), validated, deduplicated by date and written to the store
+one transaction per chunk. Insight aggregates are kept as running sums and
+counts so they are updated once per chunk instead of recomputed per row.
+"""
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from storage import insert_diary_entries, diary_dates
+
+CHUNK_ROWS = 5000
+INSIGHT_METRICS = ['Sleep Duration', 'Quality of Sleep', 'Stress Level']
+
+# Normalized export column name -> (diary field, multiplier applied to numeric values)
+COLUMN_ALIASES = {
+    'date': ('Date', None), 'night': ('Date', None), 'sleep date': ('Date', None), 'day': ('Date', None),
+    'calendar date': ('Date', None),
+    'bedtime': ('Bedtime', None), 'bed time': ('Bedtime', None), 'sleep start': ('Bedtime', None),
+    'start': ('Bedtime', None), 'start time': ('Bedtime', None), 'in bed': ('Bedtime', None),
+    'wake time': ('Wake Time', None), 'wake': ('Wake Time', None), 'waketime': ('Wake Time', None),
+    'sleep end': ('Wake Time', None), 'end': ('Wake Time', None), 'end time': ('Wake Time', None),
+    'woke up': ('Wake Time', None),
+    'sleep duration': ('Sleep Duration', 1.0), 'duration': ('Sleep Duration', 1.0),
+    'hours asleep': ('Sleep Duration', 1.0), 'time asleep': ('Sleep Duration', 1.0),
+    'total sleep': ('Sleep Duration', 1.0), 'minutes asleep': ('Sleep Duration', 1 / 60),
+    'duration minutes': ('Sleep Duration', 1 / 60), 'asleep minutes': ('Sleep Duration', 1 / 60),
+    'quality of sleep': ('Quality of Sleep', 1.0), 'sleep quality': ('Quality of Sleep', 1.0),
+    'quality': ('Quality of Sleep', 1.0), 'sleep score': ('Quality of Sleep', 0.1), 'score': ('Quality of Sleep', 0.1),
+    'stress level': ('Stress Level', 1.0), 'stress': ('Stress Level', 1.0),
+    'mood': ('Mood', 1.0),
+}
+DATE_PATTERN = r'\d{4}-\d{1,2}-\d{1,2}|\d{1,2}/\d{1,2}/\d{2,4}'
+
+
+def _normalize_name(name):
+    return re.sub(r'[\s_\-()]+', ' ', str(name).lower()).strip()
+
+def map_columns(columns):
+    """Map export column names onto diary fields; unknown columns are dropped"""
+    mapping = {}
+    for column in columns:
+        alias = COLUMN_ALIASES.get(_normalize_name(column))
+        if alias and alias[0] not in {field for field, _ in mapping.values()}:
+            mapping[column] = alias
+    return mapping
+
+def read_export_chunks(source, name=None, chunk_rows=CHUNK_ROWS):
+    """Yield DataFrame chunks from a CSV, JSON Lines or JSON array export.
+
+    ``source`` is a path or a binary file object (such as a Streamlit upload).
+    CSV and JSON Lines are streamed; a plain JSON array has to be parsed whole
+    and is then sliced into chunks.
+    """
+    name = (name or getattr(source, 'name', None) or str(source)).lower()
+    ext = os.path.splitext(name)[1]
+    if ext in ('.jsonl', '.ndjson'):
+        yield from pd.read_json(source, lines=True, chunksize=chunk_rows)
+    elif ext == '.json':
+        if isinstance(source, str):
+            with open(source) as f:
+                records = json.load(f)
+        else:
+            records = json.load(source)
+        if isinstance(records, dict):
+            # Common wearable layout: {"sleep": [...]} with a single list of nights
+            records = next((v for v in records.values() if isinstance(v, list)), [])
+        for start in range(0, len(records), chunk_rows):
+            yield pd.DataFrame(records[start:start + chunk_rows])
+    else:
+        yield from pd.read_csv(source, chunksize=chunk_rows)
+
+def normalize_chunk(chunk):
+    """Map, convert and validate one export chunk; returns (entries DataFrame, rejected count)"""
+    mapping = map_columns(chunk.columns)
+    raw = pd.DataFrame({field: chunk[column] for column, (field, _) in mapping.items()}, index=chunk.index)
+    scales = {field: scale for field, scale in mapping.values()}
+    n = len(chunk)
+
+    bed_ts = pd.to_datetime(raw['Bedtime'], errors='coerce', format='mixed') if 'Bedtime' in raw else pd.Series(pd.NaT, index=raw.index)
+    wake_ts = pd.to_datetime(raw['Wake Time'], errors='coerce', format='mixed') if 'Wake Time' in raw else pd.Series(pd.NaT, index=raw.index)
+    if 'Date' in raw:
+        dates = pd.to_datetime(raw['Date'], errors='coerce', format='mixed').dt.date
+    elif 'Wake Time' in raw:
+        # Without a date column, a night is dated by the morning it ended on
+        has_date = raw['Wake Time'].astype(str).str.contains(DATE_PATTERN)
+        dates = wake_ts.dt.date.where(has_date)
+    else:
+        dates = pd.Series(None, index=raw.index, dtype=object)
+
+    entries = pd.DataFrame({'Date': dates, 'Bedtime': bed_ts.dt.time, 'Wake Time': wake_ts.dt.time}, index=raw.index)
+    for field in ['Sleep Duration', 'Quality of Sleep', 'Stress Level', 'Mood']:
+        values = pd.to_numeric(raw[field], errors='coerce') * scales[field] if field in raw else pd.Series(np.nan, index=raw.index)
+        entries[field] = values.astype(float)
+    gap_hours = ((wake_ts - bed_ts).dt.total_seconds() / 3600) % 24
+    entries['Sleep Duration'] = entries['Sleep Duration'].fillna(gap_hours).round(2)
+    entries['Quality of Sleep'] = entries['Quality of Sleep'].round().clip(1, 10)
+
+    valid = (
+        entries['Date'].notna() & entries['Bedtime'].notna() & entries['Wake Time'].notna()
+        & entries['Sleep Duration'].between(0, 24, inclusive='right')
+    )
+    return entries[valid], n - int(valid.sum())
+
+def empty_insights():
+    """Running sums and counts for the Sleep Insights metrics"""
+    return {metric: {'sum': 0.0, 'count': 0} for metric in INSIGHT_METRICS}
+
+def update_insights(insights, entries):
+    """Fold a batch of diary entries (DataFrame or list of dicts) into the running aggregates"""
+    entries = pd.DataFrame(entries)
+    for metric in INSIGHT_METRICS:
+        if metric in entries:
+            values = pd.to_numeric(entries[metric], errors='coerce')
+            insights[metric]['sum'] += float(values.sum())
+            insights[metric]['count'] += int(values.count())
+    return insights
+
+def insight_mean(insights, metric):
+    stats = insights[metric]
+    return stats['sum'] / stats['count'] if stats['count'] else float('nan')
+
+def diary_entries(entries):
+    """Turn normalized rows into full diary entry dicts, matching manually saved entries"""
+    records = entries.to_dict(orient='records')
+    for record in records:
+        record.update({'Dream Recall': None, 'Medications': [], 'Alcohol Intake': None, 'Screen Time': None,
+                       'Caffeine Intake': None, 'Notes': 'Imported'})
+    return records
+
+def import_diary_export(user, source, name=None, insights=None, on_batch=None, chunk_rows=CHUNK_ROWS):
+    """Stream an export into ``user``'s diary.
+
+    Returns ``(new_entries, summary)`` where ``summary`` counts rows read,
+    imported, skipped as duplicate dates and rejected as invalid.
+    ``on_batch(summary)`` is called after every committed chunk.
+    """
+    seen = diary_dates(user)
+    summary = {'read': 0, 'imported': 0, 'duplicates': 0, 'rejected': 0}
+    imported = []
+    for chunk in read_export_chunks(source, name, chunk_rows):
+        entries, rejected = normalize_chunk(chunk)
+        iso_dates = entries['Date'].astype(str)
+        fresh = ~iso_dates.duplicated() & ~iso_dates.isin(seen)
+        entries = entries[fresh]
+        batch = diary_entries(entries)
+        written = insert_diary_entries(user, batch)
+        seen.update(iso_dates[fresh])
+        if insights is not None:
+            update_insights(insights, entries)
+        imported.extend(batch)
+
+        summary['read'] += len(chunk)
+        summary['rejected'] += rejected
+        summary['imported'] += written
+        summary['duplicates'] += len(fresh) - int(fresh.sum()) + len(batch) - written
+        if on_batch:
+            on_batch(summary)
+    return imported, summary
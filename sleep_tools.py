@@ -5,6 +5,11 @@ from datetime import datetime, timedelta
 import time
 import base64
 
+from alarm_planner import plan_alarms, cycle_wake_times, minutes_after_noon, time_from_minutes
+from recommendation_rules import SLEEP_GOALS, LIFESTYLE_FACTORS, ENVIRONMENTAL_FACTORS, generate_plan
+from sleep_diary import empty_insights, import_diary_export, update_insights
+from storage import insert_diary_entries
+
 class SleepRecommendationEngine:
     def __init__(self, user_profile, sleep_history):
         self.user_profile = user_profile
@@ -74,8 +79,31 @@ def advanced_sleep_diary():
             "Mood": mood,
             "Notes": notes
         }
-        st.session_state.advanced_sleep_log.append(entry)
+        insert_diary_entries(st.session_state.username, [entry], replace=True)
+        # The store keeps one entry per date, so a second save today replaces the first here too
+        log = st.session_state.advanced_sleep_log
+        kept = [e for e in log if str(e.get("Date")) != str(entry["Date"])]
+        kept.append(entry)
+        st.session_state.advanced_sleep_log = kept
+        if len(kept) <= len(log):
+            st.session_state.sleep_insights = update_insights(empty_insights(), kept)
+        else:
+            update_insights(st.session_state.sleep_insights, [entry])
         st.success("Advanced sleep entry saved successfully!")
+
+    with st.expander("📥 Import from a wearable or CSV export"):
+        st.write("Upload a CSV, JSON or JSON Lines export with date, bedtime, wake time, "
+                 "duration and quality columns. Nights already in your diary are skipped.")
+        upload = st.file_uploader("Sleep export", type=["csv", "json", "jsonl", "ndjson"], key="diary_import_file")
+        if upload is not None and st.button("Import Entries", key="import_diary_entries"):
+            progress = st.empty()
+            imported, summary = import_diary_export(
+                st.session_state.username, upload, insights=st.session_state.sleep_insights,
+                on_batch=lambda s: progress.write(f"Read {s['read']} rows, imported {s['imported']}...")
+            )
+            st.session_state.advanced_sleep_log.extend(imported)
+            progress.success(f"Imported {summary['imported']} nights "
+                             f"({summary['duplicates']} duplicates skipped, {summary['rejected']} invalid rows).")
     
     if st.session_state.advanced_sleep_log:
         st.write("### Advanced Sleep Log")
@@ -167,21 +195,26 @@ def smart_alarm_system():
         bedtime = st.time_input("Bedtime", value=datetime.now().replace(hour=22, minute=0).time())
         cycles = st.slider("Number of Sleep Cycles", 4, 6, 5)
         if st.button("Calculate Optimal Wake Times"):
-            bedtime_dt = datetime.combine(datetime.today(), bedtime)
-            wake_times = [(i, (bedtime_dt + timedelta(minutes=i * 90)).time()) for i in range(cycles - 1, cycles + 2)]
+            cycle_counts = np.arange(cycles - 1, cycles + 2)
+            wake_minutes, _ = cycle_wake_times(minutes_after_noon([bedtime]), cycle_counts)
             st.write("**Optimal Wake Times:**")
-            for cycles, time in wake_times:
-                st.write(f"After {cycles} cycles: {time.strftime('%I:%M %p')}")
+            for count, minutes in zip(cycle_counts, wake_minutes[0]):
+                st.write(f"After {count} cycles: {time_from_minutes(minutes).strftime('%I:%M %p')}")
     
     st.subheader("⏰ Smart Alarm Recommendations")
     if not st.session_state.advanced_sleep_log:
         st.info("Track more sleep data for personalized alarm recommendations")
     else:
-        sleep_df = pd.DataFrame(st.session_state.advanced_sleep_log)
-        avg_sleep_duration = sleep_df['Sleep Duration'].mean()
-        recommended_wake_time = (datetime.now() + timedelta(hours=avg_sleep_duration)).time()
-        st.write(f"Recommended Wake Time: **{recommended_wake_time.strftime('%I:%M %p')}**")
-        st.write("Based on your average sleep duration.")
+        plans = plan_alarms(st.session_state.advanced_sleep_log, wake_window=st.session_state.get("wake_window", 20))
+        if plans.empty:
+            st.info("Track more sleep data for personalized alarm recommendations")
+        else:
+            best = plans.iloc[0]
+            st.write(f"Recommended Bedtime: **{best['Bedtime'].strftime('%I:%M %p')}**, "
+                     f"wake between **{best['Wake Window Start'].strftime('%I:%M %p')}** and "
+                     f"**{best['Wake Time'].strftime('%I:%M %p')}** ({best['Cycles']} sleep cycles)")
+            st.write("Based on the sleep quality you logged for similar bedtimes and durations.")
+            st.dataframe(plans)
 
 def personalized_recommendations():
     """Personalized sleep recommendations"""
@@ -189,70 +222,16 @@ def personalized_recommendations():
     st.subheader("Your Sleep Profile")
     col1, col2 = st.columns(2)
     with col1:
-        sleep_goal = st.selectbox("Primary Sleep Goal", [
-            "Fall asleep faster", "Stay asleep longer", "Improve sleep quality", "Manage sleep disorder", "Optimize sleep schedule"
-        ])
-        lifestyle_factors = st.multiselect("Lifestyle Factors", [
-            "High stress", "Shift work", "Frequent travel", "Regular caffeine use", "Regular alcohol use",
-            "Electronic device use before bed", "Exercise regularly"
-        ])
+        sleep_goal = st.selectbox("Primary Sleep Goal", SLEEP_GOALS)
+        lifestyle_factors = st.multiselect("Lifestyle Factors", LIFESTYLE_FACTORS)
     with col2:
         typical_bedtime = st.time_input("Typical Bedtime", value=datetime.now().replace(hour=22, minute=0).time())
         typical_wake = st.time_input("Typical Wake Time", value=datetime.now().replace(hour=7, minute=0).time())
-        environmental_factors = st.multiselect("Environmental Factors", [
-            "Noisy environment", "Too much light", "Uncomfortable temperature", "Uncomfortable bed",
-            "Sleeping with partner who snores", "Children or pets disrupt sleep"
-        ])
+        environmental_factors = st.multiselect("Environmental Factors", ENVIRONMENTAL_FACTORS)
     
     if st.button("Generate Custom Recommendations"):
         st.subheader("Your Personalized Sleep Plan")
-        recommendations = []
-        
-        if sleep_goal == "Fall asleep faster":
-            recommendations.append("**To Fall Asleep Faster:**\n- Relaxing pre-sleep routine\n- 4-7-8 breathing\n- Avoid electronics\n- Small carb snack")
-        elif sleep_goal == "Stay asleep longer":
-            recommendations.append("**To Stay Asleep Longer:**\n- Limit fluids\n- Cool room\n- White noise\n- Blackout curtains")
-        elif sleep_goal == "Improve sleep quality":
-            recommendations.append("**To Improve Sleep Quality:**\n- Increase daytime activity\n- Natural light\n- Avoid alcohol/heavy meals\n- Weighted blanket")
-        elif sleep_goal == "Manage sleep disorder":
-            recommendations.append("**For Sleep Disorder Management:**\n- Consult specialist\n- Follow treatment\n- Join support group\n- Track symptoms")
-        elif sleep_goal == "Optimize sleep schedule":
-            recommendations.append("**To Optimize Sleep Schedule:**\n- Consistent times\n- Adjust gradually\n- Morning light\n- Track sleep")
-        
-        lifestyle_recs = []
-        if "High stress" in lifestyle_factors:
-            lifestyle_recs.append("Practice stress management techniques")
-        if "Shift work" in lifestyle_factors:
-            lifestyle_recs.append("Use blackout curtains and light therapy")
-        if "Frequent travel" in lifestyle_factors:
-            lifestyle_recs.append("Use melatonin strategically (consult doctor)")
-        if "Regular caffeine use" in lifestyle_factors:
-            lifestyle_recs.append("Cut off caffeine 8 hours before bed")
-        if "Regular alcohol use" in lifestyle_factors:
-            lifestyle_recs.append("Limit alcohol within 3 hours of bedtime")
-        if "Electronic device use before bed" in lifestyle_factors:
-            lifestyle_recs.append("Use blue light filters or glasses")
-        if "Exercise regularly" in lifestyle_factors:
-            lifestyle_recs.append("Schedule workouts earlier in the day")
-        if lifestyle_recs:
-            recommendations.append("**Lifestyle Adjustments:**\n- " + "\n- ".join(lifestyle_recs))
-        
-        environment_recs = []
-        if "Noisy environment" in environmental_factors:
-            environment_recs.append("Use white noise machine or ear plugs")
-        if "Too much light" in environmental_factors:
-            environment_recs.append("Install blackout curtains or use a sleep mask")
-        if "Uncomfortable temperature" in environmental_factors:
-            environment_recs.append("Set thermostat to 65-68°F")
-        if "Uncomfortable bed" in environmental_factors:
-            environment_recs.append("Upgrade mattress or use a topper")
-        if "Sleeping with partner who snores" in environmental_factors:
-            environment_recs.append("Try ear plugs or suggest partner see a doctor")
-        if "Children or pets disrupt sleep" in environmental_factors:
-            environment_recs.append("Establish consistent bedtime routines for them")
-        if environment_recs:
-            recommendations.append("**Environment Optimization:**\n- " + "\n- ".join(environment_recs))
-        
+        recommendations = generate_plan(sleep_goal, lifestyle_factors, environmental_factors)
         for rec in recommendations:
             st.markdown(rec)
 
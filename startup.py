@@ -0,0 +1,141 @@
+"""Process warm-up for Sleepytics workers.
+
+Run ``python startup.py`` at server boot (before ``streamlit run main.py``) to
+build the model artifact and print a startup profile. Inside the app,
+``warm_up()`` is cached per process, so only the first rerun of a fresh
+worker pays for loading the artifact and priming the pipeline.
+"""
+import base64
+import importlib
+import os
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+import pandas as pd
+
+from modeling import MODEL_ARTIFACT_PATH, save_model_artifact, load_model_artifact
+
+BACKGROUND_ASSETS = ["assets/snw.jpg", "assets/p1.jpg"]
+DEFERRED_IMPORTS = ["plotly.express", "sklearn.ensemble"]
+
+# Phase name -> wall time in milliseconds, in the order the phases ran
+PHASE_TIMINGS = {}
+
+
+@contextmanager
+def timed_phase(name):
+    """Record the wall time of a startup phase"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_TIMINGS[name] = (time.perf_counter() - start) * 1000
+
+@lru_cache(maxsize=None)
+def encoded_asset(image_path):
+    """Base64-encode an image asset once per process"""
+    with open(image_path, "rb") as image_file:
+        return base64.b64encode(image_file.read()).decode()
+
+def build_model_bundle():
+    """Train the model from the bundled datasets"""
+    from calibration import fit_calibrator
+    from data_processing import load_data, preprocess_data
+    from model_report import build_model_report
+    from modeling import train_model
+
+    with timed_phase("load data"):
+        df = load_data()
+    with timed_phase("preprocess data"):
+        df_processed, label_encoder = preprocess_data(df)
+    with timed_phase("train model"):
+        model, scaler, accuracy = train_model(df_processed)
+    with timed_phase("calibrate probabilities"):
+        calibrator = fit_calibrator(model, scaler, df_processed)
+    with timed_phase("evaluate model"):
+        report = build_model_report(model, scaler, df_processed, calibrator)
+    return {"model": model, "scaler": scaler, "label_encoder": label_encoder, "accuracy": accuracy,
+            "calibrator": calibrator, "report": report}
+
+def load_model_bundle(path=MODEL_ARTIFACT_PATH):
+    """Load the model artifact, training and saving it first if it does not exist.
+
+    A compact export (see model_export.py) takes precedence, since its forest
+    is memory-mapped and shared by all workers on the host.
+    """
+    from model_export import COMPACT_MODEL_PATH, load_compact_bundle
+
+    if os.path.exists(COMPACT_MODEL_PATH):
+        with timed_phase("map compact model artifact"):
+            return load_compact_bundle(COMPACT_MODEL_PATH)
+    if os.path.exists(path):
+        with timed_phase("load model artifact"):
+            return load_model_artifact(path)
+    bundle = build_model_bundle()
+    with timed_phase("save model artifact"):
+        save_model_artifact(bundle, path)
+    return bundle
+
+def existing_model_bundle(path=MODEL_ARTIFACT_PATH):
+    """The warmed-up model bundle if an artifact exists, else None (never trains one)"""
+    from model_export import COMPACT_MODEL_PATH
+
+    if not (os.path.exists(COMPACT_MODEL_PATH) or os.path.exists(path)):
+        return None
+    return warm_up(path)
+
+def prime_pipeline(bundle):
+    """Run one throwaway prediction so lazy state is built before real traffic"""
+    from explainability import explain_prediction
+    from modeling import predict
+    from neighbors import similar_people
+
+    sample = pd.DataFrame({
+        'Gender': ['Male'], 'Age': [30], 'Occupation': ['Doctor'], 'Sleep Duration': [7.0],
+        'Quality of Sleep': [7], 'Physical Activity Level': [50], 'Stress Level': [5],
+        'BMI Category': ['Normal'], 'Heart Rate': [70], 'Daily Steps': [8000],
+        'Systolic': [120], 'Diastolic': [80]
+    })
+    _, proba = predict(bundle["model"], bundle["scaler"], bundle["label_encoder"], sample, bundle.get("calibrator"))
+    explain_prediction(bundle["model"], bundle["scaler"], bundle["label_encoder"], sample, proba[0].argmax())
+    similar_people(bundle, sample)
+
+@lru_cache(maxsize=None)
+def warm_up(path=MODEL_ARTIFACT_PATH):
+    """Preload everything a request needs; runs once per worker process"""
+    start = time.perf_counter()
+    for module in DEFERRED_IMPORTS:
+        with timed_phase(f"import {module}"):
+            importlib.import_module(module)
+    bundle = load_model_bundle(path)
+    with timed_phase("prime prediction pipeline"):
+        prime_pipeline(bundle)
+    with timed_phase("encode background assets"):
+        for image_path in BACKGROUND_ASSETS:
+            encoded_asset(image_path)
+    PHASE_TIMINGS["total"] = (time.perf_counter() - start) * 1000
+    print(startup_report())
+    return bundle
+
+def startup_report():
+    """Startup phases and their wall times as a printable table"""
+    rows = [{"Phase": name, "Time (ms)": round(ms, 1)} for name, ms in PHASE_TIMINGS.items()]
+    return "Startup profile:\n" + pd.DataFrame(rows).to_string(index=False)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the model artifact and profile worker startup")
+    parser.add_argument("--retrain", action="store_true", help="rebuild the artifact even if one exists")
+    args = parser.parse_args()
+    if args.retrain:
+        import shutil
+        from model_export import COMPACT_MODEL_PATH
+
+        if os.path.exists(MODEL_ARTIFACT_PATH):
+            os.remove(MODEL_ARTIFACT_PATH)
+        # A compact export of the old model would otherwise keep taking precedence
+        shutil.rmtree(COMPACT_MODEL_PATH, ignore_errors=True)
+    warm_up()
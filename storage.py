@@ -0,0 +1,506 @@
+"""SQLite-backed persistence shared by every session and worker process.
+
+One connection is kept per thread (Streamlit runs each session's script in
+its own thread) and the database runs in WAL mode so concurrent readers never
+block the writer.
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, time, timedelta
+
+DB_PATH = os.environ.get("SLEEPYTICS_DB_PATH", "data/sleepytics.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sleep_diary (
+    user TEXT NOT NULL,
+    date TEXT NOT NULL,
+    bedtime TEXT,
+    wake_time TEXT,
+    sleep_duration REAL,
+    quality REAL,
+    stress_level REAL,
+    mood REAL,
+    details TEXT,
+    PRIMARY KEY (user, date)
+);
+CREATE TABLE IF NOT EXISTS prediction_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    user TEXT NOT NULL,
+    input_data TEXT NOT NULL,
+    prediction TEXT NOT NULL,
+    probability TEXT NOT NULL,
+    source TEXT NOT NULL DEFAULT 'interactive',
+    model_version TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_prediction_logs_user ON prediction_logs (user, source, id);
+CREATE INDEX IF NOT EXISTS idx_prediction_logs_timestamp ON prediction_logs (timestamp);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password_hash TEXT NOT NULL,
+    is_admin INTEGER NOT NULL DEFAULT 0,
+    created TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_users_admin ON users (is_admin, username);
+CREATE TABLE IF NOT EXISTS quiz_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    user TEXT,
+    quiz_id TEXT NOT NULL,
+    answers TEXT NOT NULL,
+    score INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS quiz_question_stats (
+    quiz_id TEXT NOT NULL,
+    question_id TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    correct INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (quiz_id, question_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS quiz_score_counts (
+    quiz_id TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    submissions INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (quiz_id, score)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS model_stats (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    version TEXT NOT NULL,
+    role TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    over_budget INTEGER NOT NULL,
+    dropped INTEGER NOT NULL,
+    latency_mean_ms REAL,
+    latency_p95_ms REAL,
+    compared INTEGER NOT NULL,
+    agreed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_model_stats_timestamp ON model_stats (timestamp);
+CREATE TABLE IF NOT EXISTS profile_captures (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    user TEXT,
+    pid INTEGER NOT NULL,
+    duration_ms REAL NOT NULL,
+    stats BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batch_runs (
+    run_id TEXT PRIMARY KEY,
+    started TEXT NOT NULL,
+    finished TEXT,
+    last_user TEXT,
+    scored INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Diary entry keys stored in their own columns; everything else goes to `details` as JSON
+DIARY_COLUMNS = {
+    "Bedtime": "bedtime", "Wake Time": "wake_time", "Sleep Duration": "sleep_duration",
+    "Quality of Sleep": "quality", "Stress Level": "stress_level", "Mood": "mood",
+}
+
+_local = threading.local()
+
+
+def get_connection(path=None):
+    """Per-thread connection to the shared database, creating the schema on first use"""
+    path = path or DB_PATH
+    connections = getattr(_local, "connections", None)
+    if connections is None or _local.pid != os.getpid():
+        # Connections must not be shared with forked worker processes
+        connections = _local.connections = {}
+        _local.pid = os.getpid()
+    conn = connections.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        connections[path] = conn
+    return conn
+
+def _sql_value(value):
+    """Convert diary values (times, NumPy scalars, NaN) to what SQLite stores"""
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, time):
+        return value.strftime("%H:%M:%S")
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+def _diary_row(user, entry):
+    details = {k: v for k, v in entry.items() if k not in DIARY_COLUMNS and k != "Date"}
+    return (
+        user, str(entry["Date"]),
+        *(_sql_value(entry.get(key)) for key in DIARY_COLUMNS),
+        json.dumps(details, default=str),
+    )
+
+def insert_diary_entries(user, entries, replace=False, conn=None):
+    """Insert diary entries in a single transaction; returns the number of rows written.
+
+    With ``replace=False`` an existing entry for the same date is kept and the
+    new one skipped, which is how bulk imports deduplicate against history.
+    """
+    conn = conn or get_connection()
+    verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+    with conn:
+        before = conn.total_changes
+        conn.executemany(
+            f"{verb} INTO sleep_diary (user, date, {', '.join(DIARY_COLUMNS.values())}, details) "
+            f"VALUES (?, ?, {', '.join('?' * len(DIARY_COLUMNS))}, ?)",
+            (_diary_row(user, entry) for entry in entries)
+        )
+        return conn.total_changes - before
+
+def diary_dates(user, conn=None):
+    """Dates (ISO strings) that already have a diary entry for ``user``"""
+    conn = conn or get_connection()
+    return {row[0] for row in conn.execute("SELECT date FROM sleep_diary WHERE user = ?", (user,))}
+
+def load_diary(user, conn=None):
+    """A user's diary as entry dicts in the same shape the diary page creates"""
+    conn = conn or get_connection()
+    entries = []
+    for row in conn.execute("SELECT * FROM sleep_diary WHERE user = ? ORDER BY date", (user,)):
+        entry = {"Date": date.fromisoformat(row["date"])}
+        for key, column in DIARY_COLUMNS.items():
+            value = row[column]
+            if column in ("bedtime", "wake_time"):
+                value = time.fromisoformat(value) if value else None
+            entry[key] = float("nan") if value is None and column not in ("bedtime", "wake_time") else value
+        entry.update(json.loads(row["details"] or "{}"))
+        entries.append(entry)
+    return entries
+
+_INSERT_PREDICTION_LOG = (
+    "INSERT INTO prediction_logs (timestamp, user, input_data, prediction, probability, source, model_version) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+def _prediction_log_rows(rows):
+    return ((ts, user, _json(inputs), prediction, _json(proba), source, version)
+            for ts, user, inputs, prediction, proba, source, version in rows)
+
+def insert_prediction_logs(rows, conn=None):
+    """Write (timestamp, user, input_data, prediction, probability, source, model_version) rows.
+
+    ``input_data`` and ``probability`` may be given as Python objects; they are
+    stored as JSON text.
+    """
+    conn = conn or get_connection()
+    with conn:
+        conn.executemany(_INSERT_PREDICTION_LOG, _prediction_log_rows(rows))
+
+def _json(value):
+    return value if isinstance(value, str) else json.dumps(value, default=_sql_value)
+
+def _log_dict(row):
+    return {
+        "timestamp": row["timestamp"], "user": row["user"], "input_data": json.loads(row["input_data"]),
+        "prediction": row["prediction"], "probability": json.loads(row["probability"]),
+        "source": row["source"], "model_version": row["model_version"],
+    }
+
+def fetch_prediction_logs(day, conn=None):
+    """All prediction log entries whose timestamp falls on ``day`` (a date)"""
+    conn = conn or get_connection()
+    rows = conn.execute(
+        "SELECT * FROM prediction_logs WHERE timestamp >= ? AND timestamp < ? ORDER BY id",
+        (day.isoformat(), (day + timedelta(days=1)).isoformat())
+    )
+    return [_log_dict(row) for row in rows]
+
+def latest_inputs_page(after_user="", limit=1000, conn=None):
+    """Most recent interactive inputs for the next ``limit`` users (by name) after ``after_user``"""
+    conn = conn or get_connection()
+    rows = conn.execute(
+        "SELECT p.user, p.input_data FROM prediction_logs p "
+        "JOIN (SELECT user, MAX(id) AS id FROM prediction_logs "
+        "      WHERE source = 'interactive' AND user > ? GROUP BY user ORDER BY user LIMIT ?) latest "
+        "ON p.id = latest.id ORDER BY p.user",
+        (after_user, limit)
+    )
+    return [(row["user"], json.loads(row["input_data"])) for row in rows]
+
+def recent_diary_means(users, nights=14, conn=None):
+    """Mean duration, quality and stress over each user's last ``nights`` diary entries"""
+    conn = conn or get_connection()
+    means = {}
+    for start in range(0, len(users), 500):
+        chunk = users[start:start + 500]
+        rows = conn.execute(
+            "SELECT user, AVG(sleep_duration) AS duration, AVG(quality) AS quality, AVG(stress_level) AS stress "
+            "FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY user ORDER BY date DESC) AS n FROM sleep_diary "
+            f"      WHERE user IN ({', '.join('?' * len(chunk))})) WHERE n <= ? GROUP BY user",
+            (*chunk, nights)
+        )
+        for row in rows:
+            means[row["user"]] = {"Sleep Duration": row["duration"], "Quality of Sleep": row["quality"],
+                                  "Stress Level": row["stress"]}
+    return means
+
+def open_batch_run(run_id=None, conn=None):
+    """Resume the unfinished batch run (or ``run_id``), or start a new one; returns its row"""
+    conn = conn or get_connection()
+    if run_id is None:
+        row = conn.execute("SELECT * FROM batch_runs WHERE finished IS NULL ORDER BY started DESC LIMIT 1").fetchone()
+    else:
+        row = conn.execute("SELECT * FROM batch_runs WHERE run_id = ?", (run_id,)).fetchone()
+    if row is None:
+        started = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        run_id = run_id or f"batch-{datetime.now():%Y%m%d-%H%M%S}"
+        with conn:
+            conn.execute("INSERT INTO batch_runs (run_id, started, last_user) VALUES (?, ?, '')", (run_id, started))
+        row = conn.execute("SELECT * FROM batch_runs WHERE run_id = ?", (run_id,)).fetchone()
+    return dict(row)
+
+def commit_batch(run_id, log_rows, last_user, conn=None):
+    """Write one batch of scored predictions and advance the run checkpoint atomically"""
+    conn = conn or get_connection()
+    with conn:
+        conn.executemany(_INSERT_PREDICTION_LOG, _prediction_log_rows(log_rows))
+        conn.execute("UPDATE batch_runs SET last_user = ?, scored = scored + ? WHERE run_id = ?",
+                     (last_user, len(log_rows), run_id))
+
+def finish_batch_run(run_id, conn=None):
+    conn = conn or get_connection()
+    with conn:
+        conn.execute("UPDATE batch_runs SET finished = ? WHERE run_id = ?",
+                     (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), run_id))
+
+def iter_prediction_logs(after_id=0, since=None, sources=None, page_size=5000, conn=None):
+    """Yield (id, timestamp, input_data, prediction) pages of log rows newer than ``after_id``"""
+    conn = conn or get_connection()
+    filters, params = ["id > ?"], []
+    if since is not None:
+        filters.append("timestamp >= ?")
+        params.append(since.isoformat())
+    if sources:
+        filters.append(f"source IN ({', '.join('?' * len(sources))})")
+        params.extend(sources)
+    while True:
+        rows = conn.execute(
+            f"SELECT id, timestamp, input_data, prediction FROM prediction_logs WHERE {' AND '.join(filters)} "
+            "ORDER BY id LIMIT ?",
+            (after_id, *params, page_size)
+        ).fetchall()
+        if not rows:
+            return
+        yield [(row["id"], row["timestamp"], json.loads(row["input_data"]), row["prediction"]) for row in rows]
+        after_id = rows[-1]["id"]
+
+def insert_profile_capture(timestamp, user, pid, duration_ms, stats, conn=None):
+    """Store one profiled rerun; ``stats`` is a marshalled pstats dictionary"""
+    conn = conn or get_connection()
+    with conn:
+        conn.execute("INSERT INTO profile_captures (timestamp, user, pid, duration_ms, stats) VALUES (?, ?, ?, ?, ?)",
+                     (timestamp, user, pid, duration_ms, stats))
+
+def list_profile_captures(limit=50, conn=None):
+    """Most recent profile captures, without their stats"""
+    conn = conn or get_connection()
+    rows = conn.execute(
+        "SELECT id, timestamp, user, pid, duration_ms, LENGTH(stats) AS size FROM profile_captures "
+        "ORDER BY id DESC LIMIT ?", (limit,)
+    )
+    return [dict(row) for row in rows]
+
+def load_profile_stats(capture_id, conn=None):
+    conn = conn or get_connection()
+    row = conn.execute("SELECT stats FROM profile_captures WHERE id = ?", (capture_id,)).fetchone()
+    return row["stats"] if row else None
+
+def _export_filters(start, end, user):
+    filters, params = [], []
+    if start is not None:
+        filters.append("{date} >= ?")
+        params.append(start.isoformat())
+    if end is not None:
+        filters.append("{date} < ?")
+        params.append((end + timedelta(days=1)).isoformat())
+    if user:
+        filters.append("user = ?")
+        params.append(user)
+    return filters, params
+
+def iter_log_export(start=None, end=None, user=None, page_size=10000, conn=None):
+    """Yield pages of raw prediction log rows for days ``start``..``end``, by id"""
+    conn = conn or get_connection()
+    filters, params = _export_filters(start, end, user)
+    where = "".join(f" AND {f.format(date='timestamp')}" for f in filters)
+    after_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, timestamp, user, source, model_version, prediction, probability, input_data "
+            f"FROM prediction_logs WHERE id > ?{where} ORDER BY id LIMIT ?",
+            (after_id, *params, page_size)
+        ).fetchall()
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1]["id"]
+
+def count_export_rows(kind, start=None, end=None, user=None, limit=None, conn=None):
+    """Rows an export of ``kind`` ('logs' or 'diaries') would contain, counting at most ``limit``"""
+    conn = conn or get_connection()
+    table, date_column = ("prediction_logs", "timestamp") if kind == "logs" else ("sleep_diary", "date")
+    filters, params = _export_filters(start, end, user)
+    where = " AND ".join(f.format(date=date_column) for f in filters) or "1"
+    return conn.execute(
+        f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} WHERE {where} LIMIT ?)", (*params, limit or -1)
+    ).fetchone()[0]
+
+def iter_diary_export(start=None, end=None, user=None, page_size=10000, conn=None):
+    """Yield pages of raw diary rows for days ``start``..``end``, by (user, date)"""
+    conn = conn or get_connection()
+    filters, params = _export_filters(start, end, user)
+    where = "".join(f" AND {f.format(date='date')}" for f in filters)
+    after = ("", "")
+    while True:
+        rows = conn.execute(
+            f"SELECT user, date, {', '.join(DIARY_COLUMNS.values())}, details FROM sleep_diary "
+            f"WHERE (user, date) > (?, ?){where} ORDER BY user, date LIMIT ?",
+            (*after, *params, page_size)
+        ).fetchall()
+        if not rows:
+            return
+        yield rows
+        after = (rows[-1]["user"], rows[-1]["date"])
+
+def _user_filters(prefix, is_admin, after=""):
+    # Prefix search and keyset paging are both ranges on the primary key; only the tighter
+    # lower bound is given to SQLite, which otherwise may scan from the wrong one
+    if prefix and after < prefix:
+        filters, params = ["username >= ?"], [prefix]
+    else:
+        filters, params = (["username > ?"], [after]) if after else ([], [])
+    if prefix:
+        filters.append("username < ?")
+        params.append(prefix + "\U0010ffff")
+    if is_admin is not None:
+        filters.append("is_admin = ?")
+        params.append(int(is_admin))
+    return filters, params
+
+def get_user(username, conn=None):
+    conn = conn or get_connection()
+    row = conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+    return dict(row) if row else None
+
+def insert_users(rows, conn=None):
+    """Create (username, password_hash, is_admin, created) accounts in one transaction.
+
+    Usernames that already exist are left unchanged; returns the number created.
+    """
+    conn = conn or get_connection()
+    with conn:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (username, password_hash, is_admin, created) VALUES (?, ?, ?, ?)",
+            ((username, password_hash, int(is_admin), created) for username, password_hash, is_admin, created in rows)
+        )
+        return conn.total_changes - before
+
+def ensure_default_user(username, password_hash, conn=None):
+    """Create an admin account if there are no accounts at all"""
+    conn = conn or get_connection()
+    with conn:
+        conn.execute(
+            "INSERT INTO users (username, password_hash, is_admin, created) SELECT ?, ?, 1, ? "
+            "WHERE NOT EXISTS (SELECT 1 FROM users)",
+            (username, password_hash, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        )
+
+def set_password_hash(username, password_hash, conn=None):
+    conn = conn or get_connection()
+    with conn:
+        conn.execute("UPDATE users SET password_hash = ? WHERE username = ?", (password_hash, username))
+
+def users_page(prefix="", is_admin=None, after="", limit=50, conn=None):
+    """Up to ``limit`` accounts after username ``after``, by username, without password hashes"""
+    conn = conn or get_connection()
+    filters, params = _user_filters(prefix, is_admin, after)
+    rows = conn.execute(
+        f"SELECT username, is_admin, created FROM users WHERE {' AND '.join(filters) or '1'} ORDER BY username LIMIT ?",
+        (*params, limit)
+    )
+    return [dict(row) for row in rows]
+
+def count_users(prefix="", is_admin=None, conn=None):
+    conn = conn or get_connection()
+    filters, params = _user_filters(prefix, is_admin)
+    return conn.execute(f"SELECT COUNT(*) FROM users WHERE {' AND '.join(filters) or '1'}", params).fetchone()[0]
+
+def record_quiz_submission(timestamp, user, quiz_id, answers, results, conn=None):
+    """Store one graded quiz and update its counters in the same transaction.
+
+    ``answers`` is the compact answer string kept with the event and
+    ``results`` a list of (question_id, correct) pairs.
+    """
+    conn = conn or get_connection()
+    score = sum(bool(correct) for _, correct in results)
+    with conn:
+        conn.execute("INSERT INTO quiz_events (timestamp, user, quiz_id, answers, score) VALUES (?, ?, ?, ?, ?)",
+                     (timestamp, user, quiz_id, answers, score))
+        conn.executemany(
+            "INSERT INTO quiz_question_stats (quiz_id, question_id, attempts, correct) VALUES (?, ?, 1, ?) "
+            "ON CONFLICT (quiz_id, question_id) "
+            "DO UPDATE SET attempts = attempts + 1, correct = correct + excluded.correct",
+            ((quiz_id, question_id, int(bool(correct))) for question_id, correct in results)
+        )
+        conn.execute(
+            "INSERT INTO quiz_score_counts (quiz_id, score, submissions) VALUES (?, ?, 1) "
+            "ON CONFLICT (quiz_id, score) DO UPDATE SET submissions = submissions + 1",
+            (quiz_id, score)
+        )
+
+def quiz_question_stats(quiz_id, conn=None):
+    """{question_id: (attempts, correct)} counters for one quiz"""
+    conn = conn or get_connection()
+    rows = conn.execute("SELECT question_id, attempts, correct FROM quiz_question_stats WHERE quiz_id = ?", (quiz_id,))
+    return {row["question_id"]: (row["attempts"], row["correct"]) for row in rows}
+
+def quiz_score_counts(quiz_id, conn=None):
+    """{score: submissions} for one quiz"""
+    conn = conn or get_connection()
+    rows = conn.execute("SELECT score, submissions FROM quiz_score_counts WHERE quiz_id = ?", (quiz_id,))
+    return {row["score"]: row["submissions"] for row in rows}
+
+MODEL_STATS_COLUMNS = [
+    "timestamp", "pid", "version", "role", "mode", "requests", "rows", "errors", "over_budget", "dropped",
+    "latency_mean_ms", "latency_p95_ms", "compared", "agreed",
+]
+
+def insert_model_stats(rows, conn=None):
+    """Store per-version routing stats, one dict with MODEL_STATS_COLUMNS keys per version and window"""
+    conn = conn or get_connection()
+    with conn:
+        conn.executemany(
+            f"INSERT INTO model_stats ({', '.join(MODEL_STATS_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(MODEL_STATS_COLUMNS))})",
+            ([row[column] for column in MODEL_STATS_COLUMNS] for row in rows)
+        )
+
+def model_stats_summary(since=None, conn=None):
+    """Routing stats per model version, role and mode since ``since`` (a datetime), all workers combined"""
+    conn = conn or get_connection()
+    rows = conn.execute(
+        "SELECT version, role, mode, MIN(timestamp) AS first_seen, MAX(timestamp) AS last_seen, SUM(requests) AS requests, "
+        "SUM(rows) AS rows, SUM(errors) AS errors, SUM(over_budget) AS over_budget, SUM(dropped) AS dropped, "
+        "SUM(latency_mean_ms * requests) / NULLIF(SUM(CASE WHEN latency_mean_ms IS NULL THEN 0 ELSE requests END), 0) "
+        "AS latency_mean_ms, MAX(latency_p95_ms) AS latency_p95_ms, SUM(compared) AS compared, SUM(agreed) AS agreed "
+        "FROM model_stats WHERE timestamp >= ? GROUP BY version, role, mode ORDER BY last_seen DESC",
+        (since.strftime("%Y-%m-%d %H:%M:%S") if since else "",)
+    )
+    return [dict(row) for row in rows]
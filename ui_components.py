@@ -1,12 +1,12 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-import base64
 from auth import logout, authenticate, create_account, init_auth
+from startup import encoded_asset
+from storage import fetch_prediction_logs
 
 def set_background_image_local(image_path):
-    with open(image_path, "rb") as img_file:
-        img_base64 = base64.b64encode(img_file.read()).decode()
+    img_base64 = encoded_asset(image_path)
     st.markdown(
         f"""
         <style>
@@ -155,13 +155,52 @@ def login_page():
 
     st.markdown('</div>', unsafe_allow_html=True)
 
+def _turn_user_page(step):
+    pages = st.session_state.user_pages
+    if step > 0:
+        pages["cursors"].append(pages["next"])
+    elif len(pages["cursors"]) > 1:
+        pages["cursors"].pop()
+
+def render_user_directory():
+    from user_directory import PAGE_SIZE, directory_page, user_count
+
+    st.subheader("User List")
+    col1, col2 = st.columns([3, 1])
+    prefix = col1.text_input("Search", placeholder="Username starts with...", key="user_search").strip()
+    role = col2.selectbox("Role", ["All", "Admins", "Users"], key="user_role")
+    is_admin = {"All": None, "Admins": True, "Users": False}[role]
+    # Pages are keyed by the last username of the previous page; a new filter starts over
+    pages = st.session_state.get("user_pages")
+    if pages is None or pages["filter"] != (prefix, is_admin):
+        pages = st.session_state.user_pages = {"filter": (prefix, is_admin), "cursors": [""], "next": None}
+    rows, has_next = directory_page(prefix, is_admin, pages["cursors"][-1])
+    pages["next"] = rows[-1]["username"] if has_next else None
+
+    matching = user_count(prefix, is_admin)
+    page_number = len(pages["cursors"])
+    st.caption(f"{matching} matching user(s) of {user_count()} · page {page_number} of "
+               f"{max(1, -(-matching // PAGE_SIZE))}")
+    if rows:
+        st.dataframe(pd.DataFrame([
+            {"Username": row["username"], "Admin": "Yes" if row["is_admin"] else "No", "Created": row["created"]}
+            for row in rows
+        ]), hide_index=True)
+    else:
+        st.info("No users match")
+    col1, col2 = st.columns(2)
+    col1.button("Previous", key="user_page_prev", disabled=page_number == 1, on_click=_turn_user_page, args=(-1,))
+    col2.button("Next", key="user_page_next", disabled=not has_next, on_click=_turn_user_page, args=(1,))
+
 def admin_panel():
     if not st.session_state.get("is_admin", False):
         st.warning("You don't have admin privileges")
         return
     
     st.header("Admin Panel")
-    tab1, tab2 = st.tabs(["User Management", "Prediction Logs"])
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(
+        ["User Management", "Prediction Logs", "Drift", "Model", "Population", "Profiler", "Quizzes"]
+    )
 
     with tab1:
         st.subheader("User Management")
@@ -178,31 +217,190 @@ def admin_panel():
                         st.success(f"User '{new_username}' created successfully")
                     else:
                         st.error("Username already exists")
-        st.subheader("User List")
-        user_data = [{"Username": u, "Admin": "Yes" if st.session_state.users[u].get("is_admin", False) else "No"} 
-                     for u in st.session_state.users]
-        st.dataframe(pd.DataFrame(user_data))
+        with st.expander("Import Users from CSV"):
+            st.caption("Columns: username, password and optionally is_admin (yes/no). "
+                       "Existing usernames are skipped; any invalid row rejects the whole file.")
+            upload = st.file_uploader("Users CSV", type="csv", key="user_import_file")
+            if upload is not None and st.button("Create Users", key="user_import"):
+                from user_directory import create_accounts, parse_account_csv
+                accounts, errors = parse_account_csv(upload.getvalue())
+                if errors:
+                    st.error("\n\n".join(errors))
+                else:
+                    created = create_accounts(accounts)
+                    st.success(f"Created {created} user(s); skipped {len(accounts) - created} existing")
+        render_user_directory()
 
     with tab2:
         st.subheader("Prediction Logs")
-        if not st.session_state.prediction_logs:
-            st.info("No prediction logs available yet")
+        date_filter = st.date_input("Filter by date", value=datetime.now().date(), max_value=datetime.now().date())
+        filtered_logs = fetch_prediction_logs(date_filter)
+        if not filtered_logs:
+            st.info(f"No logs found for {date_filter}")
         else:
-            logs_df = pd.DataFrame(st.session_state.prediction_logs)
-            date_filter = st.date_input("Filter by date", value=datetime.now().date(), max_value=datetime.now().date())
-            filtered_logs = [log for log in st.session_state.prediction_logs 
-                            if log["timestamp"].startswith(date_filter.strftime("%Y-%m-%d"))]
-            if not filtered_logs:
-                st.info(f"No logs found for {date_filter}")
+            from visualization import plot_prediction_distribution
+            plot_prediction_distribution(pd.DataFrame(filtered_logs))
+            st.subheader("Detailed Logs")
+            with st.expander("Show all log details"):
+                st.json(filtered_logs)
+            simple_logs = [{"Time": log["timestamp"].split()[1], "User": log["user"], "Prediction": log["prediction"], 
+                           "Highest Probability": max(log["probability"]) * 100, "Source": log["source"]}
+                           for log in filtered_logs]
+            st.dataframe(pd.DataFrame(simple_logs))
+
+        st.subheader("Export")
+        col1, col2, col3, col4 = st.columns(4)
+        export_kind = col1.selectbox("Data", ["logs", "diaries"], key="export_kind",
+                                     format_func={"logs": "Prediction logs", "diaries": "Sleep diaries"}.get)
+        export_range = col2.date_input("Days", value=(date_filter, date_filter), key="export_range")
+        export_user = col3.text_input("User (optional)", key="export_user")
+        export_format = col4.selectbox("Format", ["csv", "parquet"], key="export_format")
+        if len(export_range) == 2:
+            from exports import EXPORT_FORMATS, MAX_DOWNLOAD_ROWS, export_chunks, export_commands, export_file_name
+            from storage import count_export_rows
+            start, end = export_range
+            export_user = export_user.strip() or None
+            n_rows = count_export_rows(export_kind, start, end, export_user, limit=MAX_DOWNLOAD_ROWS + 1)
+            if n_rows > MAX_DOWNLOAD_ROWS:
+                cli, api = export_commands(export_kind, export_format, start, end, export_user)
+                st.warning(f"This export has more than {MAX_DOWNLOAD_ROWS:,} rows, which is too large to download "
+                           "here. Stream it to a file in constant memory with the CLI or an API worker instead:")
+                st.code(f"{cli}\n{api}", language="bash")
             else:
-                from visualization import plot_prediction_distribution
-                plot_prediction_distribution(pd.DataFrame(filtered_logs))
-                st.subheader("Detailed Logs")
-                with st.expander("Show all log details"):
-                    st.json(filtered_logs)
-                simple_logs = [{"Time": log["timestamp"].split()[1], "User": log["user"], "Prediction": log["prediction"], 
-                               "Highest Probability": max(log["probability"]) * 100} for log in filtered_logs]
-                st.dataframe(pd.DataFrame(simple_logs))
+                st.caption(f"Downloads here are limited to {MAX_DOWNLOAD_ROWS:,} rows; the file is built when you click.")
+                st.download_button(
+                    "Download export",
+                    lambda: b"".join(export_chunks(export_kind, export_format, start, end, export_user)),
+                    file_name=export_file_name(export_kind, export_format, start, end),
+                    mime=EXPORT_FORMATS[export_format],
+                    key="export_download"
+                )
+
+    with tab3:
+        from drift import drift_monitor, drift_status, PSI_WARNING, PSI_ALERT
+        st.subheader("Input & Prediction Drift")
+        window_days = st.selectbox("Window", [7, 30, 90], index=1, format_func=lambda d: f"Last {d} days")
+        features, class_mix, class_psi = drift_monitor(window_days).refresh().report()
+        if not features['Observations'].any():
+            st.info("No interactive predictions logged in this window")
+        else:
+            flagged = features[features['Status'].isin(['warning', 'alert'])]
+            if flagged.empty:
+                st.success("No feature has drifted from the training distribution")
+            else:
+                st.warning(f"Drift detected in: {', '.join(flagged['Feature'])}")
+            st.caption(f"PSI ≥ {PSI_WARNING} is a warning and ≥ {PSI_ALERT} an alert; KS is the largest gap between binned CDFs")
+            st.dataframe(features.sort_values('PSI', ascending=False), hide_index=True)
+            st.subheader("Predicted Class Mix")
+            st.write(f"PSI vs training labels: **{class_psi:.3f}** "
+                     f"({drift_status(class_psi, features['Observations'].max())})")
+            st.dataframe(class_mix, hide_index=True)
+
+    with tab4:
+        from startup import existing_model_bundle
+        from visualization import plot_confusion_matrix, plot_permutation_importance, plot_roc_curves
+        st.subheader("Model Report")
+        # Every tab runs on each rerun, so this tab must never be the one that trains a model
+        bundle = existing_model_bundle()
+        report = None if bundle is None else bundle.get("report")
+        if bundle is None:
+            st.info("No model artifact yet; `python startup.py` (or the first prediction page load) builds it")
+        elif report is None:
+            st.info("This model artifact has no stored report; run `python model_report.py` to add one")
+        else:
+            from modeling import DISORDER_MAPPING
+            # Class names from the current mapping, not the ones stored when the report was built
+            report = dict(report, classes=[DISORDER_MAPPING[c] for c in bundle["model"].classes_])
+            col1, col2 = st.columns(2)
+            col1.metric("Held-out Accuracy", f"{report['accuracy'] * 100:.1f}%")
+            col2.metric("Test Samples", report['n_test'])
+            st.dataframe(pd.DataFrame({'Disorder': report['classes'], **report['per_class']}).round(3), hide_index=True)
+            col1, col2 = st.columns(2)
+            with col1:
+                plot_confusion_matrix(report)
+            with col2:
+                plot_roc_curves(report)
+            plot_permutation_importance(report)
+
+        from model_router import load_rollout, stats_report
+        st.subheader("Rollout")
+        rollout = load_rollout() or {"mode": "off"}
+        if rollout["mode"] == "off":
+            st.caption("No candidate model; configure one with `python model_router.py shadow|split <candidate>`")
+        else:
+            share = f" to {rollout['percent']:g}% of users" if rollout["mode"] == "split" else ""
+            st.caption(f"Candidate `{rollout.get('version', rollout['candidate'])}` in **{rollout['mode']}** "
+                       f"mode{share}, latency budget {rollout['budget_ms']:g} ms")
+        routing = stats_report()
+        if routing:
+            st.dataframe(pd.DataFrame(routing).rename(columns={
+                "version": "Version", "role": "Role", "mode": "Mode", "first_seen": "First Seen", "last_seen": "Last Seen",
+                "requests": "Requests", "rows": "Rows", "errors": "Errors", "over_budget": "Over Budget",
+                "dropped": "Dropped", "latency_mean_ms": "Mean Latency (ms)", "latency_p95_ms": "Worst p95 (ms)",
+                "compared": "Compared", "agreed": "Agreed", "agreement_pct": "Agreement (%)"
+            }).round(2), hide_index=True)
+
+    with tab5:
+        from cohorts import cohort_cube, DIMENSIONS, MEASURES
+        from visualization import plot_cohorts
+        st.subheader("Population Cohorts")
+        cube = cohort_cube()
+        group_by = st.multiselect("Group by", DIMENSIONS, default=["Occupation", "Sleep Disorder"], key="cohort_group_by")
+        with st.expander("Filters"):
+            filters = {dim: st.multiselect(dim, list(cube.labels[dim]), key=f"cohort_filter_{dim}") for dim in DIMENSIONS}
+        cohorts_df = cube.query(group_by, filters)
+        if cohorts_df.empty:
+            st.info("No records match these filters")
+        else:
+            if group_by:
+                measure = st.selectbox("Measure", ["Count"] + [f"Mean {m}" for m in MEASURES], key="cohort_measure")
+                plot_cohorts(cohorts_df, group_by, measure)
+            st.dataframe(cohorts_df.round(2), hide_index=True)
+
+    with tab6:
+        import profiling
+        from storage import list_profile_captures, load_profile_stats
+        st.subheader("Profiler")
+        st.caption("Profiles the next reruns of any session served by this worker process")
+        col1, col2 = st.columns([3, 1])
+        n_reruns = col1.number_input("Reruns to record", 1, profiling.MAX_ARMED_RERUNS, 5, key="profile_reruns")
+        if col2.button("Start recording", key="arm_profiler"):
+            profiling.arm(n_reruns)
+        if profiling.remaining():
+            st.info(f"Recording: {profiling.remaining()} rerun(s) left")
+        captures = list_profile_captures()
+        if not captures:
+            st.info("No profiles recorded yet")
+        else:
+            captures_df = pd.DataFrame(captures).rename(columns={
+                "id": "ID", "timestamp": "Time", "user": "User", "pid": "Process", "duration_ms": "Wall Time (ms)",
+                "size": "Size (bytes)"
+            })
+            st.dataframe(captures_df.round(1), hide_index=True)
+            capture_id = st.selectbox("Capture", captures_df["ID"], key="profile_capture",
+                                      format_func=lambda i: f"#{i} – {captures_df.set_index('ID').loc[i, 'Time']}")
+            sort = st.radio("Sort by", ["Cumulative (ms)", "Own (ms)", "Calls"], horizontal=True, key="profile_sort")
+            st.dataframe(profiling.top_functions(profiling.load_stats(capture_id), sort=sort).round(2), hide_index=True)
+            st.download_button("Download .prof (open with snakeviz or flameprof)", load_profile_stats(capture_id),
+                               file_name=f"sleepytics-{capture_id}.prof", mime="application/octet-stream")
+
+    with tab7:
+        from quiz import load_quizzes, question_report, score_distribution
+        from visualization import plot_quiz_scores
+        st.subheader("Quiz Analytics")
+        quizzes = {quiz["id"]: quiz for quiz in load_quizzes()}
+        quiz = quizzes[st.selectbox("Quiz", list(quizzes), format_func=lambda i: quizzes[i]["title"], key="quiz_analytics")]
+        scores = score_distribution(quiz)
+        submissions = int(scores['Submissions'].sum())
+        if not submissions:
+            st.info("No submissions yet")
+        else:
+            col1, col2 = st.columns(2)
+            col1.metric("Submissions", submissions)
+            col2.metric("Mean Score", f"{(scores['Score'] * scores['Submissions']).sum() / submissions:.2f} / "
+                                      f"{len(quiz['questions'])}")
+            plot_quiz_scores(scores, quiz["title"])
+            st.dataframe(question_report(quiz).round(1), hide_index=True)
 
 def header():
     col1, col2 = st.columns([9, 1])
@@ -0,0 +1,152 @@
+"""User accounts in the shared store, with search and paging for the admin panel.
+
+Accounts live in the ``users`` table keyed by username, so prefix search is a
+range scan on the primary key. Passwords are stored as salted scrypt hashes
+(``scrypt$n$r$p$salt$hash``); unsalted SHA-256 hashes from older stores are
+still accepted and replaced at the next login. No account is created with a
+built-in password: the first admin is created from ``SLEEPYTICS_ADMIN_USER``
+(default ``admin``) and ``SLEEPYTICS_ADMIN_PASSWORD`` when the store has no
+accounts. The directory is paged by keyset (the last
+username of the previous page), which makes every page equally cheap. Counts
+are cached for ``COUNT_TTL`` seconds per (prefix, role) filter, and the cache
+is cleared whenever this process creates accounts.
+"""
+import csv
+import hashlib
+import hmac
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from storage import count_users, ensure_default_user, get_user, insert_users, set_password_hash, users_page
+
+ADMIN_USER_ENV = "SLEEPYTICS_ADMIN_USER"
+ADMIN_PASSWORD_ENV = "SLEEPYTICS_ADMIN_PASSWORD"
+# The admin password older versions seeded into every store
+LEGACY_DEFAULT_ADMIN = ("admin", "admin123")
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 2 ** 14, 8, 1
+SALT_BYTES = 16
+PAGE_SIZE = 50
+COUNT_TTL = 30
+MAX_IMPORT_ROWS = 1_000_000
+TRUE_VALUES = {"1", "true", "yes", "y"}
+FALSE_VALUES = {"", "0", "false", "no", "n"}
+
+_counts = {}
+_counts_lock = threading.Lock()
+
+
+def hash_password(password, salt=None):
+    """Salted scrypt hash of a password, with its parameters and salt"""
+    salt = os.urandom(SALT_BYTES) if salt is None else salt
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, dklen=32)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}"
+
+def is_legacy_hash(password_hash):
+    return not password_hash.startswith("scrypt$")
+
+def verify_password(password, password_hash):
+    """Whether ``password`` matches a stored scrypt (or legacy unsalted SHA-256) hash"""
+    if is_legacy_hash(password_hash):
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), password_hash)
+    _, n, r, p, salt, digest = password_hash.split("$")
+    candidate = hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt), n=int(n), r=int(r), p=int(p),
+                               dklen=len(digest) // 2)
+    return hmac.compare_digest(candidate.hex(), digest)
+
+def check_login(username, password):
+    """The account if the password is right, upgrading a legacy hash on the way; otherwise None"""
+    account = get_account(username)
+    if account is None or not verify_password(password, account["password_hash"]):
+        return None
+    if is_legacy_hash(account["password_hash"]):
+        set_password_hash(username, hash_password(password))
+    return account
+
+def ensure_default_admin():
+    """Create the first admin from the environment when the store has no accounts.
+
+    An admin still using the password older versions seeded is given the configured one instead.
+    """
+    password = os.environ.get(ADMIN_PASSWORD_ENV)
+    if not password:
+        if not count_users():
+            print(f"No accounts yet: set {ADMIN_PASSWORD_ENV} to create the first admin", flush=True)
+        return
+    ensure_default_user(os.environ.get(ADMIN_USER_ENV, "admin"), hash_password(password))
+    legacy = get_account(LEGACY_DEFAULT_ADMIN[0])
+    if legacy is not None and legacy["is_admin"] and verify_password(LEGACY_DEFAULT_ADMIN[1], legacy["password_hash"]):
+        set_password_hash(LEGACY_DEFAULT_ADMIN[0], hash_password(password))
+
+def get_account(username):
+    return get_user(username) if username else None
+
+def create_accounts(accounts):
+    """Create (username, password, is_admin) accounts in one transaction; returns the number created"""
+    accounts = list(accounts)
+    created = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # scrypt releases the GIL, so a bulk import hashes on every core
+    with ThreadPoolExecutor(os.cpu_count()) as pool:
+        hashes = list(pool.map(hash_password, (password for _, password, _ in accounts)))
+    n_created = insert_users(
+        (username, password_hash, is_admin, created)
+        for (username, _, is_admin), password_hash in zip(accounts, hashes)
+    )
+    if n_created:
+        invalidate_counts()
+    return n_created
+
+def invalidate_counts():
+    with _counts_lock:
+        _counts.clear()
+
+def user_count(prefix="", is_admin=None):
+    """Number of accounts matching a filter, cached for COUNT_TTL seconds"""
+    key = (prefix, is_admin)
+    now = time.monotonic()
+    with _counts_lock:
+        cached = _counts.get(key)
+    if cached is not None and now - cached[0] < COUNT_TTL:
+        return cached[1]
+    count = count_users(prefix, is_admin)
+    with _counts_lock:
+        _counts[key] = (now, count)
+    return count
+
+def directory_page(prefix="", is_admin=None, after="", page_size=PAGE_SIZE):
+    """One page of accounts after ``after`` and whether another page follows"""
+    rows = users_page(prefix, is_admin, after, page_size + 1)
+    return rows[:page_size], len(rows) > page_size
+
+def parse_account_csv(data):
+    """Accounts from CSV bytes with username, password and optional is_admin columns.
+
+    Returns (accounts, errors); a file with any error should be rejected whole.
+    """
+    reader = csv.DictReader(io.StringIO(data.decode("utf-8-sig")))
+    columns = {name.strip().lower(): name for name in reader.fieldnames or []}
+    missing = [c for c in ("username", "password") if c not in columns]
+    if missing:
+        return [], [f"Missing column(s): {', '.join(missing)}"]
+    accounts, errors, seen = [], [], set()
+    for line, row in enumerate(reader, start=2):
+        username = (row[columns["username"]] or "").strip()
+        password = row[columns["password"]] or ""
+        admin_flag = (row.get(columns.get("is_admin", ""), "") or "").strip().lower()
+        if not username or not password:
+            errors.append(f"Line {line}: username and password are required")
+        elif username in seen:
+            errors.append(f"Line {line}: duplicate username '{username}'")
+        elif admin_flag not in TRUE_VALUES | FALSE_VALUES:
+            errors.append(f"Line {line}: is_admin must be yes/no, true/false or 1/0")
+        else:
+            seen.add(username)
+            accounts.append((username, password, admin_flag in TRUE_VALUES))
+        if len(errors) >= 20 or line > MAX_IMPORT_ROWS + 1:
+            errors.append("Too many errors or rows; stopped reading" if len(errors) >= 20
+                          else f"More than {MAX_IMPORT_ROWS} rows")
+            break
+    return accounts, errors
@@ -1,9 +1,11 @@
 import streamlit as st
-import plotly.express as px
 import pandas as pd
+import numpy as np
 
 def plot_prediction_proba(proba_df):
     """Plot the probability distribution of predicted sleep disorders"""
+    import plotly.express as px
+
     # Ensure probabilities are in percentage format
     proba_df['Probability'] = proba_df['Probability'].round(2)  # Round to 2 decimal places
     proba_df['Probability_Label'] = proba_df['Probability'].astype(str) + '%'
@@ -38,29 +40,114 @@ def plot_prediction_proba(proba_df):
     # Display the plot in Streamlit
     st.plotly_chart(fig, use_container_width=True)
 
-def plot_sleep_patterns(sleep_df):
-    """Plot sleep patterns based on advanced sleep log data"""
-    # Example: Plot average sleep duration and quality over time
-    sleep_df['Date'] = pd.to_datetime(sleep_df['Date'])
-    fig = px.line(
-        sleep_df,
-        x='Date',
-        y=['Sleep Duration', 'Quality of Sleep'],
-        title='Sleep Patterns Over Time',
-        labels={'value': 'Value', 'variable': 'Metric'},
-        color_discrete_sequence=px.colors.qualitative.Set2
+def plot_feature_attributions(attributions_df, predicted_disorder):
+    """Plot how much each input feature pushed the predicted disorder's probability"""
+    import plotly.express as px
+
+    attributions_df = attributions_df.iloc[::-1]
+    fig = px.bar(
+        attributions_df,
+        x='Contribution',
+        y='Feature',
+        orientation='h',
+        title=f'What Drove "{predicted_disorder}"',
+        color=attributions_df['Contribution'] > 0,
+        color_discrete_map={True: '#EF553B', False: '#636EFA'},
+        height=400
     )
     fig.update_layout(
+        xaxis_title="Contribution (percentage points)",
+        yaxis_title="",
+        showlegend=False,
+        plot_bgcolor='rgba(240, 240, 240, 0.9)',
+        paper_bgcolor='rgba(240, 240, 240, 0.9)',
+        font=dict(size=12),
+        margin=dict(l=40, r=40, t=60, b=40)
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+SLEEP_PATTERN_METRICS = ['Sleep Duration', 'Quality of Sleep']
+SLEEP_PATTERN_BINS = {'Daily': 'D', 'Weekly': 'W', 'Monthly': 'MS'}
+MAX_CHART_POINTS = 300
+
+def aggregate_sleep_log(sleep_df, granularity):
+    """Mean of each sleep metric per daily, weekly or monthly bin (input is not modified)"""
+    series = pd.DataFrame({'Date': pd.to_datetime(sleep_df['Date'])})
+    for metric in SLEEP_PATTERN_METRICS:
+        series[metric] = pd.to_numeric(sleep_df[metric], errors='coerce').to_numpy()
+    return series.set_index('Date').resample(SLEEP_PATTERN_BINS[granularity]).mean().dropna(how='all')
+
+def auto_granularity(sleep_df, max_points=MAX_CHART_POINTS):
+    """Finest bin size whose number of bins fits the point budget"""
+    dates = pd.to_datetime(sleep_df['Date'])
+    span_days = (dates.max() - dates.min()).days + 1
+    if span_days <= max_points:
+        return 'Daily'
+    if span_days / 7 <= max_points:
+        return 'Weekly'
+    return 'Monthly'
+
+def lttb(x, y, n_out):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets downsampling"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    selected = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        area = np.abs((x[selected] - avg_x) * (y[lo:hi] - y[selected])
+                      - (x[selected] - x[lo:hi]) * (avg_y - y[selected]))
+        selected = lo + int(area.argmax())
+        keep[i + 1] = selected
+    return keep
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def sleep_pattern_spec(binned_df, granularity, max_points=MAX_CHART_POINTS):
+    """Plotly figure spec for pre-binned sleep metrics, downsampled to ``max_points`` per metric"""
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    colors = px.colors.qualitative.Set2
+    for metric, color in zip(SLEEP_PATTERN_METRICS, colors):
+        series = binned_df[metric].dropna()
+        keep = lttb(series.index.asi8, series.to_numpy(), max_points)
+        fig.add_trace(go.Scatter(x=series.index[keep], y=series.to_numpy()[keep], mode='lines',
+                                 name=metric, line=dict(color=color)))
+    fig.update_layout(
+        title=f'Sleep Patterns Over Time ({granularity})',
         xaxis_title="Date",
         yaxis_title="Value",
+        legend_title_text='Metric',
         height=400,
         plot_bgcolor='rgba(240, 240, 240, 0.9)',
         paper_bgcolor='rgba(240, 240, 240, 0.9)'
     )
-    st.plotly_chart(fig, use_container_width=True)
+    return fig.to_dict()
+
+def plot_sleep_patterns(sleep_df, max_points=MAX_CHART_POINTS):
+    """Plot sleep patterns based on advanced sleep log data.
+
+    Entries are averaged into daily, weekly or monthly bins and each metric is
+    downsampled to a fixed point budget, so the chart stays the same size for
+    diaries spanning years. The figure spec is cached on the binned data.
+    """
+    choice = st.radio("Granularity", ["Auto", *SLEEP_PATTERN_BINS], horizontal=True, key="sleep_pattern_granularity")
+    granularity = auto_granularity(sleep_df, max_points) if choice == "Auto" else choice
+    binned_df = aggregate_sleep_log(sleep_df, granularity)
+    st.plotly_chart(sleep_pattern_spec(binned_df, granularity, max_points), use_container_width=True)
 
 def plot_prediction_distribution(logs_df):
     """Plot distribution of predictions from logs"""
+    import plotly.express as px
+
     fig = px.histogram(
         logs_df,
         x='prediction',
@@ -75,4 +162,83 @@ def plot_prediction_distribution(logs_df):
         plot_bgcolor='rgba(240, 240, 240, 0.9)',
         paper_bgcolor='rgba(240, 240, 240, 0.9)'
     )
-    st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+    st.plotly_chart(fig, use_container_width=True)
+
+def plot_confusion_matrix(report):
+    """Heatmap of the held-out confusion matrix stored in a model report"""
+    import plotly.express as px
+
+    fig = px.imshow(
+        report['confusion_matrix'],
+        x=report['classes'],
+        y=report['classes'],
+        text_auto=True,
+        color_continuous_scale='Blues',
+        labels=dict(x="Predicted", y="Actual", color="Count"),
+        title='Confusion Matrix (held-out set)'
+    )
+    fig.update_layout(height=400)
+    st.plotly_chart(fig, use_container_width=True)
+
+def plot_permutation_importance(report):
+    """Drop in held-out accuracy when each feature is shuffled"""
+    import plotly.express as px
+
+    importance = pd.DataFrame({
+        'Feature': report['features'],
+        'Importance': report['permutation_importance']['mean'],
+        'Std': report['permutation_importance']['std']
+    }).sort_values('Importance')
+    fig = px.bar(
+        importance,
+        x='Importance',
+        y='Feature',
+        error_x='Std',
+        orientation='h',
+        title='Permutation Importance',
+        height=450
+    )
+    fig.update_layout(xaxis_title="Accuracy drop when shuffled", yaxis_title="")
+    st.plotly_chart(fig, use_container_width=True)
+
+def plot_roc_curves(report):
+    """One-vs-rest ROC curve per class"""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=[0, 1], y=[0, 1], mode='lines', line=dict(dash='dot', color='gray'), showlegend=False))
+    for name, curve in zip(report['classes'], report['roc']):
+        fig.add_trace(go.Scatter(x=curve['fpr'], y=curve['tpr'], mode='lines', name=f"{name} (AUC {curve['auc']:.3f})"))
+    fig.update_layout(
+        title='ROC Curves (one vs. rest)',
+        xaxis_title="False Positive Rate",
+        yaxis_title="True Positive Rate",
+        height=400
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+def plot_cohorts(cohorts_df, group_by, measure):
+    """Bar chart of one cohort measure by the first grouping, split by the second"""
+    import plotly.express as px
+
+    fig = px.bar(
+        cohorts_df,
+        x=group_by[0],
+        y=measure,
+        color=group_by[1] if len(group_by) > 1 else None,
+        barmode='group',
+        hover_data=['Count'],
+        title=f'{measure} by {" and ".join(group_by)}',
+        color_discrete_sequence=px.colors.qualitative.Pastel,
+        height=450
+    )
+    fig.update_layout(plot_bgcolor='rgba(240, 240, 240, 0.9)', paper_bgcolor='rgba(240, 240, 240, 0.9)')
+    st.plotly_chart(fig, use_container_width=True)
+
+def plot_quiz_scores(scores_df, quiz_title):
+    """Histogram of quiz scores from the stored score counters"""
+    import plotly.express as px
+
+    fig = px.bar(scores_df, x='Score', y='Submissions', title=f'{quiz_title}: Scores', height=350)
+    fig.update_layout(xaxis=dict(dtick=1))
+    st.plotly_chart(fig, use_container_width=True)